@@ -0,0 +1,290 @@
+"""Benchmarks for jarn.mkrelease.
+
+Usage: python benchmarks/bench_mkrelease.py [options] [name-filter ...]
+
+Options:
+  -n loops, --loops=loops   Number of timed runs per benchmark (default: 5).
+  -f files, --files=files   Number of modules in synthetic packages (default: 200).
+  -o file, --output=file    Store results in file (default:
+                            benchmarks/results/<version>-py<X.Y>.json).
+  -c file, --compare=file   Compare results with a previous results file.
+  --no-save                 Do not store results.
+
+Exits with status 1 if a benchmark is more than 10% slower than in
+the compared results.
+"""
+
+import sys
+import os
+import time
+import json
+import getopt
+import platform
+import statistics
+
+from io import StringIO
+from os.path import abspath, dirname, join, exists
+from shutil import which
+
+ROOT = dirname(dirname(abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from jarn.mkrelease.mkrelease import main, __version__
+from jarn.mkrelease.scm import SCMFactory
+from jarn.mkrelease.setuptools import Setuptools
+from jarn.mkrelease.process import Process
+from jarn.mkrelease.tee import run, run_threaded
+from jarn.mkrelease.testing import SandboxSetup, GitSetup, MercurialSetup, SubversionSetup
+
+# Fixtures find their archives here
+SandboxSetup.datadir = join(ROOT, 'tests')
+
+# Slowdowns above this are reported as regressions
+THRESHOLD = 0.10
+
+BENCHMARKS = []
+
+
+def benchmark(requires=None):
+    """Register a benchmark.
+
+    The function receives a Bench object and must call it exactly once
+    with the callable to time. 'requires' names an executable the
+    benchmark depends on; the benchmark is skipped if it is missing.
+    """
+    def decorator(func):
+        func.requires = requires
+        BENCHMARKS.append(func)
+        return func
+    return decorator
+
+
+class Bench(object):
+    """Time a callable over a number of loops."""
+
+    def __init__(self, loops):
+        self.loops = loops
+        self.times = []
+
+    def __call__(self, func, *args, **kw):
+        func(*args, **kw) # Warm up
+        for i in range(self.loops):
+            start = time.perf_counter()
+            func(*args, **kw)
+            self.times.append(time.perf_counter() - start)
+
+    def get_result(self):
+        times = self.times
+        return {
+            'min': min(times),
+            'median': statistics.median(times),
+            'mean': statistics.mean(times),
+            'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+            'loops': len(times),
+        }
+
+
+class Fixture(object):
+    """Use a testing fixture outside of unittest."""
+
+    files = 200
+
+    def __init__(self, klass):
+        self.case = klass()
+
+    def __enter__(self):
+        self.case.setUp()
+        return self.case
+
+    def __exit__(self, *ignored):
+        self.case.cleanUp()
+
+
+def synthesize(case, files):
+    """Add 'files' modules to the package in 'case' and commit them.
+    """
+    process = Process(quiet=True)
+    pkgdir = join(case.packagedir, 'testpackage')
+    for i in range(files):
+        subdir = join(pkgdir, 'sub%d' % (i // 50))
+        if not exists(subdir):
+            os.mkdir(subdir)
+            case.mkfile(join(subdir, '__init__.py'))
+        case.mkfile(join(subdir, 'module%d.py' % i), 'VALUE = %d\n' % i)
+
+    case.dirstack.push(case.packagedir)
+    try:
+        if case.name == 'git':
+            process.popen('git add -A && git commit -q -m"Add modules"')
+        elif case.name == 'hg':
+            process.popen('hg add -q && hg commit -q -m"Add modules"')
+        elif case.name == 'svn':
+            process.popen('svn add -q --force . && svn commit -q -m"Add modules"')
+    finally:
+        case.dirstack.pop()
+
+
+def dry_run(dir):
+    saved = sys.stdout, sys.stderr
+    sys.stdout = sys.stderr = StringIO()
+    try:
+        rc = main(['-n', '-q', '-w', dir])
+    finally:
+        sys.stdout, sys.stderr = saved
+    if rc != 0:
+        sys.exit('bench_mkrelease: Release of %s failed' % dir)
+
+
+def dry_run_release(bench, klass):
+    with Fixture(klass) as case:
+        synthesize(case, Fixture.files)
+        os.environ['JARN_RUN'] = '1'
+        bench(dry_run, case.packagedir)
+
+
+@benchmark(requires='git')
+def release_git(bench):
+    dry_run_release(bench, GitSetup)
+
+
+@benchmark(requires='hg')
+def release_hg(bench):
+    dry_run_release(bench, MercurialSetup)
+
+
+@benchmark(requires='svn')
+def release_svn(bench):
+    dry_run_release(bench, SubversionSetup)
+
+
+@benchmark(requires='git')
+def scm_detection(bench):
+    with Fixture(GitSetup) as case:
+        synthesize(case, Fixture.files)
+        subdir = join(case.packagedir, 'testpackage', 'sub0')
+        bench(lambda: SCMFactory().get_scm('', subdir))
+
+
+@benchmark(requires='git')
+def package_info(bench):
+    with Fixture(GitSetup) as case:
+        bench(lambda: Setuptools().get_package_info(case.packagedir))
+
+
+TEE_SCRIPT = '"import sys; [sys.stdout.write(%d*\'x\' + \'\\n\') for i in range(200000)]"'
+
+
+@benchmark()
+def tee_large_output(bench):
+    cmd = '"%s" -c %s' % (sys.executable, TEE_SCRIPT % 80)
+    bench(run, cmd, echo=False, shell=True)
+
+
+@benchmark()
+def tee_large_output_keep(bench):
+    cmd = '"%s" -c %s' % (sys.executable, TEE_SCRIPT % 80)
+    bench(run, cmd, echo=False, shell=True, keep=(b'Writing ',))
+
+
+@benchmark()
+def tee_large_output_threaded(bench):
+    cmd = '"%s" -c %s' % (sys.executable, TEE_SCRIPT % 80)
+    bench(run_threaded, cmd, echo=False, shell=True)
+
+
+def run_benchmarks(loops, filters):
+    results = {}
+    for func in BENCHMARKS:
+        name = func.__name__
+        if filters and not [x for x in filters if x in name]:
+            continue
+        if func.requires and not which(func.requires):
+            print('%-30s skipped (%s not found)' % (name, func.requires))
+            continue
+        bench = Bench(loops)
+        func(bench)
+        results[name] = result = bench.get_result()
+        print('%-30s %10s median  %10s min  +- %s' % (name,
+            format_time(result['median']), format_time(result['min']), format_time(result['stdev'])))
+    return results
+
+
+def format_time(seconds):
+    if seconds < 1.0:
+        return '%.2fms' % (seconds * 1000)
+    return '%.3fs' % seconds
+
+
+def compare(results, filename):
+    """Print changes relative to the results in filename.
+
+    Returns the number of regressions.
+    """
+    with open(filename, 'rt') as file:
+        previous = json.load(file)['benchmarks']
+    regressions = 0
+    print('\nCompared to %s:' % filename)
+    for name, result in sorted(results.items()):
+        if name not in previous:
+            continue
+        old = previous[name]['median']
+        new = result['median']
+        change = (new - old) / old if old else 0.0
+        mark = ''
+        if change > THRESHOLD:
+            mark = '  REGRESSION'
+            regressions += 1
+        print('%-30s %10s -> %10s  %+6.1f%%%s' % (
+            name, format_time(old), format_time(new), change*100, mark))
+    return regressions
+
+
+def bench_main(args):
+    try:
+        options, filters = getopt.gnu_getopt(args, 'n:f:o:c:h',
+            ('loops=', 'files=', 'output=', 'compare=', 'no-save', 'help'))
+    except getopt.GetoptError as e:
+        sys.exit('bench_mkrelease: %s' % e.msg)
+
+    loops = 5
+    output = join(ROOT, 'benchmarks', 'results', '%s-py%d.%d.json' % (
+        __version__, sys.version_info[0], sys.version_info[1]))
+    previous = ''
+    save = True
+
+    for name, value in options:
+        if name in ('-n', '--loops'):
+            loops = max(int(value), 1)
+        elif name in ('-f', '--files'):
+            Fixture.files = int(value)
+        elif name in ('-o', '--output'):
+            output = abspath(value)
+        elif name in ('-c', '--compare'):
+            previous = abspath(value)
+        elif name in ('--no-save',):
+            save = False
+        elif name in ('-h', '--help'):
+            print(__doc__)
+            sys.exit(0)
+
+    results = run_benchmarks(loops, filters)
+
+    if save:
+        os.makedirs(dirname(output), exist_ok=True)
+        with open(output, 'wt') as file:
+            json.dump({
+                'version': __version__,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'files': Fixture.files,
+                'benchmarks': results,
+            }, file, indent=1, sort_keys=True)
+        print('\nResults stored in %s' % output)
+
+    if previous:
+        return 1 if compare(results, previous) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(bench_main(sys.argv[1:]))
@@ -0,0 +1,287 @@
+import sys
+import os
+import json
+import threading
+
+from subprocess import Popen, PIPE
+
+from .tee import LineReader, On, Off, CHUNKSIZE
+from .timing import timings
+
+SERVE = 'from jarn.mkrelease import buildworker; buildworker.serve()'
+
+
+class BuildWorkerError(IOError):
+    """The build worker died or broke the protocol."""
+
+
+class BuildWorker(object):
+    """A warm Python process running setup.py commands.
+
+    The worker imports setuptools once and forks a child for every
+    command, so commands cannot see each other's sys.argv, working
+    directory, or monkey patches. Requests are JSON lines written to the
+    worker's stdin. The worker relays the child's stdout and stderr as
+    frames of the form b'O <size>\\n<data>' and b'E <size>\\n<data>',
+    followed by b'X <exit code> <cpu seconds>\\n'.
+    """
+
+    def __init__(self, cmd, env=None):
+        # env *replaces* os.environ
+        self.process = Popen(
+            'exec %s -c"%s"' % (cmd, SERVE), shell=True, stdin=PIPE, stdout=PIPE, env=env)
+        self.cpu = 0.0
+
+    def run(self, request, echo=True, echo2=True, keep=None):
+        """Run 'request' and return a two-tuple of exit code and lines read.
+
+        'echo', 'echo2', and 'keep' work like in tee.run.
+        The CPU time of the child is added to open timing frames.
+        Raises BuildWorkerError if the worker is gone.
+        """
+        if not callable(echo):
+            echo = On() if echo else Off()
+        if not callable(echo2):
+            echo2 = On() if echo2 else Off()
+
+        lines = []
+        readers = {
+            b'O': LineReader(echo, lambda x: sys.stdout.write(x), lines, keep),
+            b'E': LineReader(echo2, lambda x: sys.stderr.write(x)),
+        }
+        try:
+            self.process.stdin.write(json.dumps(request).encode('utf-8') + b'\n')
+            self.process.stdin.flush()
+        except (IOError, OSError) as e:
+            raise BuildWorkerError('Build worker died: %s' % (e,))
+
+        stdout = self.process.stdout
+        while True:
+            header = stdout.readline().split()
+            if len(header) < 2 or not header[1].isdigit():
+                raise BuildWorkerError('Build worker died')
+            tag, size = header[0], int(header[1])
+            if tag == b'X':
+                for reader in readers.values():
+                    reader.close()
+                if len(header) == 3:
+                    self.add_cpu(header[2])
+                return size, lines
+            data = stdout.read(size)
+            if len(data) != size or tag not in readers:
+                raise BuildWorkerError('Build worker died')
+            readers[tag].feed(data)
+
+    def add_cpu(self, value):
+        try:
+            cpu = float(value)
+        except ValueError:
+            return
+        self.cpu += cpu
+        timings.add_cpu(cpu)
+
+    def close(self):
+        """Stop the worker after it has finished the current command.
+        """
+        try:
+            self.process.stdin.close()
+        except (IOError, OSError):
+            pass
+        self.process.wait()
+        self.process.stdout.close()
+        # Reaping the worker makes RUSAGE_CHILDREN include the CPU
+        # time of its children, which has been counted already
+        timings.add_cpu(-self.cpu)
+        self.cpu = 0.0
+
+    def kill(self):
+        """Stop the worker immediately.
+        """
+        try:
+            self.process.kill()
+        except OSError:
+            pass
+        self.close()
+
+
+class BuildWorkerPool(object):
+    """Hand out idle build workers, starting new ones as needed.
+
+    Concurrent builds use separate workers.
+    """
+
+    def __init__(self, cmd, env=None):
+        self.cmd = cmd
+        self.env = env
+        self.idle = []
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Start a worker ahead of time, it warms up in the background.
+        """
+        worker = BuildWorker(self.cmd, self.env)
+        with self.lock:
+            self.workers.append(worker)
+            self.idle.append(worker)
+
+    def run(self, request, echo=True, echo2=True, keep=None):
+        """Run 'request' in an idle worker (see BuildWorker.run).
+        """
+        with self.lock:
+            worker = self.idle.pop() if self.idle else None
+        if worker is None:
+            worker = BuildWorker(self.cmd, self.env)
+            with self.lock:
+                self.workers.append(worker)
+        try:
+            result = worker.run(request, echo, echo2, keep)
+        except BaseException:
+            # The worker is in an unknown state
+            with self.lock:
+                self.workers.remove(worker)
+            worker.kill()
+            raise
+        with self.lock:
+            self.idle.append(worker)
+        return result
+
+    def close(self):
+        with self.lock:
+            workers, self.workers, self.idle = self.workers, [], []
+        for worker in workers:
+            worker.close()
+
+
+def warm_up():
+    """Import what setup.py runs are going to need.
+    """
+    import setuptools # XXX
+    import setuptools.command.egg_info
+    import setuptools.command.sdist
+    import distutils.core
+    import setuptools.command.bdist_egg
+    try:
+        import setuptools.command.bdist_wheel
+    except ImportError:
+        # setuptools < 70.1
+        try:
+            import wheel.bdist_wheel
+        except ImportError:
+            pass
+    from jarn.mkrelease import setup
+
+
+def serve():
+    """Serve requests read from stdin until EOF.
+
+    Runs in the worker process.
+    """
+    import signal
+
+    # Ctrl-C is for the children; mkrelease stops the worker
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Keep the pipes to ourselves; children and stray
+    # output must not interfere with the protocol
+    infd, outfd = os.dup(0), os.dup(1)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+
+    warm_up()
+
+    input = os.fdopen(infd, 'rb')
+    output = os.fdopen(outfd, 'wb')
+    for line in input:
+        request = json.loads(line.decode('utf-8'))
+        rc, cpu = run_request(request, output, (infd, outfd))
+        output.write(b'X %d %.6f\n' % (rc, cpu))
+        output.flush()
+
+
+def run_request(request, output, fds):
+    """Run 'request' in a forked child and relay its output.
+
+    Returns a two-tuple of exit code and CPU seconds of the child.
+    """
+    import selectors
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    outr, outw = os.pipe()
+    errr, errw = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        for fd in fds + (outr, errr):
+            os.close(fd)
+        os.dup2(outw, 1)
+        os.dup2(errw, 2)
+        os.close(outw)
+        os.close(errw)
+        run_child(request)
+
+    os.close(outw)
+    os.close(errw)
+
+    selector = selectors.DefaultSelector()
+    selector.register(outr, selectors.EVENT_READ, b'O')
+    selector.register(errr, selectors.EVENT_READ, b'E')
+    while selector.get_map():
+        for key, events in selector.select():
+            data = os.read(key.fd, CHUNKSIZE)
+            if data:
+                output.write(b'%s %d\n' % (key.data, len(data)) + data)
+                output.flush()
+            else:
+                selector.unregister(key.fd)
+                os.close(key.fd)
+    selector.close()
+
+    pid, status, usage = os.wait4(pid, 0)
+    cpu = usage.ru_utime + usage.ru_stime
+    if os.WIFSIGNALED(status):
+        return 128 + os.WTERMSIG(status), cpu
+    return os.WEXITSTATUS(status), cpu
+
+
+def run_child(request):
+    """Run setup.py as requested and exit.
+
+    Runs in the forked child.
+    """
+    import signal
+    import importlib
+
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    rc = 1
+    try:
+        from jarn.mkrelease import setup
+        os.chdir(request['cwd'])
+        # The worker may have seen a different working directory
+        importlib.invalidate_caches()
+        setup.run(request['args'],
+                  ff=request.get('ff', ''),
+                  manifest=request.get('manifest', ''),
+                  cachedir=request.get('cachedir', ''))
+        rc = 0
+    except SystemExit as e:
+        # Like the interpreter does
+        if e.code is None:
+            rc = 0
+        elif isinstance(e.code, int):
+            rc = e.code
+        else:
+            print(e.code, file=sys.stderr)
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(rc)
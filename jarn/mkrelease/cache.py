@@ -0,0 +1,321 @@
+import os
+import re
+import json
+import hashlib
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from os.path import join, expanduser, realpath, dirname, basename, isdir
+from shutil import which, rmtree, copy2
+
+
+def get_cache_dir(dir=''):
+    """Return the mkrelease cache directory.
+
+    Defaults to $XDG_CACHE_HOME/mkrelease or ~/.cache/mkrelease.
+    """
+    if dir:
+        return expanduser(dir)
+    base = os.environ.get('XDG_CACHE_HOME') or expanduser('~/.cache')
+    return join(base, 'mkrelease')
+
+
+def write_json(filename, data):
+    """Atomically write 'data' to 'filename' as JSON.
+
+    Errors are ignored; the cache is an optimization only.
+    """
+    try:
+        os.makedirs(dirname(filename), exist_ok=True)
+        fd, tempname = tempfile.mkstemp(dir=dirname(filename), prefix='.tmp-')
+        with os.fdopen(fd, 'wt') as file:
+            json.dump(data, file, indent=1, sort_keys=True)
+        os.replace(tempname, filename)
+    except (IOError, OSError, TypeError, ValueError):
+        pass
+
+
+def read_json(filename, default=None):
+    """Read JSON data from 'filename'.
+
+    Returns 'default' if the file is missing or broken.
+    """
+    try:
+        with open(filename, 'rt') as file:
+            return json.load(file)
+    except (IOError, OSError, ValueError):
+        return default
+
+
+class VersionCache(object):
+    """Persistent cache of tool versions.
+
+    Versions are keyed by executable path and mtime, so an upgraded
+    tool is detected without spawning it.
+    """
+
+    def __init__(self, cachedir=''):
+        self.filename = join(get_cache_dir(cachedir), 'versions.json')
+        self._data = None
+
+    def get(self, executable, get_version):
+        """Return the version of 'executable'.
+
+        Calls 'get_version' on cache misses and stores the result.
+        """
+        path = which(executable)
+        if not path:
+            return get_version()
+        path = realpath(path)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return get_version()
+
+        if self._data is None:
+            self._data = read_json(self.filename, {})
+            if not isinstance(self._data, dict):
+                self._data = {}
+
+        entry = self._data.get(path)
+        if isinstance(entry, list) and len(entry) == 2 and entry[0] == mtime:
+            return entry[1]
+
+        version = get_version()
+        if version:
+            self._data[path] = [mtime, version]
+            write_json(self.filename, self._data)
+        return version
+
+
+class FileLock(object):
+    """Advisory lock on 'filename', exclusive unless 'shared' is True.
+
+    If 'wait' is False, acquire returns False instead of blocking.
+    Locking is a no-op on systems without fcntl.
+    """
+
+    def __init__(self, filename, shared=False):
+        self.filename = filename
+        self.shared = shared
+        self.file = None
+
+    def acquire(self, wait=True):
+        os.makedirs(dirname(self.filename), exist_ok=True)
+        self.file = open(self.filename, 'ab')
+        if fcntl is not None:
+            flags = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+            if not wait:
+                flags |= fcntl.LOCK_NB
+            try:
+                fcntl.flock(self.file.fileno(), flags)
+            except (IOError, OSError):
+                self.file.close()
+                self.file = None
+                return False
+        return True
+
+    def release(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *ignored):
+        self.release()
+
+
+class MirrorCache(object):
+    """Persistent cache of repository mirrors.
+
+    Mirrors are keyed by SCM name and URL. Each mirror has a lock
+    file whose mtime records the last use; 'evict' removes the least
+    recently used mirrors beyond 'maxsize'. Mirrors in use by clones
+    are protected by a second, shared lock.
+    """
+
+    def __init__(self, cachedir='', maxsize=20):
+        self.basedir = join(get_cache_dir(cachedir), 'mirrors')
+        self.maxsize = maxsize
+
+    def get_mirror(self, scmname, url):
+        """Return the mirror directory for 'url'.
+        """
+        key = hashlib.sha1(('%s %s' % (scmname, url)).encode('utf-8')).hexdigest()
+        name = basename(url.rstrip('/')) or scmname
+        if name.endswith('.git'):
+            name = name[:-4]
+        name = ''.join([x if x.isalnum() or x in '.-_' else '_' for x in name])
+        return join(self.basedir, '%s-%s' % (name, key[:12]))
+
+    def lock(self, mirror):
+        """Return a lock for 'mirror' and mark the mirror as used.
+        """
+        lock = FileLock(mirror + '.lock')
+        os.makedirs(self.basedir, exist_ok=True)
+        open(lock.filename, 'ab').close()
+        os.utime(lock.filename)
+        return lock
+
+    def use(self, mirror):
+        """Return a shared lock keeping 'mirror' from being evicted.
+
+        Hold it for as long as clones borrow objects from the mirror.
+        """
+        return FileLock(mirror + '.use', shared=True)
+
+    def evict(self):
+        """Remove least recently used mirrors beyond 'maxsize'.
+
+        Mirrors locked or in use by other processes are skipped.
+        """
+        mirrors = []
+        try:
+            names = os.listdir(self.basedir)
+        except OSError:
+            return
+        for name in names:
+            mirror = join(self.basedir, name)
+            if isdir(mirror):
+                try:
+                    mtime = os.stat(mirror + '.lock').st_mtime
+                except OSError:
+                    mtime = 0
+                mirrors.append((mtime, mirror))
+        mirrors.sort(reverse=True)
+
+        for mtime, mirror in mirrors[max(self.maxsize, 1):]:
+            lock = FileLock(mirror + '.lock')
+            if lock.acquire(wait=False):
+                try:
+                    inuse = FileLock(mirror + '.use')
+                    if inuse.acquire(wait=False):
+                        try:
+                            rmtree(mirror, ignore_errors=True)
+                        finally:
+                            inuse.release()
+                finally:
+                    lock.release()
+
+
+def file_digest(filename):
+    """Return the sha256 hex digest of 'filename'.
+    """
+    hash = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(2**20), b''):
+            hash.update(chunk)
+    return hash.hexdigest()
+
+
+def normalize_name(name):
+    """Normalize 'name' the way distfile names are, loosely.
+    """
+    return re.sub(r'[-_.]+', '_', name).lower()
+
+
+def is_distfile_of(filename, name, version):
+    """Return True if 'filename' is a distfile of release 'name' 'version'.
+    """
+    prefix = normalize_name('%s-%s' % (name, version))
+    return normalize_name(filename).startswith(prefix + '_')
+
+
+class BuildCache(object):
+    """Content-addressed cache of built distributions.
+
+    Entries are keyed by a hash of the source id and build flags and
+    hold the distfiles plus a manifest of their digests. The least
+    recently used entries are evicted beyond 'maxsize'.
+    """
+
+    def __init__(self, cachedir='', maxsize=20):
+        self.basedir = join(get_cache_dir(cachedir), 'builds')
+        self.maxsize = maxsize
+
+    @staticmethod
+    def get_key(*parts):
+        """Return a cache key for 'parts', which must be JSON serializable.
+        """
+        data = json.dumps(parts, sort_keys=True).encode('utf-8')
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, key, distdir, name='', version=''):
+        """Copy the cached distfiles for 'key' to 'distdir'.
+
+        If 'name' and 'version' are given, all distfiles must be
+        of that release. Returns the list of copied files or None
+        on cache misses.
+        """
+        entry = join(self.basedir, key)
+        manifest = read_json(join(entry, 'manifest.json'))
+        if not isinstance(manifest, dict) or not manifest.get('files'):
+            return None
+
+        distfiles = []
+        try:
+            for filename, digest in manifest['files']:
+                if name and not is_distfile_of(filename, name, version):
+                    return None
+                if file_digest(join(entry, filename)) != digest:
+                    return None
+            os.makedirs(distdir, exist_ok=True)
+            for filename, digest in manifest['files']:
+                distfile = join(distdir, filename)
+                copy2(join(entry, filename), distfile)
+                distfiles.append(distfile)
+            os.utime(entry)
+        except (IOError, OSError, TypeError, ValueError):
+            return None
+        return distfiles
+
+    def put(self, key, distfiles):
+        """Store 'distfiles' under 'key'.
+
+        Errors are ignored; the cache is an optimization only.
+        """
+        entry = join(self.basedir, key)
+        try:
+            os.makedirs(self.basedir, exist_ok=True)
+            tempdir = tempfile.mkdtemp(dir=self.basedir, prefix='.tmp-')
+            try:
+                files = []
+                for distfile in distfiles:
+                    name = basename(distfile)
+                    copy2(distfile, join(tempdir, name))
+                    files.append([name, file_digest(distfile)])
+                write_json(join(tempdir, 'manifest.json'), {'files': files})
+                if isdir(entry):
+                    rmtree(entry)
+                os.rename(tempdir, entry)
+            finally:
+                rmtree(tempdir, ignore_errors=True)
+        except (IOError, OSError):
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries beyond 'maxsize'.
+        """
+        entries = []
+        try:
+            names = os.listdir(self.basedir)
+        except OSError:
+            return
+        for name in names:
+            entry = join(self.basedir, name)
+            if not name.startswith('.') and isdir(entry):
+                try:
+                    entries.append((os.stat(entry).st_mtime, entry))
+                except OSError:
+                    pass
+        entries.sort(reverse=True)
+        for mtime, entry in entries[max(self.maxsize, 1):]:
+            rmtree(entry, ignore_errors=True)
@@ -1,25 +1,37 @@
 import os
-import functools
-import blessed
 
+_term = None
 
-def color(func):
-    assignments = functools.WRAPPER_ASSIGNMENTS
-    if not hasattr(func, '__name__'):
-        assignments = [x for x in assignments if x != '__name__']
 
-    @functools.wraps(func, assignments)
+def get_term():
+    """Return the blessed terminal, creating it on first use.
+
+    Creating a terminal probes its capabilities, which is too
+    expensive to do at import time.
+    """
+    global _term
+    if _term is None:
+        import blessed
+        _term = blessed.Terminal()
+    return _term
+
+
+def color(name):
     def wrapper(string):
         if os.environ.get('JARN_NO_COLOR') == '1':
             return string
-        return func(string)
+        return getattr(get_term(), name)(string)
+    wrapper.__name__ = name
     return wrapper
 
 
-term = blessed.Terminal()
+def __getattr__(name):
+    if name == 'term':
+        return get_term()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
-bold = color(term.bold)
-blue = color(term.bold_blue)
-green = color(term.bold_green)
-red = color(term.bold_red)
 
+bold = color('bold')
+blue = color('bold_blue')
+green = color('bold_green')
+red = color('bold_red')
@@ -0,0 +1,176 @@
+import os
+import re
+import hashlib
+import subprocess
+
+from os.path import join, abspath, dirname, isdir, isfile
+
+from .cache import get_cache_dir
+
+# Commands listing tracked files below the current directory. Subversion
+# has no NUL-separated working copy listing and is left to the
+# setuptools-subversion extension.
+LISTINGS = {
+    'git': ['git', 'ls-files', '-z'],
+    'hg': ['hg', 'files', '-0', '.'],
+}
+
+MARKERS = {
+    'git': '.git',
+    'hg': '.hg',
+}
+
+# Files that change whenever the checked out revision or the set of
+# tracked files changes
+STATE_FILES = {
+    'git': 'index',
+    'hg': 'dirstate',
+}
+
+# SCM metadata files like .gitignore and .hgtags
+SKIP = re.compile(br'(?:^|/)\.(?:hg|git)[^/]*$').search
+
+
+def get_state(ff, dir=''):
+    """Return a string identifying the state of the sandbox containing 'dir'.
+
+    Returns the empty string if the state cannot be determined.
+    """
+    path = abspath(dir or os.curdir)
+    while True:
+        marker = join(path, MARKERS[ff])
+        if isdir(marker) or isfile(marker):
+            break
+        parent = dirname(path)
+        if parent == path:
+            return ''
+        path = parent
+
+    if isfile(marker):
+        # Git worktrees and submodules
+        try:
+            with open(marker, 'rt') as file:
+                line = file.readline().strip()
+        except (IOError, OSError):
+            return ''
+        if not line.startswith('gitdir:'):
+            return ''
+        marker = join(path, line[7:].strip())
+
+    try:
+        info = os.stat(join(marker, STATE_FILES[ff]))
+    except OSError:
+        return ''
+    return '%s %d %d' % (marker, info.st_mtime_ns, info.st_size)
+
+
+def list_files(ff, dir=''):
+    """Run the listing command of 'ff' and return the filtered output as bytes.
+
+    Returns None if the command fails.
+    """
+    cmd = LISTINGS[ff]
+    env = os.environ.copy()
+    # Mercurial must not see our PYTHONPATH
+    env.pop('PYTHONPATH', None)
+    env['HGPLAIN'] = '1'
+    try:
+        process = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                 cwd=dir or None, env=env)
+    except OSError:
+        return None
+    if process.returncode != 0:
+        return None
+    names = process.stdout.split(b'\0')
+    return b'\0'.join([x for x in names if x and not SKIP(x)])
+
+
+class FileFinder(object):
+    """Find files under version control, caching listings per sandbox state.
+
+    Listings are cached per sandbox path; the least recently used
+    listings are evicted beyond 'maxsize'.
+    """
+
+    def __init__(self, ff, cachedir='', maxsize=100):
+        self.ff = ff
+        self.cachedir = cachedir
+        self.maxsize = maxsize
+
+    def get_cache_file(self, dir):
+        key = '%s %s' % (self.ff, abspath(dir or os.curdir))
+        name = hashlib.sha256(key.encode('utf-8', 'surrogateescape')).hexdigest()
+        return join(get_cache_dir(self.cachedir), 'files', name)
+
+    def read_cache(self, filename, state):
+        try:
+            with open(filename, 'rb') as file:
+                data = file.read()
+        except (IOError, OSError):
+            return None
+        header, sep, listing = data.partition(b'\n')
+        if sep and header == os.fsencode(state):
+            try:
+                os.utime(filename)
+            except OSError:
+                pass
+            return listing
+        return None
+
+    def write_cache(self, filename, state, listing):
+        # Errors are ignored; the cache is an optimization only
+        try:
+            os.makedirs(dirname(filename), exist_ok=True)
+            tempname = '%s.%d' % (filename, os.getpid())
+            with open(tempname, 'wb') as file:
+                file.write(os.fsencode(state) + b'\n' + listing)
+            os.replace(tempname, filename)
+        except (IOError, OSError):
+            return
+        self.evict(dirname(filename))
+
+    def evict(self, dir):
+        """Remove least recently used listings beyond 'maxsize'.
+        """
+        entries = []
+        try:
+            names = os.listdir(dir)
+        except OSError:
+            return
+        for name in names:
+            filename = join(dir, name)
+            try:
+                entries.append((os.stat(filename).st_mtime, filename))
+            except OSError:
+                pass
+        entries.sort(reverse=True)
+        for mtime, filename in entries[max(self.maxsize, 1):]:
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+    def find_files(self, dir=''):
+        """Return the files under version control below 'dir'.
+
+        Paths are relative to 'dir'. Returns None if the SCM cannot
+        list files.
+        """
+        listing = None
+        state = filename = ''
+        if self.cachedir:
+            state = get_state(self.ff, dir)
+            if state:
+                filename = self.get_cache_file(dir)
+                listing = self.read_cache(filename, state)
+
+        if listing is None:
+            listing = list_files(self.ff, dir)
+            if listing is None:
+                return None
+            if filename:
+                self.write_cache(filename, state, listing)
+
+        if not listing:
+            return []
+        return os.fsdecode(listing).split('\0')
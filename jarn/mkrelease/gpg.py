@@ -0,0 +1,55 @@
+import os
+
+from os.path import basename
+
+from .process import Process
+from .exit import err_exit
+from .colors import bold
+
+
+class GPG(object):
+    """GnuPG signing abstraction."""
+
+    def __init__(self, process=None, gpg='gpg'):
+        self.process = process or Process()
+        self.gpg = gpg
+
+    def get_sign_cmd(self, distfile, identity=''):
+        gpg = self.gpg
+        identity = ' --local-user "%s"' % identity if identity else ''
+        return '"%(gpg)s" --detach-sign -a%(identity)s "%(distfile)s"' % locals()
+
+    def sign_distfiles(self, distfiles, identity=''):
+        """Create detached signatures for all 'distfiles'.
+
+        The first file is signed alone so gpg-agent asks for the
+        passphrase once; the remaining files are signed concurrently.
+        Returns the list of signature files.
+        """
+        if not self.process.quiet:
+            print(bold('running gpg_sign'))
+
+        for distfile in distfiles:
+            try:
+                os.remove(distfile+'.asc')
+            except (IOError, OSError):
+                pass
+
+        if not distfiles:
+            return []
+
+        for distfile in distfiles:
+            if not self.process.quiet:
+                name = basename(distfile)
+                print('Signing %(name)s' % locals())
+
+        first, rest = distfiles[0], distfiles[1:]
+        results = [self.process.popen(self.get_sign_cmd(first, identity), echo=False)]
+        if results[0][0] == 0 and rest:
+            results.extend(self.process.popen_many(
+                [self.get_sign_cmd(x, identity) for x in rest], echo=False))
+
+        for rc, lines in results:
+            if rc != 0:
+                err_exit('ERROR: signing failed')
+        return [x+'.asc' for x in distfiles]
@@ -0,0 +1,121 @@
+import re
+import json
+import base64
+
+from os.path import basename
+from urllib.request import Request, urlopen
+from urllib.parse import urlsplit, urljoin, unquote
+
+from .cache import file_digest
+
+PYPI_UPLOAD = 'https://upload.pypi.org/legacy/'
+
+SIMPLE_JSON = 'application/vnd.pypi.simple.v1+json'
+SIMPLE_HTML = 'application/vnd.pypi.simple.v1+html;q=0.2, text/html;q=0.01'
+
+# Upload endpoints of well-known indexes and their simple APIs
+SIMPLE_URLS = {
+    'upload.pypi.org': 'https://pypi.org/simple/',
+    'test.pypi.org': 'https://test.pypi.org/simple/',
+}
+
+LINK_RE = re.compile(r'<a\s[^>]*href=["\']([^"\']+)["\']', re.IGNORECASE)
+
+
+def normalize(name):
+    """Return the PEP 503 normalized form of project 'name'.
+    """
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def get_project_name(filename):
+    """Return the project name encoded in distribution 'filename'.
+    """
+    name = basename(filename)
+    if name.endswith(('.whl', '.egg')):
+        return name.split('-')[0]
+    for ext in ('.tar.gz', '.zip'):
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+    return name.rsplit('-', 1)[0]
+
+
+def get_simple_url(repository):
+    """Return the simple API URL for upload URL 'repository'.
+
+    Returns the empty string if the index is not known.
+    """
+    host = urlsplit(repository or PYPI_UPLOAD).hostname
+    return SIMPLE_URLS.get(host, '')
+
+
+class Index(object):
+    """Query a package index via the simple repository API.
+
+    Supports the JSON (PEP 691) and HTML (PEP 503) forms.
+    """
+
+    def __init__(self, url, username='', password='', timeout=20):
+        self.url = url.rstrip('/') + '/'
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+
+    def get_files(self, project):
+        """Return a dict mapping filenames of 'project' to sha256 digests.
+
+        Digests are empty if the index does not publish them.
+        Raises an IOError subclass if the index is not reachable and
+        http.client.HTTPException if the response is broken.
+        """
+        url = urljoin(self.url, normalize(project) + '/')
+        request = Request(url, headers={'Accept': '%s, %s' % (SIMPLE_JSON, SIMPLE_HTML)})
+        if self.username and self.password:
+            auth = '%s:%s' % (self.username, self.password)
+            auth = base64.b64encode(auth.encode('utf-8')).decode('ascii')
+            request.add_header('Authorization', 'Basic %s' % auth)
+        try:
+            response = urlopen(request, timeout=self.timeout)
+        except IOError as e:
+            if getattr(e, 'code', None) == 404:
+                return {}
+            raise
+        with response:
+            content_type = response.headers.get('Content-Type', '')
+            body = response.read().decode('utf-8', 'replace')
+        if content_type.startswith(SIMPLE_JSON):
+            return self.parse_json(body)
+        return self.parse_html(body)
+
+    def parse_json(self, body):
+        files = {}
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return files
+        for file in data.get('files', []):
+            files[file['filename']] = file.get('hashes', {}).get('sha256', '')
+        return files
+
+    def parse_html(self, body):
+        files = {}
+        for href in LINK_RE.findall(body):
+            href = href.replace('&amp;', '&')
+            path, sep, fragment = href.partition('#')
+            filename = unquote(basename(urlsplit(path).path))
+            digest = ''
+            if fragment.startswith('sha256='):
+                digest = fragment[7:]
+            files[filename] = digest
+        return files
+
+    def get_existing(self, distfiles):
+        """Return the distfiles already present on the index.
+
+        Files must match by name and sha256 digest.
+        """
+        if not distfiles:
+            return []
+        files = self.get_files(get_project_name(distfiles[0]))
+        return [x for x in distfiles
+                if files.get(basename(x)) and files[basename(x)] == file_digest(x)]
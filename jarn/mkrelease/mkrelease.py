@@ -1,36 +1,28 @@
-try:
-    from importlib.metadata import version
-except ImportError:
-    from importlib_metadata import version
-
-__version__ = version('jarn.mkrelease')
-
 import sys
 import os
 import getopt
 import tempfile
 import shutil
+import copy
 
-from os.path import abspath, join, expanduser, exists, isfile
+from os.path import abspath, join, expanduser, exists, isfile, dirname, basename
 from itertools import chain
+from lazy import lazy
 
 from .python import Python
-from .setuptools import Setuptools
-from .twine import Twine
-from .scp import SCP
-from .scm import SCMFactory
+from .cache import VersionCache, MirrorCache, BuildCache
 from .urlparser import URLParser
+from .timing import timings, timed
 from .configparser import ConfigParser
 from .exit import err_exit, msg_exit, warn
 from .colors import green, blue
 
 MAXALIASDEPTH = 23
-
-VERSION = "jarn.mkrelease %s" % __version__
 USAGE = "Try 'mkrelease --help' for more information"
 
 HELP = """\
 Usage: mkrelease [options] [scm-sandbox|scm-url [rev]]
+       mkrelease [options] -B [scm-sandbox|scm-url ...]
 
 Python package releaser
 
@@ -64,6 +56,14 @@ Options:
   -e, --develop         Allow setuptools build tags. Implies -T.
   -q, --quiet           Suppress output of setuptools commands.
 
+  -B, --batch           Release all packages given as arguments.
+  -F batch-file, --batch-file=batch-file
+                        Release all packages listed in batch-file.
+                        Implies -B.
+  -j workers, --jobs=workers
+                        Maximum number of concurrent releases, builds,
+                        and uploads.
+
   -t twine, --twine=twine
                         Override the twine executable used.
 
@@ -75,6 +75,9 @@ Options:
   -v, --version         Print the version string and exit.
 
   --no-color            Disable output colors.
+  --timing              Print a summary of where time was spent.
+  --timing-file=file    Write timings to file as JSON.
+  --chrome-trace=file   Write timings to file in Chrome trace format.
   --non-interactive     Do not prompt for username and password if the
                         required credentials are missing.
 
@@ -86,6 +89,25 @@ Arguments:
 """
 
 
+def get_version():
+    """Return the version of jarn.mkrelease.
+    """
+    try:
+        from importlib.metadata import version
+    except ImportError:
+        from importlib_metadata import version
+    return version('jarn.mkrelease')
+
+
+def __getattr__(name):
+    # Reading package metadata is expensive, compute on demand
+    if name == '__version__':
+        return get_version()
+    if name == 'VERSION':
+        return 'jarn.mkrelease %s' % get_version()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
 class Defaults(object):
 
     def __init__(self, config_file):
@@ -117,6 +139,17 @@ class Defaults(object):
         self.quiet = parser.getboolean(main_section, 'quiet', False)
         self.twine = parser.getstring(main_section, 'twine', '')
         self.interactive = parser.getboolean(main_section, 'interactive', True)
+        self.workers = parser.getint(main_section, 'workers', 4)
+        self.multiplex = parser.getboolean(main_section, 'ssh-multiplex', False)
+        self.cachedir = parser.getstring(main_section, 'cache-dir', '')
+        self.clonecache = parser.getboolean(main_section, 'clone-cache', False)
+        self.clonecachesize = parser.getint(main_section, 'clone-cache-size', 20)
+        self.buildcache = parser.getboolean(main_section, 'build-cache', False)
+        self.buildcachesize = parser.getint(main_section, 'build-cache-size', 20)
+        self.skipexisting = parser.getboolean(main_section, 'skip-existing', None)
+        self.directupload = parser.getboolean(main_section, 'direct-upload', False)
+        self.buildworker = parser.getboolean(main_section, 'build-worker', False)
+        self.parallelbuilds = parser.getboolean(main_section, 'parallel-builds', False)
 
         for format in self.formats:
             if format not in ('zip', 'gztar', 'egg', 'wheel'):
@@ -131,6 +164,10 @@ class Defaults(object):
                 self.sign = parser.getboolean(server_section, 'sign', None)
                 self.identity = parser.getstring(server_section, 'identity', None)
                 self.register = parser.getboolean(server_section, 'register', None)
+                self.repository = parser.getstring(server_section, 'repository', '')
+                self.username = parser.getstring(server_section, 'username', '')
+                self.password = parser.getstring(server_section, 'password', '')
+                self.indexurl = parser.getstring(server_section, 'index-url', '')
 
         self.servers = {}
         for server in parser.getlist('distutils', 'index-servers', []):
@@ -264,16 +301,48 @@ class ReleaseMaker(object):
         """
         self.args = args
 
+    # Tools are created on first use; importing them is expensive
+    # and not needed for --help, --version, and --list-locations
+
+    @lazy
+    def setuptools(self):
+        from .setuptools import Setuptools
+        from .cache import get_cache_dir
+        return Setuptools(cachedir=get_cache_dir(self.defaults.cachedir))
+
+    @lazy
+    def twine(self):
+        from .twine import Twine
+        return Twine(defaults=self.defaults)
+
+    @lazy
+    def scp(self):
+        from .scp import SCP
+        return SCP(defaults=self.defaults)
+
+    @lazy
+    def gpg(self):
+        from .gpg import GPG
+        return GPG()
+
+    @lazy
+    def uploader(self):
+        from .uploader import Uploader
+        return Uploader(defaults=self.defaults)
+
+    @lazy
+    def scms(self):
+        from .scm import SCMFactory
+        return SCMFactory(versions=VersionCache(self.defaults.cachedir))
+
     def set_defaults(self, config_file):
         """Set defaults.
         """
         self.defaults = Defaults(config_file)
         self.locations = Locations(defaults=self.defaults)
         self.python = Python()
-        self.setuptools = Setuptools()
-        self.twine = Twine(defaults=self.defaults)
-        self.scp = SCP(defaults=self.defaults)
-        self.scms = SCMFactory()
+        for name in ('setuptools', 'twine', 'scp', 'gpg', 'uploader', 'scms'):
+            lazy.invalidate(self, name)
         self.urlparser = URLParser()
         self.skipcommit = not self.defaults.commit
         self.skiptag = not self.defaults.tag
@@ -293,6 +362,19 @@ class ReleaseMaker(object):
         self.distributions = []
         self.directory = os.curdir
         self.scm = None
+        self.batch = False
+        self.packages = []
+        self.timing = False
+        self.timingfile = ''
+        self.chrometrace = ''
+        self.workers = self.defaults.workers
+        self.tempdir = ''
+        self.inuse = None
+        self.sandbox = ''
+        self.name = ''
+        self.version = ''
+        self.tagid = ''
+        self.tagremote = ''
 
     def reset_defaults(self, config_file):
         """Reset defaults.
@@ -310,13 +392,14 @@ class ReleaseMaker(object):
         """
         try:
             options, remaining_args = getopt.gnu_getopt(args,
-                'CPRSTbc:d:eghi:lmnpqst:vwz',
+                'BCF:PRSTbc:d:eghi:j:lmnpqst:vwz',
                 ('no-commit', 'no-tag', 'no-register', 'no-upload', 'dry-run',
                  'sign', 'identity=', 'dist-location=', 'version', 'help',
                  'push', 'quiet', 'svn', 'hg', 'git', 'develop', 'binary',
                  'list-locations', 'config-file=', 'wheel', 'zip', 'gztar',
                  'manifest-only', 'trace', 'egg', 'no-push', 'twine=',
-                 'no-color', 'non-interactive'))
+                 'no-color', 'non-interactive', 'batch', 'batch-file=', 'jobs=',
+                 'timing', 'timing-file=', 'chrome-trace='))
         except getopt.GetoptError as e:
             err_exit('mkrelease: %s\n%s' % (e.msg.capitalize(), USAGE))
 
@@ -350,7 +433,7 @@ class ReleaseMaker(object):
             elif name in ('-h', '--help'):
                 msg_exit(HELP)
             elif name in ('-v', '--version'):
-                msg_exit(VERSION)
+                msg_exit('jarn.mkrelease %s' % get_version())
             elif name in ('--svn', '--hg', '--git'):
                 self.scmtype = name[2:]
             elif name in ('-e', '--develop'):
@@ -367,11 +450,29 @@ class ReleaseMaker(object):
                 os.environ['JARN_TRACE'] = '1'
             elif name in ('--no-color',):
                 os.environ['JARN_NO_COLOR'] = '1'
+            elif name in ('--timing',):
+                self.timing = timings.enabled = True
+            elif name in ('--timing-file',):
+                self.timingfile = expanduser(value)
+                timings.enabled = True
+            elif name in ('--chrome-trace',):
+                self.chrometrace = expanduser(value)
+                timings.enabled = True
             elif name in ('-t', '--twine'):
                 self.twine.twine = expanduser(value)
             elif name in ('--non-interactive',):
                 self.twine.interactive = False
                 self.scp.interactive = False
+            elif name in ('-B', '--batch'):
+                self.batch = True
+            elif name in ('-F', '--batch-file'):
+                self.batch = True
+                self.packages.extend(self.read_batch_file(expanduser(value)))
+            elif name in ('-j', '--jobs'):
+                try:
+                    self.workers = int(value, 10)
+                except ValueError:
+                    err_exit('mkrelease: Not an integer: %s\n%s' % (value, USAGE))
             elif name in ('-c', '--config-file') and depth == 0:
                 self.reset_defaults(expanduser(value))
                 return self.parse_options(args, depth+1)
@@ -414,30 +515,41 @@ class ReleaseMaker(object):
         """
         return self.skipupload or not self.defaults.upload
 
-    def get_uploadflags(self, location):
-        """Return uploadflags for the given server.
+    def get_signing(self, location):
+        """Return (sign, identity) for the given server.
         """
-        uploadflags = []
         server = self.defaults.servers[location]
+        sign = False
+        identity = ''
 
         if self.sign:
-            uploadflags.append('--sign')
+            sign = True
         elif server.sign is not None:
-            if server.sign:
-                uploadflags.append('--sign')
+            sign = server.sign
         elif self.defaults.sign:
-            uploadflags.append('--sign')
+            sign = True
 
         if self.identity:
-            if '--sign' not in uploadflags:
-                uploadflags.append('--sign')
-            uploadflags.append('--identity="%s"' % self.identity)
-        elif '--sign' in uploadflags:
+            sign = True
+            identity = self.identity
+        elif sign:
             if server.identity is not None:
-                if server.identity:
-                    uploadflags.append('--identity="%s"' % server.identity)
+                identity = server.identity
             elif self.defaults.identity:
-                uploadflags.append('--identity="%s"' % self.defaults.identity)
+                identity = self.defaults.identity
+
+        return sign, identity
+
+    def get_uploadflags(self, location):
+        """Return uploadflags for the given server.
+        """
+        uploadflags = []
+        sign, identity = self.get_signing(location)
+
+        if sign:
+            uploadflags.append('--sign')
+            if identity:
+                uploadflags.append('--identity="%s"' % identity)
 
         return uploadflags
 
@@ -451,6 +563,15 @@ class ReleaseMaker(object):
         """
         args = self.parse_options(self.args)
 
+        if self.list:
+            self.list_locations()
+
+        if self.batch:
+            self.packages.extend([(x, '') for x in args])
+            if not self.packages:
+                err_exit('mkrelease: No packages to release\n%s' % USAGE)
+            args = []
+
         if args:
             self.directory = args[0]
 
@@ -478,9 +599,6 @@ class ReleaseMaker(object):
             self.distributions.append(('sdist', ['--formats="gztar"']))
             self.distributions.append(('bdist_wheel', []))
 
-        if self.list:
-            self.list_locations()
-
         if not self.locations:
             self.locations.extend(self.locations.get_default_location())
 
@@ -500,6 +618,159 @@ class ReleaseMaker(object):
                 self.locations.check_empty_locations()
             self.locations.check_valid_locations()
 
+    def read_batch_file(self, filename):
+        """Return the list of (directory, branch) tuples in filename.
+
+        Relative sandbox paths are relative to the batch file.
+        """
+        packages = []
+        try:
+            with open(filename, 'rt') as file:
+                lines = file.readlines()
+        except (IOError, OSError) as e:
+            err_exit('mkrelease: %s: %s' % (e.strerror or e, filename))
+
+        basedir = dirname(abspath(filename))
+        for line in lines:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            parts = line.split()
+            directory, branch = parts[0], ''
+            if self.urlparser.is_url(directory) or self.urlparser.is_ssh_url(directory):
+                if len(parts) > 1:
+                    branch = parts[1]
+            else:
+                directory = join(basedir, expanduser(directory))
+            if len(parts) > 2 or (len(parts) > 1 and not branch):
+                err_exit('mkrelease: Invalid line in %(filename)s: %(line)s' % locals())
+            packages.append((directory, branch))
+        return packages
+
+    def release_packages(self):
+        """Release all packages of a batch.
+
+        Packages share configuration, setuptools, twine, and SCM objects.
+        Builds and uploads run in worker processes unless they may prompt
+        for input.
+        """
+        packages = self.packages
+        workers = min(len(packages), self.workers)
+
+        # Prompts need the terminal to themselves
+        interactive = self.twine.interactive and not (
+            self.skipcommit and self.skiptag and self.skipregister and self.skipupload)
+
+        from .workers import can_fork, call
+
+        if workers < 2 or interactive or not can_fork():
+            results = [call(self.release_package, x) for x in packages]
+        else:
+            results = self.release_forked(packages, workers)
+
+        failed = [x[0] for x, rc in zip(packages, results) if rc != 0]
+        if failed:
+            failed = ', '.join(failed)
+            err_exit('ERROR: release failed for %(failed)s' % locals())
+
+    def release_package(self, directory, branch):
+        """Release a single package of a batch.
+        """
+        maker = self.get_maker(directory, branch)
+        with timed('release %(directory)s' % locals()):
+            maker.get_package()
+            maker.make_release()
+
+    def release_forked(self, packages, workers):
+        """Release the packages of a batch, building and uploading in worker processes.
+
+        Packages may share sandboxes and repositories, so commits, tags,
+        and pushes run in this process, one package at a time.
+        Returns the list of exit codes.
+        """
+        from .workers import run_forked, call
+
+        makers = [self.get_maker(*x) for x in packages]
+        try:
+            results = [call(x.prepare_release, ()) for x in makers]
+
+            ready = [i for i, rc in enumerate(results) if rc == 0]
+            distfiles = []
+            built = run_forked(
+                lambda maker: maker.build_forked(),
+                [(makers[i],) for i in ready], workers, distfiles)
+
+            for i, rc in zip(ready, built):
+                results[i] = rc
+                if rc != 0 and makers[i].tagid:
+                    maker = makers[i]
+                    maker.remove_tag(maker.sandbox, maker.tagid, maker.tagremote)
+
+            ready = [(i, x) for i, x, rc in zip(ready, distfiles, built) if rc == 0]
+            uploaded = run_forked(
+                lambda maker, distfiles: maker.upload_forked(distfiles),
+                [(makers[i], x) for i, x in ready], workers)
+
+            for (i, x), rc in zip(ready, uploaded):
+                results[i] = rc
+        finally:
+            for maker in makers:
+                maker.cleanup_release()
+        return results
+
+    def get_maker(self, directory, branch):
+        """Return a copy of this ReleaseMaker for a package of a batch.
+        """
+        maker = copy.copy(self)
+        maker.directory = directory
+        maker.branch = branch
+        maker.scm = None
+        return maker
+
+    def prepare_release(self):
+        """Commit, check out, and tag a package of a batch.
+
+        The tag is pushed right away.
+        """
+        directory = self.directory
+
+        from .workers import replay
+
+        with timed('release %(directory)s' % locals()):
+            self.get_package()
+            self.tempdir = abspath(tempfile.mkdtemp(prefix='mkrelease-'))
+            self.checkout_release()
+
+            if self.tagremote:
+                rc, output = self.push_tag(self.sandbox, self.tagid, self.tagremote)
+                replay(output)
+                if rc != 0:
+                    self.remove_tag(self.sandbox, self.tagid)
+                    err_exit('Push failed')
+
+    def build_forked(self):
+        """Build a package prepared by 'prepare_release' and return its distfiles.
+        """
+        directory = self.directory
+
+        buildworker = self.defaults.buildworker
+        if buildworker:
+            self.setuptools.start_build_workers()
+        try:
+            with timed('build %(directory)s' % locals()):
+                return self.build_release()
+        finally:
+            if buildworker:
+                self.setuptools.stop_build_workers()
+
+    def upload_forked(self, distfiles):
+        """Upload the distfiles of a package built by 'build_forked'.
+        """
+        directory = self.directory
+
+        with timed('upload %(directory)s' % locals()):
+            self.upload_locations(self.sandbox, distfiles)
+
     def get_package(self):
         """Get the URL or sandbox to release.
         """
@@ -531,84 +802,326 @@ class ReleaseMaker(object):
     def make_release(self):
         """Build and distribute the package.
         """
+        from .workers import run_background, can_fork
+
+        buildworker = self.defaults.buildworker and can_fork()
+        if buildworker:
+            # Warms up while we clone and tag
+            self.setuptools.start_build_workers()
+
+        self.tempdir = abspath(tempfile.mkdtemp(prefix='mkrelease-'))
+        try:
+            self.checkout_release()
+            directory = self.sandbox
+            tagid = self.tagid
+            remote = self.tagremote
+
+            pushing = None
+            if remote:
+                # Push while building, the two do not depend on each other
+                pushing = run_background(self.push_tag, (directory, tagid, remote))
+
+            try:
+                with timed('build'):
+                    distfiles = self.build_release()
+            except (SystemExit, KeyboardInterrupt):
+                if tagid:
+                    pushed = pushing is not None and self.join_push(pushing)
+                    self.remove_tag(directory, tagid, remote if pushed else '')
+                raise
+
+            if pushing is not None:
+                if not self.join_push(pushing):
+                    self.remove_tag(directory, tagid)
+                    err_exit('Push failed')
+
+            self.upload_locations(directory, distfiles)
+        finally:
+            if buildworker:
+                self.setuptools.stop_build_workers()
+            self.cleanup_release()
+
+    def checkout_release(self):
+        """Clone or check the sandbox and create the tag.
+
+        Sets 'sandbox' to the directory to build from and 'tagid' and
+        'tagremote' to the tag and the remote it must be pushed to.
+        Remote repositories are cloned into 'tempdir'.
+        """
         directory = self.directory
-        infoflags = self.infoflags
         branch = self.branch
         develop = self.develop
         scmtype = self.scm.name
 
-        tempdir = abspath(tempfile.mkdtemp(prefix='mkrelease-'))
-        try:
-            if self.isremote:
-                directory = join(tempdir, 'build')
-                self.scm.clone_url(self.remoteurl, directory)
-            else:
-                directory = abspath(expanduser(directory))
+        self.sandbox = self.tagid = self.tagremote = ''
+        self.name = self.version = ''
 
-            self.scm.check_valid_sandbox(directory)
+        if self.isremote:
+            directory = join(self.tempdir, 'build')
+            with timed('clone'):
+                self.inuse = self.clone_url(self.remoteurl, directory, branch)
+        else:
+            directory = abspath(expanduser(directory))
 
-            if self.isremote:
-                branch = self.scm.make_branchid(directory, branch)
-                if branch:
-                    self.scm.switch_branch(directory, branch)
-                if scmtype != 'svn':
-                    branch = self.scm.get_branch_from_sandbox(directory)
-                    print('Releasing revision', branch)
+        self.scm.check_valid_sandbox(directory)
 
-            self.setuptools.check_valid_package(directory)
+        if self.isremote:
+            branch = self.scm.make_branchid(directory, branch)
+            if branch:
+                self.scm.switch_branch(directory, branch)
+            if scmtype != 'svn':
+                branch = self.scm.get_branch_from_sandbox(directory)
+                print('Releasing revision', branch)
+
+        self.setuptools.check_valid_package(directory)
 
-            if not (self.skipcommit and self.skiptag):
-                self.scm.check_dirty_sandbox(directory)
-                self.scm.check_unclean_sandbox(directory)
+        if not (self.skipcommit and self.skiptag):
+            self.scm.check_dirty_sandbox(directory)
+            self.scm.check_unclean_sandbox(directory)
 
+        with timed('package_info'):
             name, version = self.setuptools.get_package_info(directory, develop)
-            if self.isremote:
-                print(blue('Releasing %(name)s %(version)s' % locals()))
+        if self.isremote:
+            print(blue('Releasing %(name)s %(version)s' % locals()))
+
+        self.sandbox = directory
+        self.name, self.version = name, version
 
-            if not self.skiptag:
-                print('Tagging', name, version)
+        if not self.skiptag:
+            print('Tagging', name, version)
+            with timed('tag'):
                 tagid = self.scm.make_tagid(directory, version)
                 self.scm.check_tag_exists(directory, tagid)
-                self.scm.create_tag(directory, tagid, name, version, self.push)
+                self.scm.create_tag(directory, tagid, name, version, False)
+                self.tagid = tagid
+                if self.push:
+                    self.tagremote = self.scm.get_tag_remote(directory)
 
-            if self.manifest:
-                scmtype = 'none'
+    def build_release(self):
+        """Build the checked out package and return its distfiles.
+        """
+        scmtype = self.scm.name
+        if self.manifest:
+            scmtype = 'none'
+        return self.build_distfiles(
+            self.sandbox, self.infoflags, scmtype, self.name, self.version)
 
-            distfiles = []
-            for distcmd, distflags in self.distributions:
-                manifest = self.setuptools.run_egg_info(
-                    directory, infoflags, scmtype, self.quiet)
-                distfile = self.setuptools.run_dist(
-                    directory, infoflags, distcmd, distflags, scmtype, self.quiet)
-                distfiles.append(distfile)
-
-            firstserver = True
-            for location in self.locations:
+    def cleanup_release(self):
+        """Remove the temporary directory and release the mirror.
+        """
+        if self.tempdir:
+            shutil.rmtree(self.tempdir)
+            self.tempdir = ''
+        if self.inuse is not None:
+            self.inuse.release()
+            self.inuse = None
+
+    def push_tag(self, directory, tagid, remote):
+        """Push the tag and return a two-tuple of exit code and output.
+        """
+        output = []
+        with timed('push %(tagid)s' % locals()):
+            rc = self.scm.push_tag(directory, tagid, remote, output)
+        return rc, output
+
+    def join_push(self, pushing):
+        """Wait for a background push and print its output.
+
+        Returns True if the push succeeded.
+        """
+        from .workers import replay
+
+        rc, output = pushing.result()
+        replay(output)
+        return rc == 0
+
+    def remove_tag(self, directory, tagid, remote=''):
+        """Roll back the tag of a failed release.
+        """
+        print('Removing tag', tagid)
+        self.scm.remove_tag(directory, tagid, remote)
+
+    def build_distfiles(self, directory, infoflags, scmtype, name, version):
+        """Build distfiles, reusing a previous build of the same sources if enabled.
+        """
+        key = sourceid = ''
+        if self.defaults.buildcache:
+            sourceid = self.scm.get_source_id(directory)
+            if sourceid:
+                key = BuildCache.get_key(
+                    self.scm.name, sourceid, name, version, infoflags,
+                    self.distributions, scmtype, self.setuptools.get_build_id())
+
+        if key:
+            builds = BuildCache(self.defaults.cachedir, self.defaults.buildcachesize)
+            distfiles = builds.get(key, join(directory, 'dist'), name, version)
+            if distfiles:
+                if not self.quiet:
+                    print('Reusing distributions built from', sourceid[:12])
+                return distfiles
+
+        distfiles = self.setuptools.run_dists(
+            directory, infoflags, self.distributions, scmtype, self.quiet,
+            parallel=self.defaults.parallelbuilds and self.workers > 1)
+
+        if key:
+            builds.put(key, distfiles)
+        return distfiles
+
+    def clone_url(self, url, directory, branch=''):
+        """Clone url into directory, going through the mirror cache if enabled.
+
+        Without the cache, only the requested branch is fetched. History
+        is fetched only if the release is going to be tagged.
+
+        Returns a lock on the mirror the clone was made from, or None.
+        The caller must release it when done with the clone.
+        """
+        if not (self.defaults.clonecache and self.scm.can_mirror):
+            if self.scm.name == 'svn':
+                branch = ''
+            self.scm.clone_url(url, directory, branch, shallow=self.skiptag)
+            return None
+
+        mirrors = MirrorCache(self.defaults.cachedir, self.defaults.clonecachesize)
+        mirror = mirrors.get_mirror(self.scm.name, url)
+        # Git clones borrow objects from the mirror
+        inuse = mirrors.use(mirror)
+        inuse.acquire()
+        try:
+            with mirrors.lock(mirror):
+                self.scm.update_mirror(url, mirror)
+                self.scm.clone_mirror(mirror, url, directory)
+        except BaseException:
+            inuse.release()
+            raise
+        mirrors.evict()
+        return inuse
+
+    def upload_locations(self, directory, distfiles):
+        """Register and upload distfiles to all locations.
+        """
+        locations = list(self.locations)
+        identities = set()
+
+        if not self.get_skipupload():
+            for location in locations:
                 if self.locations.is_server(location):
-                    if not self.get_skipregister(location):
-                        self.twine.run_register(
-                            directory, distfiles, location, self.quiet)
-                    if not self.get_skipupload():
-                        uploadflags = self.get_uploadflags(location)
-                        if '--sign' in uploadflags:
-                            if firstserver:
-                                for distfile in distfiles:
-                                    try:
-                                        os.remove(distfile+'.asc')
-                                    except (IOError, OSError):
-                                        pass
-                                firstserver = False
+                    sign, identity = self.get_signing(location)
+                    if sign:
+                        identities.add(identity)
+
+        # Sign once for all locations and upload the signatures
+        # alongside the distfiles
+        signed = False
+        if len(identities) == 1:
+            with timed('sign'):
+                self.gpg.sign_distfiles(distfiles, identities.pop())
+            signed = True
+        elif identities:
+            for distfile in distfiles:
+                try:
+                    os.remove(distfile+'.asc')
+                except (IOError, OSError):
+                    pass
+
+        from .workers import run_parallel, call
+
+        argslist = [(directory, distfiles, location, signed) for location in locations]
+
+        # Interactive twine and signing by twine need the terminal
+        # and the .asc files to themselves
+        if len(locations) < 2 or self.twine.interactive or identities and not signed:
+            results = [call(self.upload_location, x) for x in argslist]
+        else:
+            results = run_parallel(
+                self.upload_location, argslist, min(len(locations), self.workers))
+
+        failed = [x for x, rc in zip(locations, results) if rc != 0]
+        if failed:
+            failed = ', '.join(failed)
+            err_exit('ERROR: upload failed for %(failed)s' % locals())
+
+    def upload_location(self, directory, distfiles, location, signed=False):
+        """Register and upload distfiles to a single location.
+
+        If 'signed' is true, signatures have been created already.
+        """
+        if self.locations.is_server(location):
+            if not self.get_skipregister(location):
+                with timed('register %(location)s' % locals()):
+                    self.twine.run_register(
+                        directory, distfiles, location, self.quiet)
+            if not self.get_skipupload():
+                distfiles = self.get_missing(distfiles, location)
+                if not distfiles:
+                    return
+                uploadflags = self.get_uploadflags(location)
+                if signed and uploadflags:
+                    uploadflags = []
+                    distfiles = distfiles + [x+'.asc' for x in distfiles]
+                with timed('upload %(location)s' % locals()):
+                    if self.use_uploader(location, uploadflags):
+                        self.uploader.run_upload(distfiles, location, self.quiet)
+                    else:
                         self.twine.run_upload(
                             directory, distfiles, location, uploadflags, self.quiet)
+        else:
+            if not self.skipupload:
+                scheme = 'scp'
+                if self.locations.is_ssh_url(location):
+                    scheme, location = self.urlparser.to_ssh_url(location)
+                distfiles = self.get_missing(distfiles, location, scheme)
+                if not distfiles:
+                    return
+                with timed('upload %(location)s' % locals()):
+                    self.scp.run_upload(scheme, distfiles, location)
+
+    def use_uploader(self, location, uploadflags):
+        """Return True if the built-in uploader can replace twine.
+
+        Signing by twine and prompting for credentials need twine.
+        """
+        if not self.defaults.directupload or uploadflags:
+            return False
+        return self.uploader.can_upload(location)
+
+    def get_missing(self, distfiles, location, scheme=''):
+        """Return the distfiles not yet present at location.
+
+        Files already uploaded by a previous run are skipped.
+        """
+        skipexisting = self.defaults.skipexisting
+        if skipexisting is None:
+            # The extra ssh session may prompt for a password
+            skipexisting = not self.twine.interactive
+        if not skipexisting:
+            return distfiles
+
+        from http.client import HTTPException
+        from .index import Index, get_simple_url
+
+        with timed('check %(location)s' % locals()):
+            if scheme:
+                existing = self.scp.get_existing(scheme, distfiles, location)
+            else:
+                server = self.defaults.servers[location]
+                url = server.indexurl or get_simple_url(server.repository)
+                if not url:
+                    return distfiles
+                if server.indexurl:
+                    index = Index(url, server.username, server.password)
                 else:
-                    if not self.skipupload:
-                        if self.locations.is_ssh_url(location):
-                            scheme, location = self.urlparser.to_ssh_url(location)
-                            self.scp.run_upload(scheme, distfiles, location)
-                        else:
-                            self.scp.run_upload('scp', distfiles, location)
-        finally:
-            shutil.rmtree(tempdir)
+                    index = Index(url)
+                try:
+                    existing = index.get_existing(distfiles)
+                except (IOError, OSError, HTTPException):
+                    return distfiles
+
+        for distfile in existing:
+            name = basename(distfile)
+            print('Skipping %(name)s (already present at %(location)s)' % locals())
+        return [x for x in distfiles if x not in existing]
 
     def get_env(self):
         os.environ['JARN_RUN'] = '1'
@@ -618,14 +1131,46 @@ class ReleaseMaker(object):
                 os.environ['JARN_NO_COLOR'] = '1'
                 break
 
+        # Time option parsing too
+        for arg in self.args:
+            if arg == '--timing' or arg.startswith(('--timing-file', '--chrome-trace')):
+                timings.enabled = True
+                break
+
     def run(self):
         self.get_env()
         self.set_defaults(expanduser('~/.mkrelease'))
         self.get_python()
-        self.get_options()
-        self.get_package()
-        self.make_release()
-        print(green('done'))
+        try:
+            with timed('get_options'):
+                self.get_options()
+            if self.batch:
+                self.release_packages()
+            else:
+                with timed('get_package'):
+                    self.get_package()
+                self.make_release()
+            print(green('done'))
+        finally:
+            self.report_timings()
+
+    def report_timings(self):
+        """Print and write timings if requested.
+        """
+        if not timings.enabled:
+            return
+        if self.timing:
+            timings.print_summary()
+        try:
+            if self.timingfile:
+                timings.write_json(self.timingfile)
+            if self.chrometrace:
+                timings.write_chrome_trace(self.chrometrace)
+        except (IOError, OSError) as e:
+            warn('Failed to write timings: %s' % (e.strerror or e))
+        finally:
+            timings.enabled = False
+            timings.export()
 
 
 def main(args=None):
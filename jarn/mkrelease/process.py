@@ -1,7 +1,8 @@
 import os
 
-from .tee import run
+from .tee import run, run_many
 from .exit import trace
+from .timing import timed
 
 catch_keyboard_interrupts = True
 
@@ -16,15 +17,40 @@ class Process(object):
         self.env = env
         self.runner = runner
 
-    def popen(self, cmd, echo=True, echo2=True):
+    def popen(self, cmd, echo=True, echo2=True, keep=None, cwd=None, output=None):
         # env *replaces* os.environ
         trace(cmd)
         if self.quiet:
             echo = echo2 = False
+        kw = {}
+        if keep is not None:
+            kw['keep'] = keep
+        if output is not None:
+            kw['output'] = output
         try:
-            return self.runner(cmd, echo, echo2, shell=True, env=self.env)
+            with timed(cmd, 'command'):
+                return self.runner(cmd, echo, echo2, shell=True, cwd=cwd, env=self.env, **kw)
         except KeyboardInterrupt:
             if catch_keyboard_interrupts:
                 return self.rc_keyboard_interrupt, []
             raise
 
+    def popen_many(self, cmds, echo=True, echo2=True):
+        """Run 'cmds' concurrently and return a list of (rc, lines) tuples.
+
+        Runs the commands one after the other if the runner does not
+        support concurrency.
+        """
+        if self.runner is not run:
+            return [self.popen(cmd, echo, echo2) for cmd in cmds]
+        for cmd in cmds:
+            trace(cmd)
+        if self.quiet:
+            echo = echo2 = False
+        try:
+            with timed(' & '.join(cmds), 'command'):
+                return run_many(cmds, echo, echo2, shell=True, env=self.env)
+        except KeyboardInterrupt:
+            if catch_keyboard_interrupts:
+                return [(self.rc_keyboard_interrupt, []) for cmd in cmds]
+            raise
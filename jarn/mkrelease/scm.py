@@ -2,6 +2,7 @@ import os
 import re
 
 from operator import itemgetter
+from shutil import rmtree
 from lazy import lazy
 
 from os.path import abspath, join, expanduser, dirname
@@ -22,16 +23,22 @@ class SCM(object):
     """Interface to source code management systems."""
 
     name = ''
+    marker = ''
+    can_mirror = False
     version_re = re.compile(r'version ([0-9.]+)', re.IGNORECASE)
 
-    def __init__(self, process=None, urlparser=None):
+    def __init__(self, process=None, urlparser=None, versions=None):
         self.process = process or Process(env=self.get_env())
         self.urlparser = urlparser or URLParser()
+        self.versions = versions
         self.dirstack = ChdirStack()
 
     @lazy
     def version_info(self):
-        version = self.get_version()
+        if self.versions is not None:
+            version = self.versions.get(self.name, self.get_version)
+        else:
+            version = self.get_version()
         info = []
         if version:
             for number in version.split('.'):
@@ -77,7 +84,29 @@ class SCM(object):
     def commit_sandbox(self, dir, name, version, push):
         raise NotImplementedError
 
-    def clone_url(self, url, dir):
+    def get_source_id(self, dir):
+        """Return an id of the committed sources in 'dir'.
+
+        Returns an empty string if the sandbox has uncommitted changes
+        or the SCM cannot identify the sources.
+        """
+        return ''
+
+    def is_build_output(self, path):
+        """Return True if 'path' is created by building the package.
+        """
+        for part in path.replace(os.sep, '/').rstrip('/').split('/'):
+            if part in ('build', 'dist') or part.endswith('.egg-info'):
+                return True
+        return False
+
+    def clone_url(self, url, dir, branch='', shallow=False):
+        raise NotImplementedError
+
+    def update_mirror(self, url, mirror):
+        raise NotImplementedError
+
+    def clone_mirror(self, mirror, url, dir):
         raise NotImplementedError
 
     def make_branchid(self, dir, branch):
@@ -95,6 +124,29 @@ class SCM(object):
     def create_tag(self, dir, tagid, name, version, push):
         raise NotImplementedError
 
+    def get_tag_remote(self, dir):
+        """Return the remote tags are pushed to.
+
+        Returns the empty string if tags are not pushed.
+        """
+        return ''
+
+    def push_tag(self, dir, tagid, remote, output=None):
+        """Push tag 'tagid' to 'remote' and return the exit code.
+
+        Does not change the working directory and may run in the
+        background while the package is built. If 'output' is a list,
+        output lines are appended to it instead of being written.
+        """
+        return 0
+
+    def remove_tag(self, dir, tagid, remote=''):
+        """Remove tag 'tagid', and from 'remote' if given.
+
+        Rolls back a release that failed after tagging.
+        """
+        raise NotImplementedError
+
     def check_valid_sandbox(self, dir):
         if not exists(dir):
             err_exit('No such file or directory: %(dir)s' % locals())
@@ -118,6 +170,7 @@ class SCM(object):
 class Subversion(SCM):
 
     name = 'svn'
+    marker = '.svn'
 
     def get_version(self):
         rc, lines = self.process.popen(
@@ -249,7 +302,7 @@ class Subversion(SCM):
             err_exit('Commit failed')
         return rc
 
-    def clone_url(self, url, dir):
+    def clone_url(self, url, dir, branch='', shallow=False):
         rc, lines = self.process.popen(
             'svn checkout "%(url)s" "%(dir)s"' % locals())
         if rc != 0:
@@ -301,10 +354,20 @@ class Subversion(SCM):
             err_exit('Tag failed')
         return rc
 
+    def remove_tag(self, dir, tagid, remote=''):
+        rc, lines = self.process.popen(
+            ('svn delete -m"Removed tag %(tagid)s." "%(tagid)s"' % locals()),
+            echo=NotEmpty())
+        if rc != 0:
+            warn('Failed to remove tag %(tagid)s' % locals())
+        return rc
+
 
 class Mercurial(SCM):
 
     name = 'hg'
+    marker = '.hg'
+    can_mirror = True
 
     def get_version(self):
         rc, lines = self.process.popen(
@@ -397,13 +460,74 @@ class Mercurial(SCM):
                 warn('No default path found; not pushing the commit')
         return rc
 
-    def clone_url(self, url, dir):
+    @chdir
+    def get_source_id(self, dir):
+        rc, lines = self.process.popen(
+            'hg status -mardu .', echo=False)
+        if rc != 0:
+            return ''
+        for line in lines:
+            if not (line.startswith('? ') and self.is_build_output(line[2:])):
+                return ''
+        rc, lines = self.process.popen(
+            'hg id -i', echo=False)
+        if rc != 0 or not lines or lines[0].endswith('+'):
+            return ''
+        rc, root = self.process.popen(
+            'hg root', echo=False)
+        if rc != 0 or not root:
+            return ''
+        # The node covers the whole repository
+        path = os.path.relpath(os.getcwd(), root[0])
+        return '%s:%s' % (lines[0], path)
+
+    def clone_url(self, url, dir, branch='', shallow=False):
+        # Check out the requested revision right away
+        update = ''
+        if branch:
+            update = '-u "%(branch)s" ' % locals()
+        rc, lines = self.process.popen(
+            'hg clone %(update)s"%(url)s" "%(dir)s"' % locals())
+        if rc != 0:
+            err_exit('Clone failed')
+        return rc
+
+    def update_mirror(self, url, mirror):
+        if isdir(join(mirror, '.hg')):
+            rc = self._pull_mirror(mirror, url)
+            if rc == 0:
+                return rc
+            if self._is_valid_mirror(mirror):
+                err_exit('Pull failed')
+            # Only a broken mirror is worth a fresh clone
+            rmtree(mirror, ignore_errors=True)
         rc, lines = self.process.popen(
-            'hg clone "%(url)s" "%(dir)s"' % locals())
+            'hg clone -U "%(url)s" "%(mirror)s"' % locals())
         if rc != 0:
             err_exit('Clone failed')
         return rc
 
+    @chdir
+    def _pull_mirror(self, dir, url):
+        rc, lines = self.process.popen(
+            'hg pull "%(url)s"' % locals())
+        return rc
+
+    def _is_valid_mirror(self, dir):
+        rc, lines = self.process.popen(
+            'hg log -R "%(dir)s" -r tip --template "{node}"' % locals(), echo=False, echo2=False)
+        return rc == 0
+
+    def clone_mirror(self, mirror, url, dir):
+        rc, lines = self.process.popen(
+            'hg clone "%(mirror)s" "%(dir)s"' % locals())
+        if rc != 0:
+            err_exit('Clone failed')
+        # Push to the original repository
+        with open(join(dir, '.hg', 'hgrc'), 'wt') as file:
+            file.write('[paths]\ndefault = %(url)s\n' % locals())
+        return rc
+
     def make_branchid(self, dir, branch):
         return branch
 
@@ -436,19 +560,72 @@ class Mercurial(SCM):
         if rc != 0:
             err_exit('Tag failed')
         if push:
-            if self.is_remote_sandbox(dir):
+            if self.get_tag_remote(dir):
                 rc, lines = self.process.popen(
                     'hg push default')
                 if rc != 0:
                     err_exit('Push failed')
-            else:
-                warn('No default path found; not pushing the tag')
+        return rc
+
+    def get_tag_remote(self, dir):
+        if self.is_remote_sandbox(dir):
+            return 'default'
+        warn('No default path found; not pushing the tag')
+        return ''
+
+    def push_tag(self, dir, tagid, remote, output=None):
+        rc, lines = self.process.popen(
+            'hg push "%(remote)s"' % locals(), cwd=dir, output=output)
+        return rc
+
+    @chdir
+    def remove_tag(self, dir, tagid, remote=''):
+        if remote:
+            warn('Tag %(tagid)s has been pushed; not removing it' % locals())
+            return 1
+        # The tag is the working directory parent
+        rc, lines = self.process.popen(
+            'hg --config extensions.strip= strip --no-backup -r .')
+        if rc != 0:
+            warn('Failed to remove tag %(tagid)s' % locals())
         return rc
 
 
+class GitState(object):
+    """Snapshot of a Git sandbox."""
+
+    def __init__(self, branch, config, dirty):
+        self.branch = branch
+        self.config = config
+        self.dirty = dirty
+        self.tags = None
+
+    @property
+    def remote(self):
+        return self.config.get('branch.%s.remote' % self.branch, '')
+
+    @property
+    def tracked_branch(self):
+        merge = self.config.get('branch.%s.merge' % self.branch, '')
+        return merge[len('refs/heads/'):]
+
+    @property
+    def url(self):
+        remote = self.remote
+        if remote:
+            return self.config.get('remote.%s.url' % remote, '')
+        return ''
+
+
 class Git(SCM):
 
     name = 'git'
+    marker = '.git'
+    can_mirror = True
+
+    def __init__(self, process=None, urlparser=None, versions=None):
+        SCM.__init__(self, process, urlparser, versions)
+        self._states = {}
 
     def get_version(self):
         rc, lines = self.process.popen(
@@ -480,7 +657,64 @@ class Git(SCM):
         return False
 
     @chdir
-    def is_dirty_sandbox(self, dir):
+    def get_state(self, dir):
+        """Return the cached GitState of the sandbox.
+        """
+        key = os.getcwd()
+        if key not in self._states:
+            self._states[key] = self._make_state(dir)
+        return self._states[key]
+
+    def invalidate_state(self, dir):
+        """Drop cached GitStates after a mutating command.
+
+        Also called from within @chdir methods, where a relative 'dir'
+        no longer resolves; so all snapshots are dropped.
+        """
+        self._states.clear()
+
+    def _make_state(self, dir):
+        if self.version_info[:2] >= (2, 11):
+            status, (rc, lines) = self.process.popen_many(
+                ('git status --porcelain=v2 --branch --untracked-files=no .',
+                 'git config -l'), echo=False)
+            branch, dirty = self._parse_status_v2(dir, *status)
+        else:
+            branch, dirty = self._get_branch(dir), self._get_dirty(dir)
+            rc, lines = self.process.popen(
+                'git config -l', echo=False)
+        if rc == 0 and lines:
+            config = {}
+            for line in lines:
+                key, sep, value = line.partition('=')
+                config[key] = value
+            return GitState(branch, config, dirty)
+        err_exit('Failed to get config from %(dir)s' % locals())
+
+    def _parse_status_v2(self, dir, rc, lines):
+        if rc == 0:
+            branch, dirty = '', False
+            for line in lines:
+                if line.startswith('# branch.head '):
+                    branch = line[len('# branch.head '):]
+                elif not line.startswith('#'):
+                    dirty = True
+            if branch == '(detached)':
+                branch = self._get_branch(dir)
+            if branch:
+                return branch, dirty
+        err_exit('Failed to get status from %(dir)s' % locals())
+
+    def _get_branch(self, dir):
+        rc, lines = self.process.popen(
+            'git branch', echo=False)
+        if rc == 0:
+            for line in lines:
+                if line.startswith('*'):
+                    return line[2:]
+        err_exit('Failed to get branch from %(dir)s' % locals())
+
+    def _get_dirty(self, dir):
         if self.version_info[:2] >= (1, 7):
             rc, lines = self.process.popen(
                 'git status --porcelain --untracked-files=no .', echo=False)
@@ -495,11 +729,12 @@ class Git(SCM):
                 return False
         err_exit('Failed to get status from %(dir)s' % locals())
 
-    @chdir
+    def is_dirty_sandbox(self, dir):
+        return self.get_state(dir).dirty
+
     def is_unclean_sandbox(self, dir):
         return self.is_dirty_sandbox(dir)
 
-    @chdir
     def is_remote_sandbox(self, dir):
         return bool(self.get_remote_from_sandbox(dir))
 
@@ -511,63 +746,23 @@ class Git(SCM):
             return lines[0]
         err_exit('Failed to get root from %(dir)s' % locals())
 
-    @chdir
     def get_branch_from_sandbox(self, dir):
-        rc, lines = self.process.popen(
-            'git branch', echo=False)
-        if rc == 0:
-            for line in lines:
-                if line.startswith('*'):
-                    return line[2:]
-        err_exit('Failed to get branch from %(dir)s' % locals())
+        return self.get_state(dir).branch
 
-    @chdir
     def get_remote_from_sandbox(self, dir):
-        branch = self.get_branch_from_sandbox(dir)
-        rc, lines = self.process.popen(
-            'git config -l', echo=False)
-        if rc == 0 and lines:
-            key = 'branch.%(branch)s.remote=' % locals()
-            for line in reversed(lines):
-                if line.startswith(key):
-                    return line[len(key):]
-        else:
-            err_exit('Failed to get remote from %(branch)s' % locals())
-        return ''
+        return self.get_state(dir).remote
 
-    @chdir
     def get_tracked_branch_from_sandbox(self, dir):
-        branch = self.get_branch_from_sandbox(dir)
-        rc, lines = self.process.popen(
-            'git config -l', echo=False)
-        if rc == 0 and lines:
-            key = 'branch.%(branch)s.merge=' % locals()
-            for line in reversed(lines):
-                if line.startswith(key):
-                    return line[len(key)+len('refs/heads/'):]
-        else:
-            err_exit('Failed to get tracked branch from %(branch)s' % locals())
-        return ''
+        return self.get_state(dir).tracked_branch
 
-    @chdir
     def get_url_from_sandbox(self, dir):
-        remote = self.get_remote_from_sandbox(dir)
-        if remote:
-            rc, lines = self.process.popen(
-                'git config -l', echo=False)
-            if rc == 0 and lines:
-                key = 'remote.%(remote)s.url=' % locals()
-                for line in reversed(lines):
-                    if line.startswith(key):
-                        return line[len(key):]
-            else:
-                err_exit('Failed to get URL from %(dir)s' % locals())
-        return ''
+        return self.get_state(dir).url
 
     @chdir
     def commit_sandbox(self, dir, name, version, push):
         rc, lines = self.process.popen(
             'git commit -m"Prepare %(name)s %(version)s." .' % locals())
+        self.invalidate_state(dir)
         if rc not in (0, 1):    # 1 means empty commit
             err_exit('Commit failed')
         rc = 0
@@ -586,9 +781,94 @@ class Git(SCM):
                  'not pushing the commit' % locals())
         return rc
 
-    def clone_url(self, url, dir):
+    @chdir
+    def get_source_id(self, dir):
+        rc, lines = self.process.popen(
+            'git status --porcelain --untracked-files=normal .', echo=False)
+        if rc != 0:
+            return ''
+        for line in lines:
+            if not (line.startswith('?? ') and self.is_build_output(line[3:])):
+                return ''
+        # Commit and tree hash of the package directory
+        rc, lines = self.process.popen(
+            'git rev-parse HEAD HEAD:./', echo=False)
+        if rc == 0 and len(lines) == 2:
+            return '%s:%s' % tuple(lines)
+        return ''
+
+    def clone_url(self, url, dir, branch='', shallow=False):
+        """Clone 'url' into 'dir'.
+
+        If 'shallow' is True, fetch only the tip of 'branch'. Otherwise
+        fetch full history but download file contents lazily
+        (git >= 2.19 and server permitting).
+        """
+        flags = self._get_clone_flags(url, shallow)
+        if branch:
+            rc, lines = self.process.popen(
+                'git clone %(flags)s--branch "%(branch)s" "%(url)s" "%(dir)s"' % locals())
+            if rc == 0:
+                return rc
+            # Not a branch or tag name; switch_branch will deal with it
+            flags = self._get_clone_flags(url, False)
         rc, lines = self.process.popen(
-            'git clone "%(url)s" "%(dir)s"' % locals())
+            'git clone %(flags)s"%(url)s" "%(dir)s"' % locals())
+        if rc != 0:
+            err_exit('Clone failed')
+        return rc
+
+    def _get_clone_flags(self, url, shallow):
+        # Local clones hardlink objects anyway
+        if isdir(url):
+            return ''
+        if shallow:
+            return '--depth 1 '
+        if self.version_info[:2] >= (2, 19):
+            return '--filter=blob:none '
+        return ''
+
+    def update_mirror(self, url, mirror):
+        if isfile(join(mirror, 'HEAD')):
+            rc = self._fetch_mirror(mirror)
+            if rc == 0:
+                return rc
+            if self._is_valid_mirror(mirror):
+                err_exit('Fetch failed')
+            # Only a broken mirror is worth a fresh clone
+            rmtree(mirror, ignore_errors=True)
+        rc, lines = self.process.popen(
+            'git clone --mirror "%(url)s" "%(mirror)s"' % locals())
+        if rc != 0:
+            err_exit('Clone failed')
+        # Clones borrow objects from the mirror; never prune them
+        rc, lines = self.process.popen(
+            'git --git-dir="%(mirror)s" config gc.auto 0' % locals(), echo=False)
+        return rc
+
+    @chdir
+    def _fetch_mirror(self, dir):
+        rc, lines = self.process.popen(
+            'git fetch --prune origin')
+        return rc
+
+    def _is_valid_mirror(self, dir):
+        rc, lines = self.process.popen(
+            'git --git-dir="%(dir)s" rev-parse --git-dir' % locals(), echo=False, echo2=False)
+        return rc == 0
+
+    def clone_mirror(self, mirror, url, dir):
+        rc, lines = self.process.popen(
+            'git clone --shared "%(mirror)s" "%(dir)s"' % locals())
+        if rc != 0:
+            err_exit('Clone failed')
+        return self._set_origin(dir, url)
+
+    @chdir
+    def _set_origin(self, dir, url):
+        # Push to the original repository
+        rc, lines = self.process.popen(
+            'git remote set-url origin "%(url)s"' % locals(), echo=False)
         if rc != 0:
             err_exit('Clone failed')
         return rc
@@ -600,6 +880,7 @@ class Git(SCM):
     def switch_branch(self, dir, branch):
         rc, lines = self.process.popen(
             'git checkout -q "%(branch)s"' % locals())
+        self.invalidate_state(dir)
         if rc != 0:
             err_exit('Checkout failed')
         return rc
@@ -607,36 +888,62 @@ class Git(SCM):
     def make_tagid(self, dir, version):
         return version
 
-    @chdir
     def tag_exists(self, dir, tagid):
+        state = self.get_state(dir)
+        if state.tags is None:
+            state.tags = self._get_tags(dir)
+        return tagid in state.tags
+
+    @chdir
+    def _get_tags(self, dir):
         rc, lines = self.process.popen(
             'git tag', echo=False)
         if rc == 0:
-            for line in lines:
-                if line == tagid:
-                    return True
-            return False
+            return set(lines)
         err_exit('Failed to get tags from %(dir)s' % locals())
 
     @chdir
     def create_tag(self, dir, tagid, name, version, push):
         rc, lines = self.process.popen(
             'git tag -m"Tagged %(name)s %(version)s." "%(tagid)s"' % locals())
+        self.invalidate_state(dir)
         if rc != 0:
             err_exit('Tag failed')
         if push:
-            branch = self.get_branch_from_sandbox(dir)
-            remote = self.get_remote_from_sandbox(dir)
+            remote = self.get_tag_remote(dir)
             if remote:
-                tracked = self.get_tracked_branch_from_sandbox(dir)
-                if tracked:
-                    rc, lines = self.process.popen(
-                        'git push "%(remote)s" tag "%(tagid)s"' % locals())
-                    if rc != 0:
-                        err_exit('Push failed')
-                    return rc
-            warn('%(branch)s does not track a remote branch; '
-                 'not pushing the tag' % locals())
+                rc, lines = self.process.popen(
+                    'git push "%(remote)s" tag "%(tagid)s"' % locals())
+                if rc != 0:
+                    err_exit('Push failed')
+        return rc
+
+    def get_tag_remote(self, dir):
+        branch = self.get_branch_from_sandbox(dir)
+        remote = self.get_remote_from_sandbox(dir)
+        if remote and self.get_tracked_branch_from_sandbox(dir):
+            return remote
+        warn('%(branch)s does not track a remote branch; '
+             'not pushing the tag' % locals())
+        return ''
+
+    def push_tag(self, dir, tagid, remote, output=None):
+        rc, lines = self.process.popen(
+            'git push "%(remote)s" tag "%(tagid)s"' % locals(), cwd=dir, output=output)
+        return rc
+
+    @chdir
+    def remove_tag(self, dir, tagid, remote=''):
+        if remote:
+            rc, lines = self.process.popen(
+                'git push "%(remote)s" ":refs/tags/%(tagid)s"' % locals())
+            if rc != 0:
+                warn('Failed to remove tag %(tagid)s from %(remote)s' % locals())
+        rc, lines = self.process.popen(
+            'git tag -d "%(tagid)s"' % locals(), echo=False)
+        self.invalidate_state(dir)
+        if rc != 0:
+            warn('Failed to remove tag %(tagid)s' % locals())
         return rc
 
 
@@ -645,19 +952,31 @@ class SCMFactory(object):
 
     scms = (Subversion, Mercurial, Git)
 
-    def __init__(self, urlparser=None):
+    def __init__(self, urlparser=None, versions=None):
         self.urlparser = urlparser or URLParser()
+        self.versions = versions
+        self._instances = {}
+
+    def get_instance(self, klass):
+        """Return the shared instance of SCM class 'klass'.
+        """
+        if klass not in self._instances:
+            self._instances[klass] = klass(urlparser=self.urlparser, versions=self.versions)
+        return self._instances[klass]
 
     def get_scm_from_type(self, type):
         for klass in self.scms:
             if klass.name == type:
-                return klass()
+                return self.get_instance(klass)
         err_exit('Unsupported SCM type: %(type)s' % locals())
 
     def get_scm_from_sandbox(self, dir):
         dir = abspath(expanduser(dir))
         if not exists(dir):
             err_exit('No such file or directory: %(dir)s' % locals())
+        scm = self._find_scm_by_marker(dir)
+        if scm is not None:
+            return scm
         matches = self._find_scms(dir)
         if not matches:
             err_exit('Not a sandbox: %(dir)s' % locals())
@@ -675,12 +994,45 @@ class SCMFactory(object):
         err_exit('%(names)s found in %(dir)s\n'
                  'Please specify %(flags)s to resolve' % locals())
 
+    def _find_markers(self, dir):
+        # Find the closest marker of every SCM walking up from dir;
+        # returns a sorted list of (distance, klass) tuples
+        found = {}
+        distance = 0
+        while True:
+            for klass in self.scms:
+                if klass not in found and exists(join(dir, klass.marker)):
+                    found[klass] = distance
+            parent = dirname(dir)
+            if parent == dir:
+                break
+            dir = parent
+            distance += 1
+        return sorted([(x[1], x[0]) for x in found.items()], key=itemgetter(0))
+
+    def _find_scm_by_marker(self, dir):
+        # Pick the SCM without spawning tools; returns None if the
+        # markers are missing or ambiguous
+        if not isdir(dir):
+            return None
+        markers = self._find_markers(dir)
+        if len(markers) == 1:
+            return self.get_instance(markers[0][1])
+        if len(markers) > 1:
+            # Subversion < 1.7 has .svn directories everywhere, so a
+            # closest .svn says nothing about the sandbox root
+            (distance, klass), (next_distance, ignored) = markers[:2]
+            if distance < next_distance and klass is not Subversion:
+                return self.get_instance(klass)
+        return None
+
     def _find_scms(self, dir):
         # Find all SCMs in dir
         matches = []
         for klass in self.scms:
-            if klass().is_valid_sandbox(dir):
-                matches.append(klass())
+            scm = self.get_instance(klass)
+            if scm.is_valid_sandbox(dir):
+                matches.append(scm)
         return matches
 
     def _find_closest(self, dir, matches):
@@ -696,44 +1048,44 @@ class SCMFactory(object):
     def get_scm_from_url(self, url):
         scheme, user, host, path, qs, frag = self.urlparser.urlsplit(url)
         if scheme in ('svn', 'svn+ssh'):
-            return Subversion()
+            return self.get_instance(Subversion)
         if scheme in ('git', 'rsync'):
-            return Git()
+            return self.get_instance(Git)
         if scheme in ('ssh',):
             if path.endswith('.git'):
-                return Git()
+                return self.get_instance(Git)
             if host.startswith('hg.') or path.startswith(('/hg/', '//hg/')):
-                return Mercurial()
+                return self.get_instance(Mercurial)
             if host.startswith('git.') or path.startswith('/git/'):
-                return Git()
+                return self.get_instance(Git)
             if user == 'git' or host == 'github.com':
-                return Git()
+                return self.get_instance(Git)
             err_exit('Failed to guess SCM type: %(url)s\n'
                      'Please specify --svn, --hg, or --git' % locals())
         if scheme in ('http', 'https'):
             if path.endswith('.git'):
-                return Git()
+                return self.get_instance(Git)
             if host.startswith('svn.') or path.startswith('/svn/'):
-                return Subversion()
+                return self.get_instance(Subversion)
             if host.startswith('hg.') or path.startswith('/hg/'):
-                return Mercurial()
+                return self.get_instance(Mercurial)
             if host.startswith('git.') or path.startswith('/git/'):
-                return Git()
+                return self.get_instance(Git)
             if user == 'git' or host == 'github.com':
-                return Git()
+                return self.get_instance(Git)
             err_exit('Failed to guess SCM type: %(url)s\n'
                      'Please specify --svn, --hg, or --git' % locals())
         if scheme in ('file',):
             if path.endswith('.git'):
-                return Git()
+                return self.get_instance(Git)
             if host in ('', 'localhost'):
                 # Strip leading slash to allow tilde expansion
                 if host and path.startswith('/~'):
                     path = path[1:]
                 if self._is_bare_git_repo(path):
-                    return Git()
+                    return self.get_instance(Git)
                 if self._is_subversion_repo(path):
-                    return Subversion()
+                    return self.get_instance(Subversion)
                 return self._get_scm_from_file_url(path)
             err_exit('Failed to guess SCM type: %(url)s\n'
                      'Please specify --svn, --hg, or --git' % locals())
@@ -794,7 +1146,7 @@ class SCMFactory(object):
         elif self.urlparser.is_url(url_or_dir):
             scm = self.get_scm_from_url(url_or_dir)
         elif self.urlparser.is_ssh_url(url_or_dir):
-            scm = Git()
+            scm = self.get_instance(Git)
         else:
             scm = self.get_scm_from_sandbox(url_or_dir)
         return scm
@@ -8,6 +8,7 @@ from .process import Process
 from .exit import err_exit
 from .utils import encode
 from .colors import bold
+from .cache import file_digest
 
 
 class SCP(object):
@@ -21,11 +22,55 @@ class SCP(object):
         else:
             self.interactive = True
 
+        if defaults and defaults.multiplex:
+            self.multiplex = True
+        else:
+            self.multiplex = False
+
     def get_options(self):
+        options = []
         if not self.interactive:
-            return '-o KbdInteractiveAuthentication=no'
-        else:
-            return ''
+            options.append('-o KbdInteractiveAuthentication=no')
+        if self.multiplex:
+            # Share one ssh connection per host across locations
+            options.append('-o ControlMaster=auto -o ControlPersist=60 '
+                           '-o ControlPath="~/.ssh/mkrelease-%C"')
+        return ' '.join(options)
+
+    def get_existing(self, scheme, distfiles, location):
+        """Return the distfiles already present at 'location'.
+
+        Uses one ssh session to compare sha256 digests, for sftp
+        locations too. Returns an empty list if the location cannot
+        be inspected, e.g. because the server does not allow shell
+        access.
+        """
+        remote = self.list_scp(distfiles, location)
+        local = dict((basename(x), file_digest(x)) for x in distfiles)
+        return [x for x in distfiles
+                if remote.get(basename(x)) == local[basename(x)]]
+
+    def list_scp(self, distfiles, location):
+        host, sep, path = location.partition(':')
+        if path.startswith('~/'):
+            path = path[2:]
+
+        files = ' '.join([('"%s"' % basename(x)) for x in distfiles])
+        cmd = '(sha256sum %(files)s || shasum -a 256 %(files)s) 2>/dev/null' % locals()
+        if path:
+            cmd = 'cd "%(path)s" 2>/dev/null && %(cmd)s' % locals()
+
+        options = self.get_options()
+        rc, lines = self.process.popen(
+            "ssh %(options)s \"%(host)s\" '%(cmd)s'" % locals(),
+            echo=False, echo2=False)
+
+        remote = {}
+        for line in lines:
+            parts = line.split(None, 1)
+            if len(parts) == 2 and len(parts[0]) == 64:
+                remote[parts[1].lstrip('*')] = parts[0]
+        return remote
 
     def run_upload(self, scheme, distfiles, location):
         distfiles = sorted(distfiles, key=len, reverse=True)
@@ -33,36 +78,36 @@ class SCP(object):
             if not self.process.quiet:
                 print(bold('running sftp_upload'))
                 print('Uploading distributions to %(location)s' % locals())
-            for distfile in distfiles:
-                self.run_sftp(distfile, location)
+            return self.run_sftp(distfiles, location)
         else:
             if not self.process.quiet:
                 print(bold('running scp_upload'))
                 print('Uploading distributions to %(location)s' % locals())
-            for distfile in distfiles:
-                self.run_scp(distfile, location)
-        return 0
+            return self.run_scp(distfiles, location)
 
-    def run_scp(self, distfile, location):
+    def run_scp(self, distfiles, location):
         if not self.process.quiet:
-            name = basename(distfile)
-            print('Uploading %(name)s' % locals())
+            for distfile in distfiles:
+                name = basename(distfile)
+                print('Uploading %(name)s' % locals())
 
         options = self.get_options()
+        files = ' '.join([('"%s"' % x) for x in distfiles])
         rc, lines = self.process.popen(
-            'scp %(options)s "%(distfile)s" "%(location)s"' % locals(),
+            'scp %(options)s %(files)s "%(location)s"' % locals(),
             echo=False)
         if rc == 0:
             return rc
         err_exit('ERROR: upload failed')
 
-    def run_sftp(self, distfile, location):
+    def run_sftp(self, distfiles, location):
         if not self.process.quiet:
-            name = basename(distfile)
-            print('Uploading %(name)s' % locals())
+            for distfile in distfiles:
+                name = basename(distfile)
+                print('Uploading %(name)s' % locals())
 
         with tempfile.NamedTemporaryFile() as file:
-            cmds = 'put "%(distfile)s"\nbye\n' % locals()
+            cmds = ''.join([('put "%s"\n' % x) for x in distfiles]) + 'bye\n'
             cmds = encode(cmds)
             file.write(cmds)
             file.flush()
@@ -75,4 +120,3 @@ class SCP(object):
             if rc == 0:
                 return rc
             err_exit('ERROR: upload failed')
-
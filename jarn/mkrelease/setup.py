@@ -1,4 +1,4 @@
-# 'from jarn.mkrelease import setup; setup.run(%(args)r, ff=%(ff)r)'
+# 'from jarn.mkrelease import setup; setup.run(%(args)r, ff=%(ff)r, manifest=%(manifest)r, cachedir=%(cachedir)r)'
 
 import sys
 import os
@@ -9,6 +9,8 @@ import distutils
 from os.path import basename, isdir, join, exists
 from functools import partial
 
+from jarn.mkrelease.finder import FileFinder, LISTINGS
+
 try:
     from importlib.metadata import entry_points
 except ImportError:
@@ -39,12 +41,25 @@ def iter_entry_points(group):
         return eps.get(group, ())
 
 
-def walk_revctrl(dirname='', ff=''):
+def walk_revctrl(dirname='', ff='', cachedir=''):
     """Return files found by the file-finder 'ff'.
+
+    Git, Mercurial, and Subversion sandboxes are listed by built-in
+    file-finders; setuptools file-finder extensions are used if the
+    SCM cannot list files.
     """
     file_finder = None
     items = []
 
+    if ff in LISTINGS:
+        finder_items = FileFinder(ff, cachedir).find_files(dirname)
+        if finder_items is not None:
+            distutils.log.info('using built-in %s file-finder', ff)
+            distutils.log.info('%d files found', len(finder_items))
+            # Returning a non-empty list prevents egg_info from reading the
+            # existing SOURCES.txt
+            return finder_items or ['']
+
     #if not ff:
     #    distutils.log.error('No file-finder passed to walk_revctrl')
     #    sys.exit(1)
@@ -71,6 +86,20 @@ def walk_revctrl(dirname='', ff=''):
     return items or ['']
 
 
+def manifest_walk_revctrl(dirname='', manifest=''):
+    """Return files listed in 'manifest'.
+
+    Reuses the SOURCES.txt of an earlier egg_info run instead of
+    asking the file-finder again.
+    """
+    with open(manifest) as file:
+        items = [x for x in file.read().splitlines() if x]
+    distutils.log.info('reusing %d files from %s', len(items), manifest)
+    # Returning a non-empty list prevents egg_info from reading the
+    # existing SOURCES.txt
+    return items or ['']
+
+
 def no_walk_revctrl(dirname=''):
     """Return empty list.
     """
@@ -94,7 +123,7 @@ def cleanup_pycache():
         pass
 
 
-def run(args, ff=''):
+def run(args, ff='', manifest='', cachedir=''):
     """Run setup.py with monkey patches applied.
     """
     # Set log level INFO in setuptools >= 60.0.0 with local distutils
@@ -109,10 +138,12 @@ def run(args, ff=''):
         distutils.dist.log.set_verbosity(1)
 
     import setuptools.command.egg_info
-    if not ff or ff == 'none':
+    if manifest and exists(manifest):
+        setuptools.command.egg_info.walk_revctrl = partial(manifest_walk_revctrl, manifest=manifest)
+    elif not ff or ff == 'none':
         setuptools.command.egg_info.walk_revctrl = no_walk_revctrl
     else:
-        setuptools.command.egg_info.walk_revctrl = partial(walk_revctrl, ff=ff)
+        setuptools.command.egg_info.walk_revctrl = partial(walk_revctrl, ff=ff, cachedir=cachedir)
 
     sys.argv = ['setup.py'] + args
     try:
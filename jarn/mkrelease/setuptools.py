@@ -1,25 +1,48 @@
 import sys
 import os
-
-import setuptools # XXX
-import distutils.command
+import ast
+import shlex
+import tempfile
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
 
 from os.path import abspath, join, isfile, isdir
 from os.path import basename, dirname
-from shutil import rmtree
-from setuptools._normalization import best_effort_version
+from shutil import rmtree, copy
 
 from .python import Python
-from .process import Process
+from .process import Process, catch_keyboard_interrupts
+from .buildworker import BuildWorkerError
+from .timing import timed
 from .configparser import ConfigParser
 from .chdir import chdir
-from .exit import err_exit, warn
+from .exit import err_exit, warn, trace
 from .tee import *
 from .colors import bold
 
 OK_RESPONSE = 'Server response (200): OK'
 GONE_RESPONSE = 'Server response (410):'
 
+# Output lines parsed for filenames
+EGG_INFO_LINES = (b"writing manifest file '",)
+DIST_LINES = (b"creating '", b'Writing ')
+
+# setup() keywords known not to affect name and version
+INERT_KEYWORDS = frozenset((
+    'author', 'author_email', 'classifiers', 'data_files', 'description',
+    'entry_points', 'extras_require', 'include_package_data', 'install_requires',
+    'keywords', 'license', 'long_description', 'long_description_content_type',
+    'maintainer', 'maintainer_email', 'namespace_packages', 'package_data',
+    'package_dir', 'packages', 'platforms', 'project_urls', 'py_modules',
+    'python_requires', 'scripts', 'test_suite', 'tests_require', 'url',
+    'zip_safe'))
+
 FILTERWARNINGS = ('-W "ignore:setup.py install is deprecated" '
                   '-W "ignore:easy_install command is deprecated" '
                   '-W "ignore:Support for \\`[tool.setuptools]\\` in \\`pyproject.toml\\`" '
@@ -27,20 +50,51 @@ FILTERWARNINGS = ('-W "ignore:setup.py install is deprecated" '
                   '-W "ignore:Deprecated config in \\`setup.cfg\\`"')
 
 
+def has_check_command():
+    import setuptools # XXX
+    import distutils.command
+    return 'check' in distutils.command.__all__
+
+
 class Setuptools(object):
     """Interface to setuptools."""
 
-    def __init__(self, process=None):
+    def __init__(self, process=None, cachedir=''):
         self.process = process or Process(env=self.get_env())
         self.python = Python()
+        self.cachedir = cachedir
+        self.buildworkers = None
 
         self.infoflags = ['--tag-build=""', '--no-date']
+        self._package_info = {}
 
         # setuptools < 33.1.0
         from setuptools.command.egg_info import egg_info
         if 'no-svn-revision' in getattr(egg_info, 'negative_opt', []):
             self.infoflags.append('--no-svn-revision')
 
+    def start_build_workers(self):
+        """Start a warm build worker for subsequent setup.py runs.
+
+        The worker imports setuptools while mkrelease goes about its
+        business. More workers are started if builds run concurrently.
+        """
+        from .buildworker import BuildWorkerPool
+
+        if self.buildworkers is None:
+            python = self.python
+            filterwarnings = FILTERWARNINGS
+            self.buildworkers = BuildWorkerPool(
+                '"%(python)s" %(filterwarnings)s' % locals(), self.process.env)
+        self.buildworkers.start()
+
+    def stop_build_workers(self):
+        """Stop all build workers.
+        """
+        if self.buildworkers is not None:
+            self.buildworkers.close()
+            self.buildworkers = None
+
     def get_env(self):
         # Make sure setuptools and its extensions are found if mkrelease
         # has been installed with zc.buildout
@@ -49,6 +103,21 @@ class Setuptools(object):
         env['HG_SETUPTOOLS_FORCE_CMD'] = '1'
         return env
 
+    def get_build_id(self):
+        """Return a string identifying the build environment.
+
+        Distributions built by different interpreters or setuptools
+        versions are not interchangeable.
+        """
+        import setuptools
+        try:
+            from importlib.metadata import version
+            wheel = version('wheel')
+        except Exception:
+            wheel = ''
+        python = '.'.join([str(x) for x in self.python.version_info[:3]])
+        return '%s %s setuptools-%s wheel-%s' % (self.python, python, setuptools.__version__, wheel)
+
     def is_valid_package(self, dir):
         return (isfile(join(dir, 'setup.py')) or
                 isfile(join(dir, 'setup.cfg')) or
@@ -66,9 +135,17 @@ class Setuptools(object):
         if parser.warnings:
             err_exit('mkrelease: Bad setup in %(dir)s' % locals())
 
-        rc, lines = self._run_setup_py(
-            ['--name', '--version'],
-            echo=False)
+        key = self._get_package_info_key(dir, develop)
+        if key in self._package_info:
+            return self._package_info[key]
+
+        info = self._get_static_package_info(parser)
+        if info:
+            rc, lines = 0, list(info)
+        else:
+            rc, lines = self._run_setup_py(
+                ['--name', '--version'],
+                echo=False)
 
         if rc == 0 and len(lines) == 2:
             name, version = lines
@@ -79,7 +156,10 @@ class Setuptools(object):
             if develop:
                 version += parser.get('egg_info', 'tag_build', '').strip()
             if not parser.warnings:
-                return name, best_effort_version(version)
+                from setuptools._normalization import best_effort_version
+                info = name, best_effort_version(version)
+                self._package_info[key] = info
+                return info
 
         if rc == self.process.rc_keyboard_interrupt:
             err_exit('ERROR: package_info failed')
@@ -97,7 +177,8 @@ class Setuptools(object):
         rc, lines = self._run_setup_py(
             ['egg_info'] + infoflags,
             echo=echo,
-            ff=ff)
+            ff=ff,
+            keep=EGG_INFO_LINES)
 
         if rc == 0:
             filename = self._parse_egg_info_results(lines)
@@ -119,7 +200,7 @@ class Setuptools(object):
             echo2 = Not(And(StartsWith('Skipping'), EndsWith('(namespace package)')))
 
         checkcmd = []
-        if 'check' in distutils.command.__all__:
+        if has_check_command():
             checkcmd = ['check']
 
         if isdir('build') and distcmd != 'sdist':
@@ -130,7 +211,8 @@ class Setuptools(object):
             [distcmd] + distflags,
             echo=echo,
             echo2=echo2,
-            ff=ff)
+            ff=ff,
+            keep=DIST_LINES)
 
         if rc == 0:
             if distflags == ['--formats="gztar"']:
@@ -141,6 +223,166 @@ class Setuptools(object):
                 return abspath(filename)
         err_exit('ERROR: %(distcmd)s failed' % locals())
 
+    @chdir
+    def run_dists(self, dir, infoflags, distributions, ff='', quiet=False, parallel=False):
+        """Build all 'distributions' in a single setup.py run.
+
+        If 'parallel' is True, every dist command runs in a setup.py
+        process of its own, concurrently with the others.
+        Returns the list of distfiles in the order of 'distributions'.
+        """
+        distcmds = self._merge_distributions(distributions)
+        firstcmd = distcmds[0][0]
+
+        if parallel and len(distcmds) > 1:
+            manifest = ''
+            if ff and ff != 'none':
+                # Scan the sandbox once; all builds reuse SOURCES.txt
+                manifest = self.run_egg_info(dir, infoflags, ff, quiet)
+            filenames = self._run_dists_parallel(infoflags, distcmds, ff, quiet, manifest)
+            return self._get_distfiles(distributions, filenames, distcmds)
+
+        if not self.process.quiet:
+            print(bold('running %(firstcmd)s' % locals()))
+
+        echo = After('running %(firstcmd)s' % locals())
+        if quiet:
+            echo = And(echo, StartsWith('running'))
+
+        echo2 = On()
+        if quiet and 'bdist_wheel' in [x[0] for x in distcmds]:
+            echo2 = Not(And(StartsWith('Skipping'), EndsWith('(namespace package)')))
+
+        checkcmd = []
+        if has_check_command():
+            checkcmd = ['check']
+
+        if isdir('build') and [x for x in distcmds if x[0] != 'sdist']:
+            self._cleanup_libdir('build', quiet=True)
+
+        args = []
+        for distcmd, distflags in distcmds:
+            args += [distcmd] + distflags
+
+        rc, lines = self._run_setup_py(
+            ['egg_info'] + infoflags + checkcmd + args,
+            echo=echo,
+            echo2=echo2,
+            ff=ff,
+            keep=DIST_LINES)
+
+        filenames = []
+        if rc == 0:
+            filenames = self._parse_dists_results(lines)
+        return self._get_distfiles(distributions, filenames, distcmds)
+
+    def _run_dists_parallel(self, infoflags, distcmds, ff, quiet, manifest=''):
+        """Run every dist command in a setup.py process of its own.
+
+        Each process gets separate egg-base, build-base, and dist-dir
+        directories, so builds cannot clobber each other. Distfiles are
+        moved to dist when all builds have succeeded. If 'manifest' is
+        given, builds take their file list from it instead of asking
+        the file-finder.
+        Returns the list of filenames built.
+        """
+        from .workers import run_parallel
+
+        if not isdir('build'):
+            os.mkdir('build')
+        tempdir = tempfile.mkdtemp(prefix='mkrelease-', dir='build')
+        try:
+            if manifest:
+                # The sdist build rewrites the original
+                manifest = copy(manifest, abspath(tempdir))
+            results = {}
+            argslist = []
+            for index, (distcmd, distflags) in enumerate(distcmds):
+                base = join(tempdir, str(index))
+                argslist.append((base, infoflags, distcmd, distflags, ff, quiet, manifest, results))
+
+            rcs = run_parallel(self._run_isolated_dist, argslist, len(argslist))
+            if [x for x in rcs if x != 0]:
+                # Failed builds have reported their errors
+                sys.exit(1)
+
+            if not isdir('dist'):
+                os.mkdir('dist')
+            filenames = []
+            for distcmd, distflags in distcmds:
+                for filename in results[distcmd]:
+                    if isfile(filename):
+                        target = join('dist', basename(filename))
+                        os.replace(filename, target)
+                        filenames.append(target)
+            return filenames
+        finally:
+            rmtree(tempdir, ignore_errors=True)
+
+    def _run_isolated_dist(self, base, infoflags, distcmd, distflags, ff, quiet, manifest, results):
+        # Called in a worker thread; must not change the working directory
+        firstcmd = distcmd
+        if distcmd != 'sdist':
+            # The build command runs first
+            firstcmd = 'build'
+
+        if not self.process.quiet:
+            print(bold('running %(firstcmd)s' % locals()))
+
+        echo = After('running %(firstcmd)s' % locals())
+        if quiet:
+            echo = And(echo, StartsWith('running'))
+
+        echo2 = On()
+        if quiet and distcmd == 'bdist_wheel':
+            echo2 = Not(And(StartsWith('Skipping'), EndsWith('(namespace package)')))
+
+        checkcmd = []
+        if has_check_command():
+            checkcmd = ['check']
+
+        distdir = join(base, 'dist')
+        args = ['egg_info'] + infoflags
+        if distcmd != 'sdist':
+            # sdist packages the egg-info of the sandbox
+            eggbase = join(base, 'egg-base')
+            os.makedirs(eggbase)
+            args += ['--egg-base=%(eggbase)s' % locals()]
+        args += checkcmd
+        if distcmd != 'sdist':
+            args += ['build', '--build-base=%s' % join(base, 'build')]
+        args += [distcmd] + distflags + ['--dist-dir=%(distdir)s' % locals()]
+
+        rc, lines = self._run_setup_py(
+            args,
+            echo=echo,
+            echo2=echo2,
+            ff=ff,
+            keep=DIST_LINES,
+            cwd=os.getcwd(),
+            manifest=manifest)
+
+        if rc == 0:
+            results[distcmd] = self._parse_dists_results(lines, distdir)
+            return
+        err_exit('ERROR: %(distcmd)s failed' % locals())
+
+    def _get_distfiles(self, distributions, filenames, distcmds):
+        # Pick the distfile of each distribution from 'filenames'
+        distfiles = []
+        for distcmd, distflags in distributions:
+            ext = self._get_extension(distcmd, distflags)
+            for filename in filenames:
+                if filename.endswith(ext) and isfile(filename):
+                    distfiles.append(abspath(filename))
+                    break
+            else:
+                break
+        else:
+            return distfiles
+        distcmds = ' '.join([x[0] for x in distcmds])
+        err_exit('ERROR: %(distcmds)s failed' % locals())
+
     @chdir
     def run_register(self, dir, infoflags, location, ff='', quiet=False):
         if not self.process.quiet:
@@ -151,7 +393,7 @@ class Setuptools(object):
             echo = And(echo, Not(Equals(OK_RESPONSE)))
 
         checkcmd = []
-        if 'check' in distutils.command.__all__:
+        if has_check_command():
             checkcmd = ['check']
 
         serverflags = ['--repository="%(location)s"' % locals()]
@@ -200,23 +442,131 @@ class Setuptools(object):
                 return rc
         err_exit('ERROR: upload failed')
 
-    def _run_setup_py(self, args, echo=True, echo2=True, ff=''):
+    def _get_package_info_key(self, dir, develop):
+        # Invalidate when a setup file changes
+        mtimes = []
+        for filename in ('setup.py', 'setup.cfg', 'pyproject.toml'):
+            if isfile(filename):
+                mtimes.append(os.stat(filename).st_mtime_ns)
+            else:
+                mtimes.append(None)
+        return (abspath(dir), develop) + tuple(mtimes)
+
+    def _get_static_package_info(self, parser):
+        """Return name and version if the metadata is static.
+
+        Reads pyproject.toml [project] or setup.cfg [metadata] and
+        returns None if setup.py or 'dynamic' may change the result.
+        """
+        if isfile('setup.py') and not self._is_static_setup_py('setup.py'):
+            return None
+
+        if isfile('pyproject.toml'):
+            if tomllib is None:
+                return None
+            try:
+                with open('pyproject.toml', 'rb') as file:
+                    pyproject = tomllib.load(file)
+            except (IOError, OSError, ValueError):
+                return None
+            project = pyproject.get('project')
+            if project is not None:
+                dynamic = project.get('dynamic', [])
+                if 'name' in dynamic or 'version' in dynamic:
+                    return None
+                name = project.get('name')
+                version = project.get('version')
+                if isinstance(name, str) and isinstance(version, str):
+                    return name, version
+                return None
+
+        name = parser.get('metadata', 'name', '').strip()
+        version = parser.get('metadata', 'version', '').strip()
+        if name and version:
+            if not version.startswith(('attr:', 'file:')):
+                return name, version
+        return None
+
+    def _is_static_setup_py(self, filename):
+        # A setup.py is static if it calls setup() once, with
+        # inert keywords only
+        try:
+            with open(filename, 'rb') as file:
+                tree = ast.parse(file.read(), filename)
+        except (IOError, OSError, SyntaxError, ValueError):
+            return False
+        calls = 0
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call):
+                func = node.func
+                if isinstance(func, ast.Attribute):
+                    funcname = func.attr
+                else:
+                    funcname = getattr(func, 'id', '')
+                if funcname == 'setup':
+                    calls += 1
+                    if node.args:
+                        return False
+                    for keyword in node.keywords:
+                        if keyword.arg not in INERT_KEYWORDS:
+                            return False
+        return calls == 1
+
+    def _run_setup_py(self, args, echo=True, echo2=True, ff='', keep=None, cwd=None, manifest=''):
         """Run setup.py with monkey-patched setuptools.
 
-        The patch forces setuptools to use the file-finder 'ff'.
+        The patch forces setuptools to use the file-finder 'ff', or
+        the files listed in 'manifest' if given. File listings are
+        cached in the cache directory if one is configured.
         'args' is the list of arguments that should be passed to
-        setup.py.
+        setup.py. 'keep' limits the lines returned (see tee.run).
         """
         python = self.python
         filterwarnings = FILTERWARNINGS
 
-        run_setup = 'from jarn.mkrelease import setup; setup.run(%(args)r, ff=%(ff)r)'
+        if self.buildworkers is not None:
+            request = {
+                # The shell removes quotes from setup.py arguments
+                'args': [' '.join(shlex.split(x)) for x in args],
+                'ff': ff,
+                'manifest': manifest,
+                'cachedir': self.cachedir,
+                'cwd': abspath(cwd or os.curdir),
+            }
+            try:
+                return self._run_build_worker(request, echo, echo2, keep)
+            except BuildWorkerError as e:
+                warn('%s; running setup.py instead' % (e,))
+
+        options = 'ff=%(ff)r' % locals()
+        if manifest:
+            options += ', manifest=%(manifest)r' % locals()
+        if self.cachedir:
+            options += ', cachedir=%r' % self.cachedir
+
+        run_setup = 'from jarn.mkrelease import setup; setup.run(%(args)r, %(options)s)'
         setup_py = '-c"%s"' % (run_setup % locals())
 
         return self.process.popen(
             '"%(python)s" %(filterwarnings)s %(setup_py)s' % locals(),
             echo=echo,
-            echo2=echo2)
+            echo2=echo2,
+            keep=keep,
+            cwd=cwd)
+
+    def _run_build_worker(self, request, echo=True, echo2=True, keep=None):
+        # Mirrors Process.popen
+        cmd = 'setup.py %s' % ' '.join(request['args'])
+        trace('build worker: %(cmd)s' % locals())
+        if self.process.quiet:
+            echo = echo2 = False
+        try:
+            with timed(cmd, 'command'):
+                return self.buildworkers.run(request, echo, echo2, keep)
+        except KeyboardInterrupt:
+            if catch_keyboard_interrupts:
+                return self.process.rc_keyboard_interrupt, []
+            raise
 
     def _parse_egg_info_results(self, lines):
         for line in lines:
@@ -239,6 +589,50 @@ class Setuptools(object):
                 return join('dist', pkgname)
         return ''
 
+    def _parse_dists_results(self, lines, distdir='dist'):
+        # The sdist gztar line names the release tree only
+        filenames = []
+        for line in lines:
+            if line.startswith("creating '") and "' and adding '" in line:
+                filenames.append(line.split("'")[1])
+            elif line.startswith('Writing ') and line.endswith('setup.cfg'):
+                pkgname = basename(dirname(line[8:])) + '.tar.gz'
+                filenames.append(join(distdir, pkgname))
+        return filenames
+
+    def _merge_distributions(self, distributions):
+        # Fold e.g. sdist --formats="gztar" and sdist --formats="zip"
+        # into sdist --formats="gztar,zip"; distutils runs every command
+        # only once per invocation.
+        distcmds, formats = [], {}
+        for distcmd, distflags in distributions:
+            if len(distflags) == 1 and distflags[0].startswith('--formats='):
+                format = distflags[0][len('--formats='):].strip('"')
+                if distcmd not in formats:
+                    formats[distcmd] = []
+                    distcmds.append((distcmd, formats[distcmd]))
+                if format not in formats[distcmd]:
+                    formats[distcmd].append(format)
+            elif distcmd not in [x[0] for x in distcmds]:
+                distcmds.append((distcmd, distflags))
+        merged = []
+        for distcmd, distflags in distcmds:
+            if distcmd in formats:
+                distflags = ['--formats="%s"' % ','.join(distflags)]
+            merged.append((distcmd, distflags))
+        return merged
+
+    def _get_extension(self, distcmd, distflags):
+        if distcmd == 'bdist_wheel':
+            return '.whl'
+        if distflags == ['--formats="gztar"']:
+            return '.tar.gz'
+        if distflags == ['--formats="zip"']:
+            return '.zip'
+        if distflags == ['--formats="egg"']:
+            return '.egg'
+        return ''
+
     def _parse_register_results(self, lines):
         return self._parse_server_response_2017(
             lines, 'running register', (OK_RESPONSE, GONE_RESPONSE))
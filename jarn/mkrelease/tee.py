@@ -1,8 +1,15 @@
 import sys
+import copy
+import asyncio
 import threading
+import contextvars
 
 from subprocess import Popen, PIPE
 from .utils import decode
+from .timing import timings
+
+# Size of chunks read from child processes
+CHUNKSIZE = 2**16
 
 
 __all__ = ['On', 'Off', 'NotEmpty', 'Equals', 'Contains',
@@ -10,7 +17,115 @@ __all__ = ['On', 'Off', 'NotEmpty', 'Equals', 'Contains',
            'After', 'NotBefore', 'Not', 'And', 'Or']
 
 
-def tee(process, filter):
+class LineReader(object):
+    """Split chunks of output into lines.
+
+    Chunks are split and decoded in bulk; only the 'filter' is called
+    per line, and only if it can print anything.
+
+    The 'filter' is a tee filter deciding which lines are passed to
+    'write'. If 'lines' is a list, lines matching 'keep' are appended to
+    it, stripped of trailing whitespace. 'keep' is either a tuple of
+    byte prefixes or a callable receiving the raw line as bytes;
+    None keeps all lines.
+    """
+
+    def __init__(self, filter, write, lines=None, keep=None):
+        self.filter = filter
+        self.write = write
+        self.lines = lines
+        self.keep = keep
+        self.echo = not isinstance(filter, Off)
+        self.echoall = isinstance(filter, On)
+        self.buffer = b''
+
+    def feed(self, chunk):
+        if timings.enabled:
+            timings.add_output(len(chunk))
+        end = chunk.rfind(b'\n')
+        if end < 0:
+            self.buffer += chunk
+            return
+        data = self.buffer + chunk[:end+1] if self.buffer else chunk[:end+1]
+        self.buffer = chunk[end+1:]
+        self.handle(data)
+
+    def close(self):
+        if self.buffer:
+            data, self.buffer = self.buffer, b''
+            self.handle(data)
+
+    def handle(self, data):
+        # 'data' holds complete lines, the last may lack a newline
+        text = None
+        if self.lines is not None:
+            if self.keep is None:
+                # Decoded once for capture and echo
+                text = decode(data)
+            self.lines.extend(map(str.rstrip, self.match(data, text)))
+        if not self.echo:
+            return
+        if text is None:
+            text = decode(data)
+        if self.echoall:
+            self.write(text)
+            return
+        lines = text.split('\n')
+        if lines[-1]:
+            last = lines.pop()
+        else:
+            last = None
+            lines.pop()
+        filter, write = self.filter, self.write
+        for line in lines:
+            if filter(line.rstrip()):
+                write(line + '\n')
+        if last is not None and filter(last.rstrip()):
+            write(last)
+
+    def match(self, data, text=None):
+        """Return the decoded lines of 'data' matching 'keep'.
+
+        'text' may hold 'data' decoded already.
+        """
+        keep = self.keep
+        if keep is None:
+            if text is None:
+                text = decode(data)
+            lines = text.split('\n')
+            if not lines[-1]:
+                lines.pop()
+            return lines
+        if isinstance(keep, tuple):
+            lines = findprefixes(data, keep)
+            # Decode in one go; matches do not contain newlines
+            return decode(b'\n'.join(lines)).split('\n') if lines else []
+        lines = data.split(b'\n')
+        if not lines[-1]:
+            lines.pop()
+        return [decode(x) for x in lines if keep(x)]
+
+
+def findprefixes(data, prefixes):
+    """Return the lines of 'data' starting with one of 'prefixes'.
+
+    Searches for the prefixes instead of looking at every line.
+    """
+    found = {}
+    size = len(data)
+    for prefix in prefixes:
+        needle = b'\n' + prefix
+        start = 0 if data.startswith(prefix) else data.find(needle) + 1 or -1
+        while 0 <= start < size:
+            end = data.find(b'\n', start)
+            if end < 0:
+                end = size
+            found[start] = data[start:end]
+            start = data.find(needle, end) + 1 or -1
+    return [found[x] for x in sorted(found)]
+
+
+def tee(process, filter, keep=None, write=None):
     """Read lines from process.stdout and echo them to sys.stdout.
 
     Returns a list of lines read. Lines are not newline terminated.
@@ -18,20 +133,22 @@ def tee(process, filter):
     The 'filter' is a callable which is invoked for every line,
     receiving the line as argument. If the filter returns True, the
     line is echoed to sys.stdout.
+
+    If 'keep' is given, only matching lines are returned (see LineReader).
+    If 'write' is given, it is used instead of sys.stdout.write.
     """
     lines = []
+    reader = LineReader(filter, write or (lambda x: sys.stdout.write(x)), lines, keep)
 
     while True:
         try:
-            line = process.stdout.readline()
-            if line:
-                line = decode(line)
-                stripped_line = line.rstrip()
-                if filter(stripped_line):
-                    sys.stdout.write(line)
-                lines.append(stripped_line)
-            elif process.poll() is not None:
+            chunk = process.stdout.read1(CHUNKSIZE)
+            if chunk:
+                reader.feed(chunk)
+            else:
+                reader.close()
                 process.stdout.close()
+                process.wait()
                 break
         except KeyboardInterrupt:
             process.returncode = 1
@@ -39,21 +156,24 @@ def tee(process, filter):
     return lines
 
 
-def tee2(process, filter):
+def tee2(process, filter, write=None):
     """Read lines from process.stderr and echo them to sys.stderr.
 
     The 'filter' is a callable which is invoked for every line,
     receiving the line as argument. If the filter returns True, the
     line is echoed to sys.stderr.
+
+    If 'write' is given, it is used instead of sys.stderr.write.
     """
+    reader = LineReader(filter, write or (lambda x: sys.stderr.write(x)))
+
     while True:
-        line = process.stderr.readline()
-        if line:
-            line = decode(line)
-            stripped_line = line.rstrip()
-            if filter(stripped_line):
-                sys.stderr.write(line)
-        elif process.returncode is not None:
+        chunk = process.stderr.read1(CHUNKSIZE)
+        if chunk:
+            reader.feed(chunk)
+        else:
+            # read1 returns an empty chunk at EOF only
+            reader.close()
             process.stderr.close()
             break
 
@@ -66,7 +186,10 @@ class background_thread(object):
         self.args = args
 
     def __enter__(self):
-        self._t = threading.Thread(target=self.target, args=self.args)
+        # Run in a copy of the current context so output redirection
+        # applies to the background thread as well
+        context = contextvars.copy_context()
+        self._t = threading.Thread(target=context.run, args=(self.target,)+tuple(self.args))
         self._t.start()
         return self._t
 
@@ -74,7 +197,92 @@ class background_thread(object):
         self._t.join()
 
 
-def run(args, echo=True, echo2=True, shell=False, cwd=None, env=None):
+async def atee(stream, filter, write, lines=None, keep=None):
+    """Read lines from an asyncio 'stream' and echo them using 'write'.
+
+    If 'lines' is a list, lines read are appended to it. Lines are not
+    newline terminated. If 'keep' is given, only matching lines are
+    appended (see LineReader).
+    """
+    reader = LineReader(filter, write, lines, keep)
+    while True:
+        chunk = await stream.read(CHUNKSIZE)
+        if not chunk:
+            break
+        reader.feed(chunk)
+    reader.close()
+
+
+async def arun(args, echo=True, echo2=True, shell=False, cwd=None, env=None, output=None, keep=None):
+    """Run 'args' and return a two-tuple of exit code and lines read.
+
+    Coroutine version of 'run'. Stdout and stderr are read concurrently.
+    If 'output' is a list, echoed lines are appended to it as
+    (stream, line) tuples instead of being written.
+    """
+    echo = _get_filter(echo)
+    echo2 = _get_filter(echo2)
+
+    if shell:
+        process = await asyncio.create_subprocess_shell(
+            args, stdout=PIPE, stderr=PIPE, cwd=cwd, env=env)
+    else:
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=PIPE, stderr=PIPE, cwd=cwd, env=env)
+
+    def writer(stream):
+        if output is not None:
+            return lambda line: output.append((stream, line))
+        return lambda line: stream.write(line)
+
+    lines = []
+    await asyncio.gather(
+        atee(process.stdout, echo, writer(sys.stdout), lines, keep),
+        atee(process.stderr, echo2, writer(sys.stderr)))
+    rc = await process.wait()
+    return rc, lines
+
+
+async def arun_many(argslist, echo=True, echo2=True, shell=False, cwd=None, env=None):
+    """Run all 'args' in 'argslist' concurrently.
+
+    Output is echoed per command, in the order of 'argslist'.
+    Returns a list of two-tuples of exit code and lines read.
+    """
+    tasks, outputs = [], []
+    for args in argslist:
+        output = []
+        # Stateful filters must not be shared between commands
+        tasks.append(asyncio.ensure_future(arun(
+            args, copy.deepcopy(echo), copy.deepcopy(echo2), shell, cwd, env, output)))
+        outputs.append(output)
+
+    results = []
+    try:
+        for task, output in zip(tasks, outputs):
+            results.append(await task)
+            for stream, line in output:
+                stream.write(line)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return results
+
+
+def _get_filter(echo):
+    if not callable(echo):
+        echo = On() if echo else Off()
+    return echo
+
+
+def _can_run_async():
+    # Python 3.7 cannot watch child processes outside the main thread
+    if sys.version_info[:2] < (3, 8):
+        return threading.current_thread() is threading.main_thread()
+    return True
+
+
+def run(args, echo=True, echo2=True, shell=False, cwd=None, env=None, keep=None, output=None):
     """Run 'args' and return a two-tuple of exit code and lines read.
 
     If 'echo' is True, the stdout stream is echoed to sys.stdout.
@@ -86,6 +294,49 @@ def run(args, echo=True, echo2=True, shell=False, cwd=None, env=None):
     If 'shell' is True, args are executed via the shell.
     The 'cwd' argument causes the child process to be executed in cwd.
     The 'env' argument allows to pass a dict replacing os.environ.
+
+    If 'keep' is given, only lines matching 'keep' are returned.
+    It may be a tuple of byte prefixes or a callable receiving the
+    raw line as bytes. Lines not kept and not echoed are never
+    decoded.
+
+    If 'output' is a list, echoed lines are appended to it as
+    (stream, line) tuples instead of being written.
+    """
+    if not _can_run_async():
+        return run_threaded(args, echo, echo2, shell, cwd, env, keep, output)
+    return asyncio.run(arun(args, echo, echo2, shell, cwd, env, output, keep))
+
+
+def run_many(argslist, echo=True, echo2=True, shell=False, cwd=None, env=None):
+    """Run all 'args' in 'argslist' concurrently.
+
+    Output is echoed per command, in the order of 'argslist'.
+    Returns a list of two-tuples of exit code and lines read.
+    """
+    if not _can_run_async():
+        return [run_threaded(args, copy.deepcopy(echo), copy.deepcopy(echo2), shell, cwd, env)
+                for args in argslist]
+    return asyncio.run(arun_many(argslist, echo, echo2, shell, cwd, env))
+
+
+def run_threaded(args, echo=True, echo2=True, shell=False, cwd=None, env=None, keep=None, output=None):
+    """Run 'args' and return a two-tuple of exit code and lines read.
+
+    Thread-based version of 'run'. Stderr is read in a background thread.
+
+    If 'echo' is True, the stdout stream is echoed to sys.stdout.
+    If 'echo2' is True, the stderr stream is echoed to sys.stderr.
+
+    The 'echo' and 'echo2' arguments may be callables, in which
+    case they are used as tee filters.
+
+    If 'shell' is True, args are executed via the shell.
+    The 'cwd' argument causes the child process to be executed in cwd.
+    The 'env' argument allows to pass a dict replacing os.environ.
+
+    If 'output' is a list, echoed lines are appended to it as
+    (stream, line) tuples instead of being written.
     """
     if not callable(echo):
         echo = On() if echo else Off()
@@ -102,22 +353,33 @@ def run(args, echo=True, echo2=True, shell=False, cwd=None, env=None):
         env=env
     )
 
-    with background_thread(tee2, (process, echo2)):
-        lines = tee(process, echo)
+    write = write2 = None
+    if output is not None:
+        write = lambda x: output.append((sys.stdout, x))
+        write2 = lambda x: output.append((sys.stderr, x))
+
+    with background_thread(tee2, (process, echo2, write2)):
+        lines = tee(process, echo, keep, write)
 
     return process.returncode, lines
 
 
-def system(args, echo=True, echo2=True, shell=False, cwd=None, env=None):
+def system(args, echo=True, echo2=True, shell=False, cwd=None, env=None, keep=None, output=None):
     """Run 'args' and return a two-tuple of exit code and empty list.
 
     Does not capture stdout and stderr.
-    'echo' and 'echo2' have no effect.
+    'echo', 'echo2', and 'keep' have no effect.
 
     If 'shell' is True, args are executed via the shell.
     The 'cwd' argument causes the child process to be executed in cwd.
     The 'env' argument allows to pass a dict replacing os.environ.
+
+    If 'output' is a list, output must not reach the terminal; the
+    command is run by 'run_threaded' instead.
     """
+    if output is not None:
+        return run_threaded(args, echo, echo2, shell, cwd, env, keep, output)
+
     process = Popen(
         args,
         stdout=None,
@@ -282,7 +282,7 @@ class MockProcess(Process):
         self.lines = lines or []
         self.func = func
 
-    def popen(self, cmd, echo=True, echo2=True):
+    def popen(self, cmd, echo=True, echo2=True, keep=None, cwd=None, output=None):
         if self.func is not None:
             rc_lines = self.func(cmd)
             if rc_lines is not None:
@@ -291,6 +291,9 @@ class MockProcess(Process):
                 raise MockProcessError('Unhandled command: %s' % cmd)
         return self.rc, self.lines
 
+    def popen_many(self, cmds, echo=True, echo2=True):
+        return [self.popen(cmd, echo, echo2) for cmd in cmds]
+
 
 def quiet(func):
     """Decorator swallowing stdout and stderr output.
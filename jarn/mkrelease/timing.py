@@ -0,0 +1,173 @@
+import os
+import sys
+import time
+import json
+import threading
+import contextvars
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from contextlib import contextmanager
+
+# Frames open in the current context
+_stack = contextvars.ContextVar('stack', default=())
+
+
+def children_cpu():
+    """Return user + system CPU seconds of terminated, waited-for children.
+    """
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Frame(object):
+    """A timed phase or command."""
+
+    def __init__(self, name, category, depth):
+        self.name = name
+        self.category = category
+        self.depth = depth
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+        self.start = time.perf_counter()
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.bytes = 0
+        self._cpu = children_cpu()
+
+    def stop(self):
+        self.wall = time.perf_counter() - self.start
+        self.cpu = max(self.cpu + children_cpu() - self._cpu, 0.0)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'category': self.category,
+            'depth': self.depth,
+            'pid': self.pid,
+            'tid': self.tid,
+            'start': self.start,
+            'wall': self.wall,
+            'cpu': self.cpu,
+            'bytes': self.bytes,
+        }
+
+
+class Timings(object):
+    """Collect wall time, child CPU time, and output bytes.
+
+    Phases and commands are recorded only while 'enabled' is True.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.frames = []
+
+    @contextmanager
+    def timed(self, name, category='phase'):
+        """Context manager timing the enclosed block.
+        """
+        if not self.enabled:
+            yield None
+            return
+        stack = _stack.get()
+        frame = Frame(name, category, len(stack))
+        token = _stack.set(stack + (frame,))
+        try:
+            yield frame
+        finally:
+            frame.stop()
+            _stack.reset(token)
+            self.frames.append(frame.to_dict())
+
+    def add_output(self, nbytes):
+        """Count 'nbytes' of output towards all open frames.
+        """
+        for frame in _stack.get():
+            frame.bytes += nbytes
+
+    def add_cpu(self, seconds):
+        """Count 'seconds' of CPU time towards all open frames.
+
+        For children of other processes, which RUSAGE_CHILDREN does not see.
+        """
+        for frame in _stack.get():
+            frame.cpu += seconds
+
+    def export(self):
+        """Return frames recorded by this process and forget all frames.
+
+        Forked processes inherit the frames of their parent.
+        """
+        pid = os.getpid()
+        frames, self.frames = self.frames, []
+        return [x for x in frames if x['pid'] == pid]
+
+    def merge(self, frames):
+        """Add frames recorded by another process.
+        """
+        self.frames.extend(frames)
+
+    def get_frames(self):
+        return sorted(self.frames, key=lambda x: x['start'])
+
+    def print_summary(self, file=None):
+        """Print a table of phases and commands.
+        """
+        file = file or sys.stderr
+        frames = self.get_frames()
+        if not frames:
+            return
+        width = min(max([len(x['name']) + 2*x['depth'] for x in frames] + [5]), 60)
+        print('%-*s %9s %9s %11s' % (width, 'phase', 'wall', 'cpu', 'output'), file=file)
+        for frame in frames:
+            name = '  '*frame['depth'] + frame['name']
+            if len(name) > width:
+                name = name[:width-3] + '...'
+            print('%-*s %8.2fs %8.2fs %11s' % (
+                width, name, frame['wall'], frame['cpu'], format_bytes(frame['bytes'])), file=file)
+
+    def write_json(self, filename):
+        """Write recorded frames to 'filename' as JSON.
+        """
+        with open(filename, 'wt') as file:
+            json.dump({'frames': self.get_frames()}, file, indent=1)
+
+    def write_chrome_trace(self, filename):
+        """Write recorded frames to 'filename' in Chrome trace event format.
+        """
+        events = []
+        for frame in self.get_frames():
+            events.append({
+                'name': frame['name'],
+                'cat': frame['category'],
+                'ph': 'X',
+                'ts': int(frame['start'] * 1e6),
+                'dur': int(frame['wall'] * 1e6),
+                'pid': frame['pid'],
+                'tid': frame['tid'],
+                'args': {'cpu': frame['cpu'], 'bytes': frame['bytes']},
+            })
+        with open(filename, 'wt') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+
+def format_bytes(nbytes):
+    for unit in ('B', 'KB', 'MB'):
+        if nbytes < 1024:
+            break
+        nbytes /= 1024.0
+    else:
+        unit = 'GB'
+    if unit == 'B':
+        return '%d B' % nbytes
+    return '%.1f %s' % (nbytes, unit)
+
+
+timings = Timings()
+timed = timings.timed
@@ -2,13 +2,10 @@ import sys
 import os
 
 from os.path import expanduser
-
-import setuptools # XXX
-import distutils.spawn
+from shutil import which
 
 from .process import Process
 from .python import Python
-from .chdir import chdir
 from .exit import err_exit
 from .tee import *
 from .tee import run, system
@@ -86,7 +83,7 @@ class Twine(object):
     def is_valid_twine(self):
         if self.twine == 'python -m twine':
             return True
-        if distutils.spawn.find_executable(self.twine):
+        if which(self.twine):
             return True
         return False
 
@@ -94,7 +91,6 @@ class Twine(object):
         if not self.is_valid_twine():
             err_exit('mkrelease: Command not found: %s' % (self.twine,))
 
-    @chdir
     def run_register(self, directory, distfiles, location, quiet=False):
         if not self.process.quiet:
             print(bold('running twine_register'))
@@ -122,13 +118,13 @@ class Twine(object):
         rc, lines = self._run_twine(
             ['register'] + serverflags + distfiles,
             echo=echo,
-            echo2=echo2)
+            echo2=echo2,
+            cwd=directory)
 
         if rc == 0:
             return rc
         err_exit('ERROR: register failed')
 
-    @chdir
     def run_upload(self, directory, distfiles, location, uploadflags, quiet=False):
         if not self.process.quiet:
             print(bold('running twine_upload'))
@@ -150,13 +146,15 @@ class Twine(object):
         rc, lines = self._run_twine(
             ['upload'] + serverflags + uploadflags + distfiles,
             echo=echo,
-            echo2=echo2)
+            echo2=echo2,
+            cwd=directory)
 
         if rc == 0:
             return rc
         err_exit('ERROR: upload failed')
 
-    def _run_twine(self, args, echo=True, echo2=True):
+    def _run_twine(self, args, echo=True, echo2=True, cwd=None):
+        # Called from worker threads; must not change the working directory
         twine = self.twine
         python = self.python
 
@@ -170,5 +168,6 @@ class Twine(object):
         return self.process.popen(
             '%s %s' % (twine, ' '.join(args)),
             echo=echo,
-            echo2=echo2)
+            echo2=echo2,
+            cwd=cwd)
 
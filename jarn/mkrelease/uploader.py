@@ -0,0 +1,415 @@
+import os
+import re
+import mmap
+import base64
+import hashlib
+import tarfile
+import zipfile
+import threading
+
+from os.path import basename, getsize
+from email.parser import HeaderParser
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from urllib.parse import urlsplit
+from urllib.request import getproxies, proxy_bypass
+
+from .process import Process
+from .exit import err_exit
+from .colors import bold
+from .index import PYPI_UPLOAD
+
+CHUNKSIZE = 2**20
+
+BOUNDARY = '--------mkrelease-boundary-7a3f9c21e4b8'
+
+# Metadata fields whose form names differ from the lowercased header
+FIELD_NAMES = {
+    'classifier': 'classifiers',
+    'project_url': 'project_urls',
+}
+
+
+def get_form_name(header):
+    """Return the upload form name for metadata 'header'.
+    """
+    name = header.lower().replace('-', '_')
+    return FIELD_NAMES.get(name, name)
+
+
+def read_metadata(filename):
+    """Return the core metadata of distribution 'filename' as text.
+
+    Raises ValueError if the distribution contains no metadata.
+    """
+    name = basename(filename)
+    if name.endswith('.tar.gz'):
+        with tarfile.open(filename, 'r:gz') as archive:
+            for member in archive:
+                if member.isfile() and re.match(r'^[^/]+/PKG-INFO$', member.name):
+                    return archive.extractfile(member).read().decode('utf-8')
+    elif name.endswith(('.whl', '.egg', '.zip')):
+        if name.endswith('.whl'):
+            pattern = r'^[^/]+\.dist-info/METADATA$'
+        elif name.endswith('.egg'):
+            pattern = r'^EGG-INFO/PKG-INFO$'
+        else:
+            pattern = r'^[^/]+/PKG-INFO$'
+        with zipfile.ZipFile(filename) as archive:
+            for member in archive.namelist():
+                if re.match(pattern, member):
+                    return archive.read(member).decode('utf-8')
+    raise ValueError('No metadata found in %s' % name)
+
+
+def get_filetype(filename):
+    """Return (filetype, pyversion) of distribution 'filename'.
+    """
+    name = basename(filename)
+    if name.endswith('.whl'):
+        return 'bdist_wheel', name[:-4].split('-')[-3]
+    if name.endswith('.egg'):
+        parts = name[:-4].split('-')
+        if len(parts) > 2 and parts[2].startswith('py'):
+            return 'bdist_egg', parts[2][2:]
+        return 'bdist_egg', ''
+    return 'sdist', 'source'
+
+
+def get_fields(filename):
+    """Return the upload form fields of distribution 'filename'.
+    """
+    msg = HeaderParser().parsestr(read_metadata(filename))
+    filetype, pyversion = get_filetype(filename)
+
+    fields = [
+        (':action', 'file_upload'),
+        ('protocol_version', '1'),
+        ('filetype', filetype),
+        ('pyversion', pyversion),
+    ]
+    seen = set([x[0] for x in fields])
+    for header in msg.keys():
+        name = get_form_name(header)
+        if name in seen:
+            continue
+        seen.add(name)
+        for value in msg.get_all(header):
+            if name == 'description':
+                value = unfold(value)
+            fields.append((name, value))
+
+    description = msg.get_payload()
+    if description and description.strip() and not msg.get('Description'):
+        fields.append(('description', description))
+    return fields
+
+
+def unfold(description):
+    """Remove continuation indentation from a Description header.
+    """
+    description = re.sub(r'\n {7}\|', '\n', description)
+    return re.sub(r'\n {8}', '\n', description)
+
+
+def md5():
+    try:
+        return hashlib.md5(usedforsecurity=False)
+    except TypeError:
+        return hashlib.md5()
+
+
+class Digests(object):
+    """Hash data with all digests the upload API knows."""
+
+    names = ('md5_digest', 'sha256_digest', 'blake2_256_digest')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.hashes = [md5(), hashlib.sha256(), hashlib.blake2b(digest_size=32)]
+
+    def update(self, data):
+        for hash in self.hashes:
+            hash.update(data)
+
+    def items(self):
+        return list(zip(self.names, [x.hexdigest() for x in self.hashes]))
+
+
+def get_digests(filename):
+    """Return md5, sha256, and blake2b-256 hex digests of 'filename'.
+    """
+    digests = Digests()
+    for chunk in FilePart(filename):
+        digests.update(chunk)
+    return digests.items()
+
+
+def map_file(filename):
+    """Return a read-only memoryview of 'filename'.
+
+    The mapping is unmapped when the last view of it is released.
+    """
+    with open(filename, 'rb') as file:
+        try:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: # Empty file
+            return memoryview(b'')
+    if hasattr(data, 'madvise'):
+        data.madvise(mmap.MADV_SEQUENTIAL)
+    return memoryview(data)
+
+
+class FilePart(object):
+    """File contents streamed from a memory map.
+
+    Chunks are views into the map, so the file is neither read into
+    memory nor copied. If 'digests' is given, it is updated with the
+    contents while streaming.
+    """
+
+    def __init__(self, filename, digests=None):
+        self.filename = filename
+        self.digests = digests
+
+    def __len__(self):
+        return getsize(self.filename)
+
+    def __iter__(self):
+        if self.digests is not None:
+            self.digests.reset()
+        data = map_file(self.filename)
+        for start in range(0, len(data), CHUNKSIZE):
+            chunk = data[start:start+CHUNKSIZE]
+            if self.digests is not None:
+                self.digests.update(chunk)
+            yield chunk
+
+
+class DigestFields(object):
+    """Form fields holding the digests of a streamed file.
+
+    Must follow the file in the body.
+    """
+
+    def __init__(self, digests):
+        self.digests = digests
+
+    def encode(self, items):
+        return b''.join([encode_field(name, value) for name, value in items])
+
+    def __len__(self):
+        # Hex digests have fixed lengths
+        return len(self.encode([(name, '0'*x.digest_size*2)
+                                for name, x in zip(self.digests.names, self.digests.hashes)]))
+
+    def __iter__(self):
+        yield self.encode(self.digests.items())
+
+
+class MultipartBody(object):
+    """A multipart/form-data body streamed from disk.
+
+    Memory use does not depend on the size of files.
+    """
+
+    content_type = 'multipart/form-data; boundary=%s' % BOUNDARY
+
+    def __init__(self):
+        self.parts = []
+
+    def add_field(self, name, value):
+        self.parts.append(encode_field(name, value))
+
+    def add_file(self, name, filename, digests=False):
+        """Add file 'filename'.
+
+        If 'digests' is true, digest fields computed while streaming
+        the file are added after it.
+        """
+        self.parts.append(encode_part(
+            'Content-Disposition: form-data; name="%s"; filename="%s"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n' % (name, basename(filename))))
+        if digests:
+            digests = Digests()
+            self.parts.append(FilePart(filename, digests))
+            self.parts.append(b'\r\n')
+            self.parts.append(DigestFields(digests))
+        else:
+            self.parts.append(FilePart(filename))
+            self.parts.append(b'\r\n')
+
+    def close(self):
+        self.parts.append(('--%s--\r\n' % BOUNDARY).encode('ascii'))
+
+    def __len__(self):
+        return sum([len(x) for x in self.parts])
+
+    def __iter__(self):
+        for part in self.parts:
+            if isinstance(part, bytes):
+                yield part
+            else:
+                for chunk in part:
+                    yield chunk
+
+
+def encode_part(headers):
+    return ('--%s\r\n' % BOUNDARY + headers).encode('utf-8')
+
+
+def encode_field(name, value):
+    return encode_part(
+        'Content-Disposition: form-data; name="%s"\r\n\r\n' % name) + value.encode('utf-8') + b'\r\n'
+
+
+class ConnectionPool(object):
+    """Keep-alive HTTP connections per scheme and host."""
+
+    def __init__(self, timeout=300):
+        self.timeout = timeout
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def get(self, url):
+        """Return (connection, reused) for 'url'.
+        """
+        scheme, netloc = urlsplit(url)[:2]
+        with self.lock:
+            idle = self.idle.get((scheme, netloc))
+            if idle:
+                return idle.pop(), True
+        return self.connect(scheme, netloc), False
+
+    def put(self, url, conn):
+        """Return 'conn' to the pool.
+        """
+        scheme, netloc = urlsplit(url)[:2]
+        with self.lock:
+            self.idle.setdefault((scheme, netloc), []).append(conn)
+
+    def close(self):
+        with self.lock:
+            for conns in self.idle.values():
+                for conn in conns:
+                    conn.close()
+            self.idle = {}
+
+    def connect(self, scheme, netloc):
+        klass = HTTPSConnection if scheme == 'https' else HTTPConnection
+        proxy = getproxies().get(scheme)
+        if proxy and not proxy_bypass(urlsplit('//'+netloc).hostname):
+            proxy = urlsplit(proxy)
+            conn = klass(proxy.hostname, proxy.port, timeout=self.timeout)
+            if scheme == 'https':
+                conn.set_tunnel(netloc)
+            else:
+                # Plain HTTP proxies expect absolute-form requests
+                conn.absolute_form = True
+            return conn
+        return klass(netloc, timeout=self.timeout)
+
+
+class Uploader(object):
+    """Upload distributions via the legacy upload API."""
+
+    def __init__(self, defaults=None, process=None):
+        self.servers = defaults.servers if defaults else {}
+        self.process = process or Process()
+        self.pool = ConnectionPool()
+
+    def get_credentials(self, location):
+        """Return (username, password) for the given server.
+
+        Falls back to the TWINE_USERNAME and TWINE_PASSWORD environment
+        variables. Returns empty strings if credentials are missing.
+        """
+        server = self.servers[location]
+        username = server.username or os.environ.get('TWINE_USERNAME', '')
+        password = server.password or os.environ.get('TWINE_PASSWORD', '')
+        if not password:
+            return '', ''
+        return username or '__token__', password
+
+    def can_upload(self, location):
+        """Return True if credentials for the given server are known.
+        """
+        return bool(self.get_credentials(location)[1])
+
+    def run_upload(self, distfiles, location, quiet=False):
+        """Upload 'distfiles' to the given server.
+
+        Signature files (.asc) are attached to their distfiles.
+        """
+        url = self.servers[location].repository or PYPI_UPLOAD
+        auth = '%s:%s' % self.get_credentials(location)
+        auth = 'Basic ' + base64.b64encode(auth.encode('utf-8')).decode('ascii')
+
+        if not self.process.quiet:
+            print(bold('running http_upload'))
+            if not quiet:
+                print('Uploading distributions to %(url)s' % locals())
+
+        signatures = set([x for x in distfiles if x.endswith('.asc')])
+        for distfile in distfiles:
+            if distfile in signatures:
+                continue
+            name = basename(distfile)
+            if not self.process.quiet:
+                print('Uploading %(name)s' % locals())
+
+            signature = distfile + '.asc'
+            if signature not in signatures:
+                signature = ''
+
+            try:
+                status, reason = self.upload_file(url, auth, distfile, signature)
+            except (IOError, OSError, HTTPException, ValueError) as e:
+                err_exit('ERROR: upload failed: %s' % (e,))
+            if status != 200:
+                err_exit('ERROR: upload failed: %(status)d %(reason)s' % locals())
+        return 0
+
+    def upload_file(self, url, auth, distfile, signature=''):
+        """Upload a single distfile and return (status, reason).
+        """
+        body = MultipartBody()
+        for name, value in get_fields(distfile):
+            body.add_field(name, value)
+        body.add_file('content', distfile, digests=True)
+        if signature:
+            body.add_file('gpg_signature', signature)
+        body.close()
+
+        while True:
+            conn, reused = self.pool.get(url)
+            try:
+                return self.post(conn, url, auth, body)
+            except (ConnectionError, HTTPException):
+                conn.close()
+                # The server may have dropped an idle connection
+                if not reused:
+                    raise
+            finally:
+                if conn.sock is not None:
+                    self.pool.put(url, conn)
+
+    def post(self, conn, url, auth, body):
+        if getattr(conn, 'absolute_form', False):
+            path = url
+        else:
+            path = urlsplit(url).path or '/'
+        conn.putrequest('POST', path)
+        conn.putheader('Content-Type', body.content_type)
+        conn.putheader('Content-Length', str(len(body)))
+        conn.putheader('Authorization', auth)
+        conn.putheader('User-Agent', 'jarn.mkrelease')
+        conn.endheaders()
+        for chunk in body:
+            conn.send(chunk)
+        response = conn.getresponse()
+        response.read()
+        if response.will_close:
+            conn.close()
+        return response.status, response.reason
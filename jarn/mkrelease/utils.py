@@ -66,6 +66,8 @@ def decode(string, encoding=None, errors=None):
         encoding = getpreferredencoding()
     if errors is None:
         errors = getpreferrederrors()
+    if isinstance(string, (bytearray, memoryview)):
+        return str(string, encoding, errors)
     return string.decode(encoding, errors)
 
 
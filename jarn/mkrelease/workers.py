@@ -0,0 +1,168 @@
+import sys
+import contextvars
+import multiprocessing
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .timing import timings
+
+_buffer = contextvars.ContextVar('buffer', default=None)
+
+
+class ContextStream(object):
+    """A stream writing to the output buffer of the current context.
+
+    Falls through to 'stream' if the context has no output buffer.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def write(self, string):
+        buffer = _buffer.get()
+        if buffer is not None:
+            buffer.append((self.stream, string))
+            return len(string)
+        return self.stream.write(string)
+
+    def flush(self):
+        if _buffer.get() is None:
+            self.stream.flush()
+
+
+class redirect_output(object):
+    """Context manager installing ContextStreams as sys.stdout and sys.stderr."""
+
+    def __enter__(self):
+        self.saved = sys.stdout, sys.stderr
+        sys.stdout = ContextStream(sys.stdout)
+        sys.stderr = ContextStream(sys.stderr)
+
+    def __exit__(self, *ignored):
+        sys.stdout, sys.stderr = self.saved
+
+
+def call_buffered(func, args, values=None):
+    """Call func(*args) and return a two-tuple of exit code and output.
+
+    The output is a list of (stream, string) tuples. A SystemExit raised
+    by 'func' is turned into its exit code.
+    """
+    buffer = []
+    _buffer.set(buffer)
+    return call(func, args, values), buffer
+
+
+def call(func, args, values=None):
+    """Call func(*args) and return an exit code.
+
+    A SystemExit raised by 'func' is turned into its exit code.
+    If 'values' is a list, the return value of 'func' is appended
+    to it, or None if 'func' exited.
+    """
+    try:
+        value = func(*args)
+        if values is not None:
+            values.append(value)
+        return 0
+    except SystemExit as e:
+        if values is not None:
+            values.append(None)
+        return e.code if isinstance(e.code, int) else int(e.code is not None)
+
+
+def replay(output):
+    """Write buffered output to the streams it was meant for.
+    """
+    for stream, string in output:
+        stream.write(string)
+    for stream in set([x[0] for x in output]):
+        stream.flush()
+
+
+def run_parallel(func, argslist, maxworkers):
+    """Call func(*args) for each args in 'argslist' using a thread pool.
+
+    Output written to sys.stdout and sys.stderr is buffered per call
+    and echoed in the order of 'argslist'. Returns the list of exit codes.
+    """
+    results = []
+    with redirect_output():
+        with ThreadPoolExecutor(max_workers=max(maxworkers, 1)) as executor:
+            # Each call gets a copy of the current context, so timing
+            # frames nest under the open phase
+            futures = [executor.submit(contextvars.copy_context().run, call_buffered, func, args)
+                       for args in argslist]
+            for future in futures:
+                rc, output = future.result()
+                replay(output)
+                results.append(rc)
+    return results
+
+
+def run_background(func, args):
+    """Call func(*args) in a background thread and return a Future.
+
+    The call runs in a copy of the current context; exceptions,
+    including SystemExit, are raised by Future.result().
+    """
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        return executor.submit(contextvars.copy_context().run, func, *args)
+    finally:
+        executor.shutdown(wait=False)
+
+
+def can_fork():
+    """Return True if worker processes can be forked.
+    """
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+# Set by run_forked, inherited by worker processes
+_forked = None
+
+
+def _call_forked(index):
+    func, argslist = _forked
+    stderr = sys.stderr
+    values = []
+    with redirect_output():
+        rc, output = call_buffered(func, argslist[index], values)
+    # Streams do not pickle
+    return rc, [(x[0] is stderr, x[1]) for x in output], timings.export(), values[0]
+
+
+def run_forked(func, argslist, maxworkers, values=None):
+    """Call func(*args) for each args in 'argslist' using forked processes.
+
+    Like 'run_parallel' but for functions that are not thread-safe,
+    e.g. because they change the working directory. Worker processes
+    inherit 'func' and its arguments, so neither has to be picklable.
+    Returns the list of exit codes.
+
+    If 'values' is a list, the return values of 'func' are appended
+    to it (see 'call'). They must be picklable.
+    """
+    global _forked
+    results = []
+    sys.stdout.flush()
+    sys.stderr.flush()
+    _forked = func, argslist
+    try:
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=max(maxworkers, 1), mp_context=context) as executor:
+            futures = [executor.submit(_call_forked, i) for i in range(len(argslist))]
+            for future in futures:
+                rc, output, frames, value = future.result()
+                replay([(sys.stderr if x[0] else sys.stdout, x[1]) for x in output])
+                timings.merge(frames)
+                results.append(rc)
+                if values is not None:
+                    values.append(value)
+    finally:
+        _forked = None
+    return results
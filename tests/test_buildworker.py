@@ -0,0 +1,147 @@
+import sys
+import os
+
+from os.path import join, isfile
+
+from jarn.mkrelease.buildworker import BuildWorker
+from jarn.mkrelease.buildworker import BuildWorkerPool
+from jarn.mkrelease.buildworker import BuildWorkerError
+from jarn.mkrelease.setuptools import Setuptools
+from jarn.mkrelease.setuptools import FILTERWARNINGS
+from jarn.mkrelease.setuptools import EGG_INFO_LINES
+from jarn.mkrelease.python import Python
+from jarn.mkrelease.timing import timings, timed
+from jarn.mkrelease.process import Process
+
+from jarn.mkrelease.testing import GitSetup
+from jarn.mkrelease.testing import quiet
+
+
+def get_cmd():
+    return '"%s" %s' % (Python(), FILTERWARNINGS)
+
+
+def get_env():
+    return Setuptools().get_env()
+
+
+class BuildWorkerTests(GitSetup):
+
+    def setUp(self):
+        GitSetup.setUp(self)
+        self.worker = BuildWorker(get_cmd(), get_env())
+        self.addCleanup(self.worker.close)
+
+    def request(self, args, cwd=None):
+        return {'args': args, 'ff': 'git', 'cwd': cwd or self.packagedir}
+
+    def testEggInfo(self):
+        rc, lines = self.worker.run(self.request(['egg_info']), echo=False, echo2=False)
+        self.assertEqual(rc, 0)
+        self.assertTrue('running egg_info' in lines)
+        self.assertTrue(isfile(join(self.packagedir, 'testpackage.egg-info', 'SOURCES.txt')))
+
+    def testKeep(self):
+        rc, lines = self.worker.run(self.request(['egg_info']), echo=False, echo2=False,
+                                    keep=EGG_INFO_LINES)
+        self.assertEqual(set(lines), set(["writing manifest file 'testpackage.egg-info/SOURCES.txt'"]))
+
+    @quiet
+    def testEcho(self):
+        self.worker.run(self.request(['--name']))
+        self.assertEqual(sys.stdout.getvalue(), 'testpackage\n')
+
+    @quiet
+    def testFailure(self):
+        rc, lines = self.worker.run(self.request(['no_such_command']), echo=False)
+        self.assertNotEqual(rc, 0)
+        self.assertTrue('invalid command' in sys.stderr.getvalue())
+
+    @quiet
+    def testWorkerSurvivesFailure(self):
+        self.worker.run(self.request(['no_such_command']), echo=False, echo2=False)
+        rc, lines = self.worker.run(self.request(['--version']), echo=False)
+        self.assertEqual((rc, lines), (0, ['2.6']))
+
+    def testCommandsAreIsolated(self):
+        self.clone()
+        self.worker.run(self.request(['egg_info']), echo=False, echo2=False)
+        rc, lines = self.worker.run(self.request(['egg_info'], self.clonedir), echo=False, echo2=False)
+        self.assertEqual(rc, 0)
+        self.assertTrue(isfile(join(self.clonedir, 'testpackage.egg-info', 'SOURCES.txt')))
+        self.assertEqual(os.getcwd(), self.tempdir)
+
+    def testCpu(self):
+        timings.enabled = True
+        self.addCleanup(timings.export)
+        self.addCleanup(setattr, timings, 'enabled', False)
+        with timed('egg_info', 'command'):
+            self.worker.run(self.request(['egg_info']), echo=False, echo2=False)
+        frames = timings.export()
+        self.assertTrue(frames[0]['cpu'] > 0)
+        self.assertAlmostEqual(frames[0]['cpu'], self.worker.cpu)
+
+    def testWorkerDied(self):
+        self.worker.process.kill()
+        self.worker.process.wait()
+        self.assertRaises(BuildWorkerError, self.worker.run, self.request(['--name']))
+
+
+class BuildWorkerPoolTests(GitSetup):
+
+    def testReuseWorker(self):
+        pool = BuildWorkerPool(get_cmd(), get_env())
+        self.addCleanup(pool.close)
+        pool.start()
+        request = {'args': ['--name'], 'cwd': self.packagedir}
+        self.assertEqual(pool.run(request, echo=False), (0, ['testpackage']))
+        self.assertEqual(pool.run(request, echo=False), (0, ['testpackage']))
+        self.assertEqual(len(pool.workers), 1)
+
+    def testDiscardDeadWorker(self):
+        pool = BuildWorkerPool(get_cmd(), get_env())
+        self.addCleanup(pool.close)
+        pool.start()
+        pool.workers[0].process.kill()
+        request = {'args': ['--name'], 'cwd': self.packagedir}
+        self.assertRaises(BuildWorkerError, pool.run, request, echo=False)
+        self.assertEqual(pool.workers, [])
+        self.assertEqual(pool.run(request, echo=False), (0, ['testpackage']))
+
+
+class SetuptoolsWorkerTests(GitSetup):
+
+    def setUp(self):
+        GitSetup.setUp(self)
+        self.st = Setuptools(Process(quiet=True, env=get_env()))
+        self.st.start_build_workers()
+        self.addCleanup(self.st.stop_build_workers)
+
+    def testPackageInfo(self):
+        self.mkfile(join(self.packagedir, 'setup.py'), """\
+from setuptools import setup
+version = '2.6'
+setup(name='testpackage', version=version)
+""")
+        self.assertEqual(self.st.get_package_info(self.packagedir), ('testpackage', '2.6'))
+
+    def testInfoFlags(self):
+        self.mkfile(join(self.packagedir, 'setup.cfg'), """\
+[egg_info]
+tag_build = dev0
+""")
+        archive = self.st.run_dist(self.packagedir, self.st.infoflags, 'sdist', ['--formats="zip"'], ff='git')
+        self.assertTrue(archive.endswith('testpackage-2.6.zip'))
+
+    def testParallelDists(self):
+        distfiles = self.st.run_dists(self.packagedir, [],
+            [('sdist', ['--formats="gztar"']), ('bdist_wheel', [])], ff='git', parallel=True)
+        self.assertEqual(len(distfiles), 2)
+        self.assertEqual(len(self.st.buildworkers.workers), 2)
+
+    @quiet
+    def testFallback(self):
+        self.st.buildworkers.workers[0].process.kill()
+        archive = self.st.run_dist(self.packagedir, [], 'sdist', ['--formats="zip"'], ff='git')
+        self.assertTrue(isfile(archive))
+        self.assertTrue('running setup.py instead' in sys.stderr.getvalue())
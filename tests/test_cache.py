@@ -0,0 +1,206 @@
+import os
+import stat
+import unittest
+
+from os.path import join, isfile, isdir
+
+from jarn.mkrelease.cache import VersionCache
+from jarn.mkrelease.cache import MirrorCache
+from jarn.mkrelease.cache import FileLock
+from jarn.mkrelease.cache import BuildCache
+from jarn.mkrelease.cache import is_distfile_of
+from jarn.mkrelease.cache import get_cache_dir
+from jarn.mkrelease.cache import read_json, write_json
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import setenv
+
+
+class GetCacheDirTests(unittest.TestCase):
+
+    def testDirect(self):
+        self.assertEqual(get_cache_dir('/tmp/cache'), '/tmp/cache')
+
+    def testXdgCacheHome(self):
+        with setenv('XDG_CACHE_HOME', '/tmp/xdg'):
+            self.assertEqual(get_cache_dir(), '/tmp/xdg/mkrelease')
+
+
+class JsonTests(JailSetup):
+
+    def testRoundTrip(self):
+        write_json(join(self.tempdir, 'sub', 'data.json'), {'a': 1})
+        self.assertEqual(read_json(join(self.tempdir, 'sub', 'data.json')), {'a': 1})
+
+    def testMissing(self):
+        self.assertEqual(read_json(join(self.tempdir, 'data.json'), {}), {})
+
+    def testBroken(self):
+        self.mkfile('data.json', '{')
+        self.assertEqual(read_json(join(self.tempdir, 'data.json'), {}), {})
+
+
+class VersionCacheTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.calls = 0
+        self.mkfile('my.exe', '#!/bin/sh\n')
+        os.chmod('my.exe', stat.S_IRWXU)
+
+    def get_version(self):
+        self.calls += 1
+        return '2.39.5'
+
+    def testCacheMiss(self):
+        with setenv('PATH', self.tempdir):
+            versions = VersionCache(join(self.tempdir, 'cache'))
+            self.assertEqual(versions.get('my.exe', self.get_version), '2.39.5')
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(isfile(join(self.tempdir, 'cache', 'versions.json')))
+
+    def testCacheHit(self):
+        with setenv('PATH', self.tempdir):
+            VersionCache(join(self.tempdir, 'cache')).get('my.exe', self.get_version)
+            versions = VersionCache(join(self.tempdir, 'cache'))
+            self.assertEqual(versions.get('my.exe', self.get_version), '2.39.5')
+        self.assertEqual(self.calls, 1)
+
+    def testMtimeChanged(self):
+        with setenv('PATH', self.tempdir):
+            VersionCache(join(self.tempdir, 'cache')).get('my.exe', self.get_version)
+            os.utime('my.exe', (0, 0))
+            versions = VersionCache(join(self.tempdir, 'cache'))
+            self.assertEqual(versions.get('my.exe', self.get_version), '2.39.5')
+        self.assertEqual(self.calls, 2)
+
+    def testNotOnPath(self):
+        with setenv('PATH', join(self.tempdir, 'cache')):
+            versions = VersionCache(join(self.tempdir, 'cache'))
+            self.assertEqual(versions.get('my.exe', self.get_version), '2.39.5')
+        self.assertEqual(self.calls, 1)
+        self.assertFalse(isfile(join(self.tempdir, 'cache', 'versions.json')))
+
+
+class FileLockTests(JailSetup):
+
+    def testLock(self):
+        lock = FileLock(join(self.tempdir, 'foo.lock'))
+        self.assertEqual(lock.acquire(), True)
+        other = FileLock(join(self.tempdir, 'foo.lock'))
+        self.assertEqual(other.acquire(wait=False), False)
+        lock.release()
+        self.assertEqual(other.acquire(wait=False), True)
+        other.release()
+
+    def testSharedLock(self):
+        lock = FileLock(join(self.tempdir, 'foo.lock'), shared=True)
+        other = FileLock(join(self.tempdir, 'foo.lock'), shared=True)
+        exclusive = FileLock(join(self.tempdir, 'foo.lock'))
+        self.assertEqual(lock.acquire(wait=False), True)
+        self.assertEqual(other.acquire(wait=False), True)
+        self.assertEqual(exclusive.acquire(wait=False), False)
+        lock.release()
+        other.release()
+        self.assertEqual(exclusive.acquire(wait=False), True)
+        exclusive.release()
+
+
+class MirrorCacheTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mirrors = MirrorCache(join(self.tempdir, 'cache'), 2)
+
+    def make_mirror(self, url, mtime):
+        mirror = self.mirrors.get_mirror('git', url)
+        os.makedirs(mirror)
+        self.mirrors.lock(mirror)
+        os.utime(mirror + '.lock', (mtime, mtime))
+        return mirror
+
+    def testGetMirror(self):
+        mirror = self.mirrors.get_mirror('git', 'git@github.com:Jarn/jarn.mkrelease.git')
+        self.assertTrue(mirror.startswith(join(self.tempdir, 'cache', 'mirrors', 'jarn.mkrelease-')))
+
+    def testGetMirrorDiffers(self):
+        self.assertNotEqual(self.mirrors.get_mirror('git', 'file:///foo'),
+                            self.mirrors.get_mirror('hg', 'file:///foo'))
+
+    def testEvict(self):
+        first = self.make_mirror('file:///first', 1000)
+        second = self.make_mirror('file:///second', 3000)
+        third = self.make_mirror('file:///third', 2000)
+        self.mirrors.evict()
+        self.assertEqual(isdir(first), False)
+        self.assertEqual(isdir(second), True)
+        self.assertEqual(isdir(third), True)
+
+    def testEvictSkipsLocked(self):
+        first = self.make_mirror('file:///first', 1000)
+        self.make_mirror('file:///second', 3000)
+        self.make_mirror('file:///third', 2000)
+        with FileLock(first + '.lock'):
+            self.mirrors.evict()
+        self.assertEqual(isdir(first), True)
+
+    def testEvictSkipsInUse(self):
+        first = self.make_mirror('file:///first', 1000)
+        self.make_mirror('file:///second', 3000)
+        self.make_mirror('file:///third', 2000)
+        with self.mirrors.use(first):
+            self.mirrors.evict()
+        self.assertEqual(isdir(first), True)
+        self.mirrors.evict()
+        self.assertEqual(isdir(first), False)
+
+
+class BuildCacheTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.builds = BuildCache(join(self.tempdir, 'cache'), 2)
+        os.mkdir('dist')
+        self.mkfile(join('dist', 'foo-1.0.tar.gz'), 'sdist')
+        self.mkfile(join('dist', 'foo-1.0-py3-none-any.whl'), 'wheel')
+        self.distfiles = [join(self.tempdir, 'dist', 'foo-1.0.tar.gz'),
+                          join(self.tempdir, 'dist', 'foo-1.0-py3-none-any.whl')]
+
+    def testGetKey(self):
+        self.assertEqual(BuildCache.get_key('a', ['b']), BuildCache.get_key('a', ['b']))
+        self.assertNotEqual(BuildCache.get_key('a', ['b']), BuildCache.get_key('a', ['c']))
+
+    def testMiss(self):
+        self.assertEqual(self.builds.get('abc', join(self.tempdir, 'out')), None)
+
+    def testHit(self):
+        self.builds.put('abc', self.distfiles)
+        distfiles = self.builds.get('abc', join(self.tempdir, 'out'))
+        self.assertEqual(distfiles, [join(self.tempdir, 'out', 'foo-1.0.tar.gz'),
+                                     join(self.tempdir, 'out', 'foo-1.0-py3-none-any.whl')])
+        with open(distfiles[1]) as file:
+            self.assertEqual(file.read(), 'wheel')
+
+    def testRelease(self):
+        self.builds.put('abc', self.distfiles)
+        self.assertEqual(len(self.builds.get('abc', join(self.tempdir, 'out'), 'foo', '1.0')), 2)
+        self.assertEqual(self.builds.get('abc', join(self.tempdir, 'out'), 'foo', '1.0.1'), None)
+        self.assertEqual(self.builds.get('abc', join(self.tempdir, 'out'), 'bar', '1.0'), None)
+
+    def testIsDistfileOf(self):
+        self.assertTrue(is_distfile_of('foo.bar-1.0.tar.gz', 'foo.bar', '1.0'))
+        self.assertTrue(is_distfile_of('foo_bar-1.0-py3-none-any.whl', 'Foo-Bar', '1.0'))
+        self.assertFalse(is_distfile_of('foo-1.01.tar.gz', 'foo', '1.0'))
+        self.assertFalse(is_distfile_of('foo-1.0.tar.gz', 'foo', '1.0.1'))
+
+    def testCorrupt(self):
+        self.builds.put('abc', self.distfiles)
+        self.mkfile(join(self.tempdir, 'cache', 'builds', 'abc', 'foo-1.0.tar.gz'), 'garbage')
+        self.assertEqual(self.builds.get('abc', join(self.tempdir, 'out')), None)
+
+    def testEvict(self):
+        for key, mtime in (('a', 1000), ('b', 3000), ('c', 2000)):
+            self.builds.put(key, self.distfiles)
+            os.utime(join(self.tempdir, 'cache', 'builds', key), (mtime, mtime))
+        self.builds.evict()
+        self.assertEqual(sorted(os.listdir(join(self.tempdir, 'cache', 'builds'))), ['b', 'c'])
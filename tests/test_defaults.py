@@ -30,6 +30,17 @@ class DefaultsTests(JailSetup):
         #self.assertEqual(defaults.servers, {})
         self.assertEqual(defaults.twine, '')
         self.assertEqual(defaults.interactive, True)
+        self.assertEqual(defaults.workers, 4)
+        self.assertEqual(defaults.multiplex, False)
+        self.assertEqual(defaults.cachedir, '')
+        self.assertEqual(defaults.clonecache, False)
+        self.assertEqual(defaults.clonecachesize, 20)
+        self.assertEqual(defaults.buildcache, False)
+        self.assertEqual(defaults.buildcachesize, 20)
+        self.assertEqual(defaults.skipexisting, None)
+        self.assertEqual(defaults.directupload, False)
+        self.assertEqual(defaults.buildworker, False)
+        self.assertEqual(defaults.parallelbuilds, False)
 
     @quiet
     def test_empty_defaults(self):
@@ -50,6 +61,15 @@ identity =
 formats =
 twine =
 interactive =
+workers =
+ssh-multiplex =
+cache-dir =
+clone-cache =
+clone-cache-size =
+build-cache =
+build-cache-size =
+skip-existing =
+direct-upload =
 [aliases]
 """)
         defaults = Defaults('my.cfg')
@@ -70,6 +90,17 @@ interactive =
         #self.assertEqual(defaults.servers, {})
         self.assertEqual(defaults.twine, '')
         self.assertEqual(defaults.interactive, True)
+        self.assertEqual(defaults.workers, 4)
+        self.assertEqual(defaults.multiplex, False)
+        self.assertEqual(defaults.cachedir, '')
+        self.assertEqual(defaults.clonecache, False)
+        self.assertEqual(defaults.clonecachesize, 20)
+        self.assertEqual(defaults.buildcache, False)
+        self.assertEqual(defaults.buildcachesize, 20)
+        self.assertEqual(defaults.skipexisting, None)
+        self.assertEqual(defaults.directupload, False)
+        self.assertEqual(defaults.buildworker, False)
+        self.assertEqual(defaults.parallelbuilds, False)
 
     def test_read_defaults(self):
         self.mkfile('my.cfg', """
@@ -89,6 +120,17 @@ identity = fred@bedrock.com
 formats = zip wheel
 twine = /usr/local/bin/twine
 interactive = FALSE
+workers = 2
+ssh-multiplex = yes
+cache-dir = ~/.mkrelease-cache
+clone-cache = yes
+clone-cache-size = 5
+build-cache = yes
+build-cache-size = 3
+skip-existing = no
+direct-upload = yes
+build-worker = yes
+parallel-builds = yes
 [aliases]
 public = bedrock.com:eggs
 """)
@@ -110,6 +152,17 @@ public = bedrock.com:eggs
         #self.assertEqual(defaults.servers, {})
         self.assertEqual(defaults.twine, '/usr/local/bin/twine')
         self.assertEqual(defaults.interactive, False)
+        self.assertEqual(defaults.workers, 2)
+        self.assertEqual(defaults.multiplex, True)
+        self.assertEqual(defaults.cachedir, '~/.mkrelease-cache')
+        self.assertEqual(defaults.clonecache, True)
+        self.assertEqual(defaults.clonecachesize, 5)
+        self.assertEqual(defaults.buildcache, True)
+        self.assertEqual(defaults.buildcachesize, 3)
+        self.assertEqual(defaults.skipexisting, False)
+        self.assertEqual(defaults.directupload, True)
+        self.assertEqual(defaults.buildworker, True)
+        self.assertEqual(defaults.parallelbuilds, True)
 
     def test_dist_location_replaces_distdefault(self):
         self.mkfile('my.cfg', """
@@ -135,3 +188,20 @@ dist-location = jarn.com:eggs
         defaults = Defaults('my.cfg')
         self.assertTrue('pypi' in defaults.servers)
 
+
+    def test_server_index_url(self):
+        self.mkfile('my.cfg', """
+[distutils]
+index-servers = devpi
+[devpi]
+repository = https://devpi.example.com/fred/dev/
+username = fred
+password = secret
+index-url = https://devpi.example.com/fred/dev/+simple/
+""")
+        defaults = Defaults('my.cfg')
+        server = defaults.servers['devpi']
+        self.assertEqual(server.repository, 'https://devpi.example.com/fred/dev/')
+        self.assertEqual(server.username, 'fred')
+        self.assertEqual(server.password, 'secret')
+        self.assertEqual(server.indexurl, 'https://devpi.example.com/fred/dev/+simple/')
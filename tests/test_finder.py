@@ -0,0 +1,112 @@
+import os
+
+from os.path import join, isdir
+
+from jarn.mkrelease import finder
+from jarn.mkrelease.finder import FileFinder
+from jarn.mkrelease.finder import get_state
+from jarn.mkrelease.finder import list_files
+from jarn.mkrelease.process import Process
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import GitSetup
+
+
+class GitFinderTests(GitSetup):
+
+    def testFindFiles(self):
+        files = FileFinder('git').find_files(self.packagedir)
+        self.assertTrue(join('testpackage', 'git_only.py') in files)
+        self.assertTrue(join('testpackage', 'git_only.txt') in files)
+
+    def testRelativeToCwd(self):
+        self.dirstack.push(self.packagedir)
+        files = FileFinder('git').find_files()
+        self.assertTrue(join('testpackage', 'git_only.py') in files)
+        self.assertTrue('setup.py' in files)
+
+    def testSkipsMetaFiles(self):
+        files = FileFinder('git').find_files(self.packagedir)
+        self.assertFalse([x for x in files if os.path.basename(x).startswith('.git')])
+
+    def testSpecialCharacters(self):
+        self.mkfile(join(self.packagedir, 'a b\n\xe4.txt'))
+        Process(quiet=True).popen('git add .', cwd=self.packagedir)
+        files = FileFinder('git').find_files(self.packagedir)
+        self.assertTrue('a b\n\xe4.txt' in files)
+
+    def testNotASandbox(self):
+        self.destroy()
+        self.assertEqual(FileFinder('git').find_files(self.packagedir), None)
+
+
+class CacheTests(GitSetup):
+
+    def setUp(self):
+        GitSetup.setUp(self)
+        self.cachedir = join(self.tempdir, 'cache')
+
+    def testCacheWritten(self):
+        FileFinder('git', self.cachedir).find_files(self.packagedir)
+        self.assertEqual(len(os.listdir(join(self.cachedir, 'files'))), 1)
+
+    def testNoCacheDir(self):
+        FileFinder('git').find_files(self.packagedir)
+        self.assertFalse(isdir(self.cachedir))
+
+    def testCacheHit(self):
+        expected = FileFinder('git', self.cachedir).find_files(self.packagedir)
+        saved = finder.list_files
+        finder.list_files = lambda ff, dir='': self.fail('SCM called')
+        try:
+            files = FileFinder('git', self.cachedir).find_files(self.packagedir)
+        finally:
+            finder.list_files = saved
+        self.assertEqual(files, expected)
+
+    def testEvict(self):
+        filedir = join(self.cachedir, 'files')
+        os.makedirs(filedir)
+        for name in ('a', 'b', 'c'):
+            self.mkfile(join(filedir, name))
+        os.utime(join(filedir, 'a'), (1, 1))
+        FileFinder('git', self.cachedir, maxsize=3).find_files(self.packagedir)
+        names = os.listdir(filedir)
+        self.assertEqual(len(names), 3)
+        self.assertFalse('a' in names)
+
+    def testStateChange(self):
+        FileFinder('git', self.cachedir).find_files(self.packagedir)
+        Process(quiet=True).popen('git rm -q testpackage/git_only.txt', cwd=self.packagedir)
+        files = FileFinder('git', self.cachedir).find_files(self.packagedir)
+        self.assertFalse(join('testpackage', 'git_only.txt') in files)
+        self.assertTrue(join('testpackage', 'git_only.py') in files)
+
+
+class StateTests(GitSetup):
+
+    def testState(self):
+        state = get_state('git', self.packagedir)
+        self.assertTrue(state.startswith(join(self.packagedir, '.git') + ' '))
+
+    def testSubdirectory(self):
+        state = get_state('git', join(self.packagedir, 'testpackage'))
+        self.assertEqual(state, get_state('git', self.packagedir))
+
+    def testGitFile(self):
+        os.rename(join(self.packagedir, '.git'), join(self.tempdir, 'gitdir'))
+        self.mkfile(join(self.packagedir, '.git'), 'gitdir: ../gitdir\n')
+        state = get_state('git', self.packagedir)
+        self.assertTrue(state.startswith(join(self.packagedir, '..', 'gitdir') + ' '))
+
+
+class NoSandboxTests(JailSetup):
+
+    def testNoState(self):
+        self.assertEqual(get_state('hg', self.tempdir), '')
+
+    def testNoSubversion(self):
+        self.assertFalse('svn' in finder.LISTINGS)
+
+    def testListingFails(self):
+        self.assertEqual(list_files('git', self.tempdir), None)
@@ -1,5 +1,7 @@
 import unittest
 
+from os.path import join
+
 from jarn.mkrelease.mkrelease import ReleaseMaker
 
 from jarn.mkrelease.testing import JailSetup
@@ -450,3 +452,73 @@ dist-location = jarn.com:eggs
 
         self.assertEqual(rm.locations.locations, ['jarn.com:eggs'])
 
+
+
+class BatchOptionsTests(JailSetup):
+
+    def test_batch(self):
+        self.mkfile('my.cfg', """\
+[mkrelease]
+workers = 3
+""")
+        rm = ReleaseMaker(['-c', 'my.cfg', '-n', '-B', 'foo', 'bar'])
+        rm.get_options()
+        self.assertEqual(rm.batch, True)
+        self.assertEqual(rm.packages, [('foo', ''), ('bar', '')])
+        self.assertEqual(rm.workers, 3)
+
+    def test_jobs(self):
+        self.mkfile('my.cfg', """\
+[mkrelease]
+""")
+        rm = ReleaseMaker(['-c', 'my.cfg', '-n', '-j', '8'])
+        rm.get_options()
+        self.assertEqual(rm.batch, False)
+        self.assertEqual(rm.workers, 8)
+
+    @quiet
+    def test_bad_jobs(self):
+        self.mkfile('my.cfg', """\
+[mkrelease]
+""")
+        rm = ReleaseMaker(['-c', 'my.cfg', '-n', '-j', 'x'])
+        self.assertRaises(SystemExit, rm.get_options)
+
+    def test_batch_file(self):
+        self.mkfile('my.cfg', """\
+[mkrelease]
+""")
+        self.mkfile('packages.txt', """\
+foo
+git@github.com:Jarn/jarn.mkrelease.git 2.x
+
+https://github.com/Jarn/jarn.viewdoc  # Comment
+""")
+        rm = ReleaseMaker(['-c', 'my.cfg', '-n', '-F', 'packages.txt', 'bar'])
+        rm.get_options()
+        self.assertEqual(rm.batch, True)
+        self.assertEqual(rm.packages, [
+            (join(self.tempdir, 'foo'), ''),
+            ('git@github.com:Jarn/jarn.mkrelease.git', '2.x'),
+            ('https://github.com/Jarn/jarn.viewdoc', ''),
+            ('bar', ''),
+        ])
+
+    @quiet
+    def test_bad_batch_file(self):
+        self.mkfile('my.cfg', """\
+[mkrelease]
+""")
+        self.mkfile('packages.txt', """\
+foo 2.x
+""")
+        rm = ReleaseMaker(['-c', 'my.cfg', '-n', '-F', 'packages.txt'])
+        self.assertRaises(SystemExit, rm.get_options)
+
+    @quiet
+    def test_missing_batch_file(self):
+        self.mkfile('my.cfg', """\
+[mkrelease]
+""")
+        rm = ReleaseMaker(['-c', 'my.cfg', '-n', '-F', 'packages.txt'])
+        self.assertRaises(SystemExit, rm.get_options)
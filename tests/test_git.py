@@ -1,7 +1,8 @@
 import unittest
 import os
+import sys
 
-from os.path import join, isdir
+from os.path import join, isdir, isfile
 
 from jarn.mkrelease.scm import Git
 
@@ -237,21 +238,73 @@ class UrlFromSandboxTests(GitSetup):
 
     @quiet
     def testWhitebox(self):
-        self.called = 0
-
         def func(cmd):
-            if cmd == 'git branch':
-                return 0, ['* master']
-            if cmd == 'git config -l':
-                self.called += 1
-                if self.called == 1:
-                    return 0, ['branch.master.remote=origin']
+            if cmd == 'git --version':
+                return 0, ['git version 2.39.5']
+            if cmd.startswith('git status --porcelain=v2'):
+                return 0, ['# branch.oid 1234', '# branch.head master']
             return 1, []
 
         scm = Git(MockProcess(func=func))
         self.assertRaises(SystemExit, scm.get_url_from_sandbox, self.packagedir)
 
 
+class StateTests(GitSetup):
+
+    def setUp(self):
+        GitSetup.setUp(self)
+        self.cmds = []
+
+    def func(self, cmd):
+        self.cmds.append(cmd)
+        if cmd == 'git --version':
+            return 0, ['git version 2.39.5']
+        if cmd.startswith('git status --porcelain=v2'):
+            return 0, ['# branch.oid 1234',
+                       '# branch.head master',
+                       '# branch.upstream origin/master',
+                       '1 .M N... 100644 100644 100644 1234 1234 setup.py']
+        if cmd == 'git config -l':
+            return 0, ['branch.master.remote=origin',
+                       'branch.master.merge=refs/heads/master',
+                       'remote.origin.url=git@github.com:Jarn/jarn.mkrelease']
+        if cmd == 'git tag':
+            return 0, ['2.5', '2.6']
+        if cmd.startswith(('git commit', 'git tag', 'git push')):
+            return 0, []
+
+    def testSnapshot(self):
+        scm = Git(MockProcess(func=self.func))
+        self.assertEqual(scm.get_branch_from_sandbox(self.packagedir), 'master')
+        self.assertEqual(scm.get_remote_from_sandbox(self.packagedir), 'origin')
+        self.assertEqual(scm.get_tracked_branch_from_sandbox(self.packagedir), 'master')
+        self.assertEqual(scm.get_url_from_sandbox(self.packagedir), 'git@github.com:Jarn/jarn.mkrelease')
+        self.assertEqual(scm.is_dirty_sandbox(self.packagedir), True)
+        self.assertEqual(scm.tag_exists(self.packagedir, '2.6'), True)
+        self.assertEqual(scm.tag_exists(self.packagedir, '2.7'), False)
+        self.assertEqual(self.cmds, [
+            'git --version',
+            'git status --porcelain=v2 --branch --untracked-files=no .',
+            'git config -l',
+            'git tag'])
+
+    @quiet
+    def testInvalidate(self):
+        scm = Git(MockProcess(func=self.func))
+        scm.create_tag(self.packagedir, '2.7', 'testpackage', '2.7', True)
+        self.assertEqual(self.cmds, [
+            'git tag -m"Tagged testpackage 2.7." "2.7"',
+            'git --version',
+            'git status --porcelain=v2 --branch --untracked-files=no .',
+            'git config -l',
+            'git push "origin" tag "2.7"'])
+
+    def testDetachedHead(self):
+        scm = Git()
+        self.tag(self.packagedir, '2.6')
+        self.assertTrue(scm.get_branch_from_sandbox(self.packagedir).startswith('('))
+
+
 class RemoteSandboxTests(GitSetup):
 
     def testIsLocal(self):
@@ -423,12 +476,124 @@ class CloneUrlTests(GitSetup):
         self.destroy()
         self.assertRaises(SystemExit, scm.clone_url, self.packagedir, 'testclone')
 
+    def testCloneUrlBranch(self):
+        scm = Git(Process(quiet=True))
+        self.branch(self.packagedir, '2.x')
+        self.assertEqual(scm.clone_url(self.packagedir, 'testclone', '2.x'), 0)
+        self.assertEqual(scm.get_branch_from_sandbox('testclone'), '2.x')
+
+    def testCloneUrlShallow(self):
+        scm = Git(Process(quiet=True))
+        url = 'file://' + self.packagedir
+        self.assertEqual(scm.clone_url(url, 'testclone', 'master', shallow=True), 0)
+        self.assertEqual(isfile(join('testclone', '.git', 'shallow')), True)
+        self.assertEqual(scm.get_branch_from_sandbox('testclone'), 'master')
+
+    def testCloneUrlPartial(self):
+        scm = Git(Process(quiet=True))
+        url = 'file://' + self.packagedir
+        self.assertEqual(scm.clone_url(url, 'testclone', 'master'), 0)
+        self.assertEqual(isfile(join('testclone', '.git', 'shallow')), False)
+
+    @quiet
+    def testCloneUrlRevision(self):
+        scm = Git(Process(quiet=True))
+        url = 'file://' + self.packagedir
+        self.assertEqual(scm.clone_url(url, 'testclone', 'f734acf', shallow=True), 0)
+        self.assertEqual(isfile(join('testclone', '.git', 'shallow')), False)
+        self.assertEqual(scm.switch_branch('testclone', 'f734acf'), 0)
+
+    def testCloneFlags(self):
+        scm = Git()
+        self.assertEqual(scm._get_clone_flags(self.packagedir, True), '')
+        self.assertEqual(scm._get_clone_flags('https://github.com/Jarn/jarn.mkrelease', True), '--depth 1 ')
+
     @quiet
     def testBadProcess(self):
         scm = Git(MockProcess(rc=1))
         self.assertRaises(SystemExit, scm.clone_url, self.packagedir, 'testclone')
 
 
+class MirrorTests(GitSetup):
+
+    def testUpdateMirror(self):
+        scm = Git(Process(quiet=True))
+        self.assertEqual(scm.update_mirror(self.packagedir, 'testmirror'), 0)
+        self.assertEqual(isfile(join('testmirror', 'HEAD')), True)
+        # Second call fetches
+        self.assertEqual(scm.update_mirror(self.packagedir, 'testmirror'), 0)
+
+    def testCloneMirror(self):
+        scm = Git(Process(quiet=True))
+        scm.update_mirror(self.packagedir, 'testmirror')
+        self.assertEqual(scm.clone_mirror('testmirror', self.packagedir, 'testclone'), 0)
+        self.assertEqual(isdir('testclone'), True)
+        self.assertEqual(scm.get_url_from_sandbox('testclone'), self.packagedir)
+        self.assertEqual(scm.get_branch_from_sandbox('testclone'), 'master')
+        self.assertEqual(scm.get_tracked_branch_from_sandbox('testclone'), 'master')
+
+    @quiet
+    def testBadServer(self):
+        scm = Git(Process(quiet=True))
+        self.destroy()
+        self.assertRaises(SystemExit, scm.update_mirror, self.packagedir, 'testmirror')
+
+    @quiet
+    def testFetchFailsKeepsMirror(self):
+        scm = Git(Process(quiet=True))
+        scm.update_mirror(self.packagedir, 'testmirror')
+        self.destroy()
+        self.assertRaises(SystemExit, scm.update_mirror, self.packagedir, 'testmirror')
+        self.assertEqual(isfile(join('testmirror', 'HEAD')), True)
+
+    @quiet
+    def testBrokenMirror(self):
+        scm = Git(Process(quiet=True))
+        os.mkdir('testmirror')
+        self.mkfile(join('testmirror', 'HEAD'), 'garbage')
+        self.assertEqual(scm.update_mirror(self.packagedir, 'testmirror'), 0)
+        self.assertEqual(scm.clone_mirror('testmirror', self.packagedir, 'testclone'), 0)
+
+
+class SourceIdTests(GitSetup):
+
+    def testGetSourceId(self):
+        scm = Git(Process(quiet=True))
+        sourceid = scm.get_source_id(self.packagedir)
+        self.assertEqual([len(x) for x in sourceid.split(':')], [40, 40])
+        self.assertEqual(scm.get_source_id(self.packagedir), sourceid)
+
+    def testNewCommit(self):
+        scm = Git(Process(quiet=True))
+        sourceid = scm.get_source_id(self.packagedir)
+        Process(quiet=True).popen('git commit --allow-empty -m"Empty"', cwd=self.packagedir)
+        self.assertNotEqual(scm.get_source_id(self.packagedir), sourceid)
+
+    def testDirtySandbox(self):
+        scm = Git(Process(quiet=True))
+        self.modify(self.packagedir)
+        self.assertEqual(scm.get_source_id(self.packagedir), '')
+
+    def testUntrackedFile(self):
+        scm = Git(Process(quiet=True))
+        self.mkfile(join(self.packagedir, 'untracked.txt'))
+        self.assertEqual(scm.get_source_id(self.packagedir), '')
+
+    def testBuildOutput(self):
+        scm = Git(Process(quiet=True))
+        sourceid = scm.get_source_id(self.packagedir)
+        os.mkdir(join(self.packagedir, 'dist'))
+        self.mkfile(join(self.packagedir, 'dist', 'testpackage-2.6.tar.gz'))
+        os.mkdir(join(self.packagedir, 'testpackage.egg-info'))
+        self.mkfile(join(self.packagedir, 'testpackage.egg-info', 'PKG-INFO'))
+        self.assertEqual(scm.get_source_id(self.packagedir), sourceid)
+
+    def testSubdirectory(self):
+        scm = Git(Process(quiet=True))
+        self.assertNotEqual(scm.get_source_id(join(self.packagedir, 'testpackage')),
+                            scm.get_source_id(self.packagedir))
+
+
 class BranchIdTests(GitSetup):
 
     def testMakeBranchId(self):
@@ -559,6 +724,67 @@ class CreateTagTests(GitSetup):
         self.assertRaises(SystemExit, scm.create_tag, self.packagedir, '2.6', 'testpackage', '2.6', False)
 
 
+class PushTagTests(GitSetup):
+
+    def testPushTag(self):
+        scm = Git(Process(quiet=True))
+        self.clone()
+        scm.create_tag(self.clonedir, '2.6', 'testpackage', '2.6', False)
+        self.assertEqual(scm.get_tag_remote(self.clonedir), 'origin')
+        self.assertEqual(scm.push_tag(self.clonedir, '2.6', 'origin'), 0)
+        self.assertEqual(scm.tag_exists(self.packagedir, '2.6'), True)
+
+    def testPushTagKeepsCwd(self):
+        scm = Git(MockProcess())
+        scm.push_tag(self.clonedir, '2.6', 'origin')
+        self.assertEqual(os.getcwd(), self.tempdir)
+
+    @quiet
+    def testPushOutput(self):
+        scm = Git(Process())
+        self.clone()
+        scm.create_tag(self.clonedir, '2.6', 'testpackage', '2.6', False)
+        output = []
+        scm.push_tag(self.clonedir, '2.6', 'origin', output)
+        self.assertNotEqual(output, [])
+        self.assertEqual(sys.stdout.getvalue(), '')
+
+    @quiet
+    def testLocalSandbox(self):
+        scm = Git(Process(quiet=True))
+        self.assertEqual(scm.get_tag_remote(self.packagedir), '')
+
+    @quiet
+    def testBadPush(self):
+        scm = Git(Process(quiet=True))
+        self.clone()
+        scm.create_tag(self.clonedir, '2.6', 'testpackage', '2.6', False)
+        self.destroy()
+        self.assertNotEqual(scm.push_tag(self.clonedir, '2.6', 'origin'), 0)
+
+
+class RemoveTagTests(GitSetup):
+
+    def testRemoveLocalTag(self):
+        scm = Git(Process(quiet=True))
+        scm.create_tag(self.packagedir, '2.6', 'testpackage', '2.6', False)
+        self.assertEqual(scm.remove_tag(self.packagedir, '2.6'), 0)
+        self.assertEqual(scm.tag_exists(self.packagedir, '2.6'), False)
+
+    def testRemovePushedTag(self):
+        scm = Git(Process(quiet=True))
+        self.clone()
+        scm.create_tag(self.clonedir, '2.6', 'testpackage', '2.6', True)
+        self.assertEqual(scm.remove_tag(self.clonedir, '2.6', 'origin'), 0)
+        self.assertEqual(scm.tag_exists(self.clonedir, '2.6'), False)
+        self.assertEqual(scm.tag_exists(self.packagedir, '2.6'), False)
+
+    @quiet
+    def testRemoveMissingTag(self):
+        scm = Git(Process(quiet=True))
+        self.assertNotEqual(scm.remove_tag(self.packagedir, '2.6'), 0)
+
+
 class GetVersionTests(unittest.TestCase):
 
     def testGetVersion(self):
@@ -0,0 +1,55 @@
+from os.path import join, exists
+
+from jarn.mkrelease.gpg import GPG
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import MockProcess
+from jarn.mkrelease.testing import quiet
+
+
+class SignDistfilesTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('a-1.0.tar.gz', 'sdist')
+        self.mkfile('a-1.0-py3-none-any.whl', 'wheel')
+        self.distfiles = [join(self.tempdir, 'a-1.0.tar.gz'),
+                          join(self.tempdir, 'a-1.0-py3-none-any.whl')]
+        self.cmds = []
+        self.batches = []
+
+    def func(self, cmd):
+        self.cmds.append(cmd)
+        return 0, []
+
+    def testSignCmd(self):
+        gpg = GPG()
+        self.assertEqual(gpg.get_sign_cmd('/tmp/a.whl'),
+            '"gpg" --detach-sign -a "/tmp/a.whl"')
+        self.assertEqual(gpg.get_sign_cmd('/tmp/a.whl', 'fred@bedrock.com'),
+            '"gpg" --detach-sign -a --local-user "fred@bedrock.com" "/tmp/a.whl"')
+
+    def testFirstFileSignedAlone(self):
+        process = MockProcess(func=self.func)
+        process.popen_many = lambda cmds, echo=True, echo2=True: self.batches.append(cmds) or [(0, []) for x in cmds]
+        gpg = GPG(process)
+        signatures = gpg.sign_distfiles(self.distfiles, 'fred')
+        self.assertEqual(signatures, [x+'.asc' for x in self.distfiles])
+        self.assertEqual(self.cmds, [gpg.get_sign_cmd(self.distfiles[0], 'fred')])
+        self.assertEqual(self.batches, [[gpg.get_sign_cmd(self.distfiles[1], 'fred')]])
+
+    def testRemovesOldSignatures(self):
+        self.mkfile('a-1.0.tar.gz.asc', 'old')
+        gpg = GPG(MockProcess(func=self.func))
+        gpg.sign_distfiles(self.distfiles[:1])
+        self.assertFalse(exists(self.distfiles[0]+'.asc'))
+
+    @quiet
+    def testSigningFails(self):
+        gpg = GPG(MockProcess(rc=2))
+        self.assertRaises(SystemExit, gpg.sign_distfiles, self.distfiles)
+
+    def testNoDistfiles(self):
+        gpg = GPG(MockProcess(func=self.func))
+        self.assertEqual(gpg.sign_distfiles([]), [])
+        self.assertEqual(self.cmds, [])
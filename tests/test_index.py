@@ -0,0 +1,144 @@
+import unittest
+import json
+import threading
+
+from os.path import join
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+from jarn.mkrelease.index import Index
+from jarn.mkrelease.index import normalize
+from jarn.mkrelease.index import get_project_name
+from jarn.mkrelease.index import get_simple_url
+from jarn.mkrelease.index import SIMPLE_JSON
+from jarn.mkrelease.cache import file_digest
+
+from jarn.mkrelease.testing import JailSetup
+
+
+class IndexHandler(BaseHTTPRequestHandler):
+
+    pages = {}
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, dict(self.headers)))
+        page = self.pages.get(self.path, 404)
+        if isinstance(page, int):
+            self.send_error(page)
+            return
+        content_type, body = page
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class IndexSetup(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        IndexHandler.pages = {}
+        IndexHandler.requests = []
+        self.server = HTTPServer(('127.0.0.1', 0), IndexHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/simple/' % self.server.server_port
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        JailSetup.tearDown(self)
+
+
+class HelperTests(unittest.TestCase):
+
+    def testNormalize(self):
+        self.assertEqual(normalize('jarn.mkrelease'), 'jarn-mkrelease')
+        self.assertEqual(normalize('Foo__Bar-.baz'), 'foo-bar-baz')
+
+    def testProjectNameFromSdist(self):
+        self.assertEqual(get_project_name('/tmp/jarn.mkrelease-6.0.tar.gz'), 'jarn.mkrelease')
+        self.assertEqual(get_project_name('/tmp/foo-bar-1.0.zip'), 'foo-bar')
+
+    def testProjectNameFromWheel(self):
+        self.assertEqual(get_project_name('/tmp/jarn_mkrelease-6.0-py3-none-any.whl'), 'jarn_mkrelease')
+
+    def testSimpleUrl(self):
+        self.assertEqual(get_simple_url(''), 'https://pypi.org/simple/')
+        self.assertEqual(get_simple_url('https://upload.pypi.org/legacy/'), 'https://pypi.org/simple/')
+        self.assertEqual(get_simple_url('https://test.pypi.org/legacy/'), 'https://test.pypi.org/simple/')
+        self.assertEqual(get_simple_url('https://devpi.example.com/fred/dev/'), '')
+
+
+class GetFilesTests(IndexSetup):
+
+    def testJson(self):
+        IndexHandler.pages['/simple/foo-bar/'] = (SIMPLE_JSON, json.dumps({
+            'name': 'foo-bar',
+            'files': [
+                {'filename': 'foo_bar-1.0.tar.gz', 'hashes': {'sha256': 'abc'}},
+                {'filename': 'foo_bar-1.0-py3-none-any.whl', 'hashes': {}},
+            ],
+        }))
+        files = Index(self.url).get_files('Foo_Bar')
+        self.assertEqual(files, {'foo_bar-1.0.tar.gz': 'abc', 'foo_bar-1.0-py3-none-any.whl': ''})
+        self.assertTrue(IndexHandler.requests[0][1]['Accept'].startswith(SIMPLE_JSON))
+
+    def testHtml(self):
+        IndexHandler.pages['/simple/foo/'] = ('text/html', """
+<html><body>
+<a href="../../packages/foo-1.0.tar.gz#sha256=abc">foo-1.0.tar.gz</a>
+<a href="https://files.example.com/foo-1.0.zip" data-requires-python="&gt;=3">foo-1.0.zip</a>
+</body></html>
+""")
+        files = Index(self.url).get_files('foo')
+        self.assertEqual(files, {'foo-1.0.tar.gz': 'abc', 'foo-1.0.zip': ''})
+
+    def testMissingProject(self):
+        self.assertEqual(Index(self.url).get_files('foo'), {})
+
+    def testServerError(self):
+        IndexHandler.pages['/simple/foo/'] = 500
+        self.assertRaises(IOError, Index(self.url).get_files, 'foo')
+
+    def testCredentials(self):
+        Index(self.url, 'fred', 'secret').get_files('foo')
+        self.assertEqual(IndexHandler.requests[0][1]['Authorization'], 'Basic ZnJlZDpzZWNyZXQ=')
+
+    def testNoCredentials(self):
+        Index(self.url).get_files('foo')
+        self.assertFalse('Authorization' in IndexHandler.requests[0][1])
+
+
+class GetExistingTests(IndexSetup):
+
+    def testMatchingDigests(self):
+        self.mkfile('foo-1.0.tar.gz', 'sdist')
+        self.mkfile('foo-1.0-py3-none-any.whl', 'wheel')
+        sdist = join(self.tempdir, 'foo-1.0.tar.gz')
+        wheel = join(self.tempdir, 'foo-1.0-py3-none-any.whl')
+        IndexHandler.pages['/simple/foo/'] = (SIMPLE_JSON, json.dumps({
+            'files': [
+                {'filename': 'foo-1.0.tar.gz', 'hashes': {'sha256': file_digest(sdist)}},
+                {'filename': 'foo-1.0-py3-none-any.whl', 'hashes': {'sha256': '0'*64}},
+            ],
+        }))
+        self.assertEqual(Index(self.url).get_existing([sdist, wheel]), [sdist])
+
+    def testUnknownDigest(self):
+        self.mkfile('foo-1.0.tar.gz', 'sdist')
+        sdist = join(self.tempdir, 'foo-1.0.tar.gz')
+        IndexHandler.pages['/simple/foo/'] = (SIMPLE_JSON, json.dumps({
+            'files': [{'filename': 'foo-1.0.tar.gz', 'hashes': {}}],
+        }))
+        self.assertEqual(Index(self.url).get_existing([sdist]), [])
+
+    def testNoDistfiles(self):
+        self.assertEqual(Index(self.url).get_existing([]), [])
+        self.assertEqual(IndexHandler.requests, [])
@@ -333,12 +333,48 @@ class CloneUrlTests(MercurialSetup):
         self.destroy()
         self.assertRaises(SystemExit, scm.clone_url, self.packagedir, 'testclone')
 
+    def testCloneUrlBranch(self):
+        scm = Mercurial(Process(quiet=True))
+        self.assertEqual(scm.clone_url(self.packagedir, 'testclone', 'default'), 0)
+        self.assertEqual(scm.get_branch_from_sandbox('testclone'), 'default')
+
     @quiet
     def testBadProcess(self):
         scm = Mercurial(MockProcess(rc=1))
         self.assertRaises(SystemExit, scm.clone_url, self.packagedir, 'testclone')
 
 
+class MirrorTests(MercurialSetup):
+
+    def testUpdateMirror(self):
+        scm = Mercurial(Process(quiet=True))
+        self.assertEqual(scm.update_mirror(self.packagedir, 'testmirror'), 0)
+        self.assertEqual(isdir(join('testmirror', '.hg')), True)
+        # Second call pulls
+        self.assertEqual(scm.update_mirror(self.packagedir, 'testmirror'), 0)
+
+    def testCloneMirror(self):
+        scm = Mercurial(Process(quiet=True))
+        scm.update_mirror(self.packagedir, 'testmirror')
+        self.assertEqual(scm.clone_mirror('testmirror', self.packagedir, 'testclone'), 0)
+        self.assertEqual(isdir('testclone'), True)
+        self.assertEqual(scm.get_url_from_sandbox('testclone'), self.packagedir)
+
+    @quiet
+    def testBadServer(self):
+        scm = Mercurial(Process(quiet=True))
+        self.destroy()
+        self.assertRaises(SystemExit, scm.update_mirror, self.packagedir, 'testmirror')
+
+    @quiet
+    def testPullFailsKeepsMirror(self):
+        scm = Mercurial(Process(quiet=True))
+        scm.update_mirror(self.packagedir, 'testmirror')
+        self.destroy()
+        self.assertRaises(SystemExit, scm.update_mirror, self.packagedir, 'testmirror')
+        self.assertEqual(isdir(join('testmirror', '.hg')), True)
+
+
 class BranchIdTests(MercurialSetup):
 
     def testMakeBranchId(self):
@@ -1,19 +1,43 @@
 # THIS SHOULD BE DOCTESTS
 import sys
 import os
+import shutil
+import json
 
 from os import listdir
 from os.path import join
+from http.client import IncompleteRead
 
 from jarn.mkrelease.mkrelease import main
+from jarn.mkrelease.mkrelease import ReleaseMaker
+from jarn.mkrelease.scp import SCP
+from jarn.mkrelease.gpg import GPG
+from jarn.mkrelease.twine import Twine
+from jarn.mkrelease.cache import file_digest
+from jarn.mkrelease.index import Index
+from jarn.mkrelease.process import Process
+from jarn.mkrelease.scm import Git
 
+from jarn.mkrelease.testing import JailSetup
 from jarn.mkrelease.testing import GitSetup
+from jarn.mkrelease.testing import MockProcess
 from jarn.mkrelease.testing import quiet
 from jarn.mkrelease.testing import setenv
+from jarn.mkrelease.testing import delenv
+from jarn.mkrelease.testing import appendlines
 
 PY = sys.version_info[0]
 
 
+class serverinfo:
+    indexurl = repository = username = password = ''
+
+    def __init__(self, sign=None, identity=None, register=None):
+        self.sign = sign
+        self.identity = identity
+        self.register = register
+
+
 class FunctionalTests(GitSetup):
 
     def mkrelease(self, args):
@@ -38,6 +62,13 @@ class FunctionalTests(GitSetup):
         self.assertEqual(rc, 0)
         self.assertEqual(listdir(join('testpackage', 'dist')), ['testpackage-2.6-py%d-none-any.whl' % PY])
 
+    @quiet
+    def test_default_release(self):
+        rc = self.mkrelease(['-n', '-q', '-m', 'testpackage'])
+        self.assertEqual(rc, 0)
+        self.assertEqual(sorted(listdir(join('testpackage', 'dist'))),
+                         ['testpackage-2.6-py%d-none-any.whl' % PY, 'testpackage-2.6.tar.gz'])
+
     @quiet
     def test_development_release(self):
         self.mkfile(join('testpackage', 'setup.cfg'), """\
@@ -87,3 +118,291 @@ packages = find:
         self.assertEqual(rc, 0)
         self.assertEqual(listdir(join('testpackage', 'dist')), ['testpackage-2.7.tar.gz'])
 
+
+    @quiet
+    def test_batch_release(self):
+        shutil.copytree('testpackage', 'otherpackage', symlinks=True)
+        rc = self.mkrelease(['-n', '-q', '-m', '-g', '-B', 'testpackage', 'otherpackage'])
+        self.assertEqual(rc, 0)
+        self.assertEqual(listdir(join('testpackage', 'dist')), ['testpackage-2.6.tar.gz'])
+        self.assertEqual(listdir(join('otherpackage', 'dist')), ['testpackage-2.6.tar.gz'])
+
+    @quiet
+    def test_batch_file(self):
+        shutil.copytree('testpackage', 'otherpackage', symlinks=True)
+        self.mkfile('packages.txt', """\
+# Packages
+testpackage
+otherpackage  # Comment
+""")
+        rc = self.mkrelease(['-n', '-q', '-m', '-g', '-j', '1', '-F', 'packages.txt'])
+        self.assertEqual(rc, 0)
+        self.assertEqual(listdir(join('testpackage', 'dist')), ['testpackage-2.6.tar.gz'])
+        self.assertEqual(listdir(join('otherpackage', 'dist')), ['testpackage-2.6.tar.gz'])
+
+    @quiet
+    def test_batch_failure(self):
+        os.mkdir('nopackage')
+        rc = self.mkrelease(['-n', '-q', '-m', '-g', '-B', 'nopackage', 'testpackage'])
+        self.assertEqual(rc, 1)
+        self.assertEqual(listdir(join('testpackage', 'dist')), ['testpackage-2.6.tar.gz'])
+
+    @quiet
+    def test_batch_shared_sandbox(self):
+        self.clone()
+        os.mkdir(join('testclone', 'subpackage'))
+        self.mkfile(join('testclone', 'subpackage', 'setup.py'), """\
+from setuptools import setup
+setup(name='subpackage', version='1.0', py_modules=['subpackage'])
+""")
+        self.mkfile(join('testclone', 'subpackage', 'subpackage.py'))
+        process = Process(quiet=True)
+        process.popen('git add subpackage', cwd=self.clonedir)
+        process.popen('git commit -m"Add subpackage"', cwd=self.clonedir)
+        appendlines(join('testclone', 'setup.py'), ['# Modified'])
+        appendlines(join('testclone', 'subpackage', 'subpackage.py'), ['# Modified'])
+        rc = self.mkrelease(['--non-interactive', '-R', '-S', '-q', '-m', '-g', '-j', '2',
+                             '-B', 'testclone', join('testclone', 'subpackage')])
+        self.assertEqual(rc, 0)
+        self.assertTrue(self.scm_tag_exists(self.packagedir, '2.6'))
+        self.assertTrue(self.scm_tag_exists(self.packagedir, '1.0'))
+        self.assertEqual(listdir(join('testclone', 'subpackage', 'dist')), ['subpackage-1.0.tar.gz'])
+
+    @quiet
+    def test_batch_no_packages(self):
+        rc = self.mkrelease(['-n', '-q', '-B'])
+        self.assertEqual(rc, 1)
+
+    @quiet
+    def test_timing_file(self):
+        rc = self.mkrelease(['-n', '-q', '-m', '-g', '--timing', '--timing-file=timings.json', 'testpackage'])
+        self.assertEqual(rc, 0)
+        with open('timings.json') as file:
+            names = [x['name'] for x in json.load(file)['frames']]
+        self.assertTrue('get_options' in names)
+        self.assertTrue('get_package' in names)
+        self.assertTrue('build' in names)
+
+    @quiet
+    def test_build_cache(self):
+        self.mkfile('my.cfg', """\
+[mkrelease]
+build-cache = yes
+cache-dir = %s
+""" % join(self.tempdir, 'cache'))
+        rc = self.mkrelease(['-c', 'my.cfg', '-n', '-q', '-m', '-g', 'testpackage'])
+        self.assertEqual(rc, 0)
+        self.assertEqual(len(listdir(join('cache', 'builds'))), 1)
+        shutil.rmtree(join('testpackage', 'dist'))
+        sys.stdout.truncate(0)
+        rc = self.mkrelease(['-c', 'my.cfg', '-n', '-m', '-g', 'testpackage'])
+        self.assertEqual(rc, 0)
+        self.assertTrue('Reusing distributions built from' in sys.stdout.getvalue())
+        self.assertFalse('running sdist' in sys.stdout.getvalue())
+        self.assertEqual(listdir(join('testpackage', 'dist')), ['testpackage-2.6.tar.gz'])
+
+    @quiet
+    def test_push_tag(self):
+        self.clone()
+        rc = self.mkrelease(['-C', '-S', '-m', '-g', 'testclone'])
+        self.assertEqual(rc, 0)
+        self.assertTrue(self.scm_tag_exists(self.packagedir, '2.6'))
+        self.assertTrue('Removing tag' not in sys.stdout.getvalue())
+
+    @quiet
+    def test_build_failure_removes_tag(self):
+        self.clone()
+        appendlines(join('testclone', 'setup.py'), [
+            'import sys', 'if "sdist" in sys.argv: sys.exit("sdist is broken")'])
+        Process(quiet=True).popen('git commit -a -m"Break sdist"', cwd=self.clonedir)
+        rc = self.mkrelease(['-C', '-S', '-m', 'testclone'])
+        self.assertEqual(rc, 1)
+        self.assertTrue('Removing tag 2.6' in sys.stdout.getvalue())
+        self.assertFalse(self.scm_tag_exists(self.clonedir, '2.6'))
+        self.assertFalse(self.scm_tag_exists(self.packagedir, '2.6'))
+
+    def scm_tag_exists(self, dir, tagid):
+        return Git().tag_exists(dir, tagid)
+
+
+class UploadLocationTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('my.cfg', '[mkrelease]\nskip-existing = yes\n')
+        self.mkfile('a-1.0.tar.gz', 'sdist')
+        self.mkfile('a-1.0-py3-none-any.whl', 'wheel')
+        self.distfiles = [join(self.tempdir, 'a-1.0.tar.gz'),
+                          join(self.tempdir, 'a-1.0-py3-none-any.whl')]
+        self.cmds = []
+
+    def get_releasemaker(self, digest):
+        def func(cmd):
+            self.cmds.append(cmd)
+            if cmd.startswith('ssh'):
+                return 0, ['%s  a-1.0.tar.gz' % digest]
+            return 0, []
+        rm = ReleaseMaker([])
+        rm.set_defaults('my.cfg')
+        rm.scp = SCP(MockProcess(func=func))
+        return rm
+
+    @quiet
+    def test_upload_missing_only(self):
+        rm = self.get_releasemaker(file_digest(self.distfiles[0]))
+        rm.upload_location(self.tempdir, self.distfiles, 'jarn.com:eggs')
+        self.assertEqual(len(self.cmds), 2)
+        self.assertEqual(self.cmds[1], 'scp  "%s" "jarn.com:eggs"' % self.distfiles[1])
+        self.assertTrue('Skipping a-1.0.tar.gz' in sys.stdout.getvalue())
+
+    @quiet
+    def test_upload_nothing_missing(self):
+        rm = self.get_releasemaker(file_digest(self.distfiles[0]))
+        rm.upload_location(self.tempdir, self.distfiles[:1], 'scp://jarn.com/eggs')
+        self.assertEqual(len(self.cmds), 1)
+        self.assertTrue(self.cmds[0].startswith('ssh  "jarn.com" \'cd "/eggs"'))
+
+    @quiet
+    def test_skip_existing_disabled(self):
+        rm = self.get_releasemaker(file_digest(self.distfiles[0]))
+        rm.defaults.skipexisting = False
+        rm.upload_location(self.tempdir, self.distfiles, 'jarn.com:eggs')
+        self.assertEqual(len(self.cmds), 1)
+        self.assertTrue(self.cmds[0].startswith('scp'))
+
+    @quiet
+    def test_skip_existing_default(self):
+        rm = self.get_releasemaker(file_digest(self.distfiles[0]))
+        rm.defaults.skipexisting = None
+        rm.upload_location(self.tempdir, self.distfiles, 'jarn.com:eggs')
+        self.assertEqual(len(self.cmds), 1)
+        self.assertTrue(self.cmds[0].startswith('scp'))
+
+    @quiet
+    def test_skip_existing_default_non_interactive(self):
+        rm = self.get_releasemaker(file_digest(self.distfiles[0]))
+        rm.defaults.skipexisting = None
+        rm.twine.interactive = False
+        rm.upload_location(self.tempdir, self.distfiles, 'jarn.com:eggs')
+        self.assertEqual(len(self.cmds), 2)
+        self.assertTrue(self.cmds[0].startswith('ssh'))
+
+    def test_broken_index_response(self):
+        def get_existing(self, distfiles):
+            raise IncompleteRead(b'')
+        rm = self.get_releasemaker('')
+        saved = Index.get_existing
+        Index.get_existing = get_existing
+        try:
+            self.assertEqual(rm.get_missing(self.distfiles, 'pypi'), self.distfiles)
+        finally:
+            Index.get_existing = saved
+
+
+class UploadSignedTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('my.cfg', '[mkrelease]\nskip-existing = no\n')
+        self.mkfile('a-1.0.tar.gz', 'sdist')
+        self.distfiles = [join(self.tempdir, 'a-1.0.tar.gz')]
+        self.cmds = []
+
+    def func(self, cmd):
+        self.cmds.append(cmd)
+        return 0, []
+
+    def get_releasemaker(self):
+        rm = ReleaseMaker([])
+        rm.set_defaults('my.cfg')
+        rm.defaults.servers['other'] = rm.defaults.servers['pypi']
+        rm.locations.extend(['pypi', 'other'])
+        rm.twine = Twine(MockProcess(func=self.func), twine='twine')
+        rm.twine.interactive = False
+        rm.gpg = GPG(MockProcess(func=self.func))
+        rm.sign = True
+        return rm
+
+    @quiet
+    def test_sign_once(self):
+        rm = self.get_releasemaker()
+        rm.upload_locations(self.tempdir, self.distfiles)
+        signs = [x for x in self.cmds if 'detach-sign' in x]
+        uploads = [x for x in self.cmds if 'twine' in x]
+        self.assertEqual(len(signs), 1)
+        self.assertEqual(len(uploads), 2)
+        for cmd in uploads:
+            self.assertFalse('--sign' in cmd)
+            self.assertTrue('a-1.0.tar.gz.asc' in cmd)
+
+    @quiet
+    def test_different_identities(self):
+        rm = self.get_releasemaker()
+        rm.sign = False
+        rm.defaults.servers['pypi'] = serverinfo(sign=True, identity='fred')
+        rm.defaults.servers['other'] = serverinfo(sign=True, identity='barney')
+        rm.upload_locations(self.tempdir, self.distfiles)
+        signs = [x for x in self.cmds if 'detach-sign' in x]
+        uploads = [x for x in self.cmds if 'twine' in x]
+        self.assertEqual(signs, [])
+        self.assertTrue('--identity="fred"' in uploads[0])
+        self.assertTrue('--identity="barney"' in uploads[1])
+
+
+class UploadFailureTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('my.cfg', '[mkrelease]\nskip-existing = no\n')
+        self.mkfile('a-1.0.tar.gz', 'sdist')
+        self.distfiles = [join(self.tempdir, 'a-1.0.tar.gz')]
+        self.cmds = []
+
+    def func(self, cmd):
+        self.cmds.append(cmd)
+        if 'jarn.com' in cmd:
+            return 1, []
+        return 0, []
+
+    @quiet
+    def test_serial_failures_reported_together(self):
+        rm = ReleaseMaker([])
+        rm.set_defaults('my.cfg')
+        rm.locations.extend(['jarn.com:eggs', 'jarn.org:eggs', 'scp://jarn.com/eggs'])
+        rm.scp = SCP(MockProcess(func=self.func))
+        self.assertTrue(rm.twine.interactive)
+        self.assertRaises(SystemExit, rm.upload_locations, self.tempdir, self.distfiles)
+        self.assertEqual(len(self.cmds), 3)
+        self.assertTrue('ERROR: upload failed for jarn.com:eggs, scp://jarn.com/eggs'
+                        in sys.stderr.getvalue())
+
+
+class UseUploaderTests(JailSetup):
+
+    def get_releasemaker(self, directupload, password):
+        self.mkfile('my.cfg', '[mkrelease]\ndirect-upload = %s\n' % directupload)
+        rm = ReleaseMaker([])
+        rm.set_defaults('my.cfg')
+        rm.defaults.servers['index'] = server = serverinfo()
+        server.password = password
+        return rm
+
+    def test_direct_upload(self):
+        with delenv('TWINE_PASSWORD'):
+            rm = self.get_releasemaker('yes', 'secret')
+            self.assertEqual(rm.use_uploader('index', []), True)
+
+    def test_direct_upload_disabled(self):
+        with delenv('TWINE_PASSWORD'):
+            rm = self.get_releasemaker('no', 'secret')
+            self.assertEqual(rm.use_uploader('index', []), False)
+
+    def test_twine_signs(self):
+        with delenv('TWINE_PASSWORD'):
+            rm = self.get_releasemaker('yes', 'secret')
+            self.assertEqual(rm.use_uploader('index', ['--sign']), False)
+
+    def test_twine_prompts(self):
+        with delenv('TWINE_PASSWORD'):
+            rm = self.get_releasemaker('yes', '')
+            self.assertEqual(rm.use_uploader('index', []), False)
@@ -1,12 +1,32 @@
 import unittest
 import os
+import sys
+import time
 
+from io import StringIO
+
+from jarn.mkrelease import tee
 from jarn.mkrelease.process import Process
+from jarn.mkrelease.tee import system
+from jarn.mkrelease.tee import run, run_threaded, After, StartsWith
+from jarn.mkrelease.tee import LineReader, On
 
 from jarn.mkrelease.testing import JailSetup
 from jarn.mkrelease.testing import quiet
 
 
+class capture(object):
+    """Context manager capturing sys.stdout and sys.stderr in one stream."""
+
+    def __enter__(self):
+        self.saved = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = StringIO()
+        return sys.stdout
+
+    def __exit__(self, *ignored):
+        sys.stdout, sys.stderr = self.saved
+
+
 class PopenTests(unittest.TestCase):
 
     @quiet
@@ -49,3 +69,170 @@ class PopenTests(unittest.TestCase):
         self.assertEqual(rc, 127)
         self.assertEqual(lines, [])
 
+
+
+class PopenManyTests(unittest.TestCase):
+
+    def test_simple(self):
+        process = Process(quiet=True)
+        results = process.popen_many(['echo "Hello"', 'echo "world"'])
+        self.assertEqual(results, [(0, ['Hello']), (0, ['world'])])
+
+    def test_concurrent(self):
+        process = Process(quiet=True)
+        start = time.time()
+        results = process.popen_many(['sleep 1', 'sleep 1', 'sleep 1'])
+        self.assertLess(time.time() - start, 2.5)
+        self.assertEqual(results, [(0, []), (0, []), (0, [])])
+
+    def test_ordered_output(self):
+        process = Process()
+        with capture() as out:
+            results = process.popen_many(['sleep 0.3; echo "Hello"', 'echo "world"'])
+        self.assertEqual(out.getvalue(), 'Hello\nworld\n')
+        self.assertEqual(results, [(0, ['Hello']), (0, ['world'])])
+
+    def test_filter_per_command(self):
+        process = Process()
+        with capture() as out:
+            process.popen_many(['echo "start"; echo "Hello"', 'echo "start"; echo "world"'],
+                               echo=After('start'))
+        self.assertEqual(out.getvalue(), 'Hello\nworld\n')
+
+    def test_bad_cmd(self):
+        process = Process(quiet=True)
+        results = process.popen_many(['$ "Hello world"', 'echo "Hello world"'])
+        self.assertEqual(results, [(127, []), (0, ['Hello world'])])
+
+
+class RunnerTests(unittest.TestCase):
+
+    def test_run(self):
+        with capture() as out:
+            rc, lines = run('echo "Hello"; echo "world" 1>&2', shell=True)
+        self.assertEqual(rc, 0)
+        self.assertEqual(lines, ['Hello'])
+        # stdout and stderr are read concurrently
+        self.assertEqual(sorted(out.getvalue().split()), ['Hello', 'world'])
+
+    def test_run_threaded(self):
+        with capture() as out:
+            rc, lines = run_threaded('echo "Hello"; echo "world" 1>&2', shell=True)
+        self.assertEqual(rc, 0)
+        self.assertEqual(lines, ['Hello'])
+        # stdout and stderr are read concurrently
+        self.assertEqual(sorted(out.getvalue().split()), ['Hello', 'world'])
+
+    def test_output(self):
+        output = []
+        with capture() as out:
+            rc, lines = run('echo "Hello"; echo "world" 1>&2', shell=True, output=output)
+        self.assertEqual(rc, 0)
+        self.assertEqual(out.getvalue(), '')
+        self.assertEqual(sorted([x[1] for x in output]), ['Hello\n', 'world\n'])
+
+    def test_output_threaded_fallback(self):
+        saved = tee._can_run_async
+        tee._can_run_async = lambda: False
+        try:
+            output = []
+            with capture() as out:
+                rc, lines = run('echo "Hello"; echo "world" 1>&2', shell=True, output=output)
+        finally:
+            tee._can_run_async = saved
+        self.assertEqual(rc, 0)
+        self.assertEqual(lines, ['Hello'])
+        self.assertEqual(out.getvalue(), '')
+        self.assertEqual(sorted([x[1] for x in output]), ['Hello\n', 'world\n'])
+
+    def test_output_system(self):
+        output = []
+        with capture() as out:
+            rc, lines = system('echo "Hello"', shell=True, output=output)
+        self.assertEqual(rc, 0)
+        self.assertEqual(out.getvalue(), '')
+        self.assertEqual([x[1] for x in output], ['Hello\n'])
+
+    def test_long_line(self):
+        rc, lines = run('python -c "print(100000*\'x\')"', echo=False, shell=True)
+        self.assertEqual(rc, 0)
+        self.assertEqual(lines, [100000*'x'])
+
+    def test_very_long_line(self):
+        rc, lines = run('python -c "print(3000000*\'x\')"', echo=False, shell=True)
+        self.assertEqual(rc, 0)
+        self.assertEqual(lines, [3000000*'x'])
+
+    def test_no_trailing_newline(self):
+        rc, lines = run('printf "Hello\\nworld"', echo=False, shell=True)
+        self.assertEqual(rc, 0)
+        self.assertEqual(lines, ['Hello', 'world'])
+
+    def test_keep_prefixes(self):
+        with capture() as out:
+            rc, lines = run('echo "foo 1"; echo "bar 2"; echo "baz 3"', shell=True,
+                            keep=(b'foo', b'baz'))
+        self.assertEqual(rc, 0)
+        self.assertEqual(lines, ['foo 1', 'baz 3'])
+        self.assertEqual(out.getvalue(), 'foo 1\nbar 2\nbaz 3\n')
+
+    def test_keep_callable(self):
+        rc, lines = run('echo "foo 1"; echo "bar 2"', echo=False, shell=True,
+                        keep=lambda line: bytes(line).startswith(b'bar'))
+        self.assertEqual(rc, 0)
+        self.assertEqual(lines, ['bar 2'])
+
+    def test_keep_threaded(self):
+        rc, lines = run_threaded('echo "foo 1"; echo "bar 2"', echo=False, shell=True,
+                                 keep=(b'bar',))
+        self.assertEqual(rc, 0)
+        self.assertEqual(lines, ['bar 2'])
+
+    def test_keep_nothing(self):
+        rc, lines = run('echo "foo 1"; echo "bar 2"', echo=False, shell=True, keep=())
+        self.assertEqual(rc, 0)
+        self.assertEqual(lines, [])
+
+
+class LineReaderTests(unittest.TestCase):
+
+    def feed(self, chunks, filter=None, keep=None):
+        written, lines = [], []
+        reader = LineReader(filter or On(), written.append, lines, keep)
+        for chunk in chunks:
+            reader.feed(chunk)
+        reader.close()
+        return ''.join(written), lines
+
+    def test_lines_across_chunks(self):
+        written, lines = self.feed([b'foo', b' 1\nbar', b' 2\r\n', b'baz'])
+        self.assertEqual(written, 'foo 1\nbar 2\r\nbaz')
+        self.assertEqual(lines, ['foo 1', 'bar 2', 'baz'])
+
+    def test_filter(self):
+        written, lines = self.feed([b'foo 1\nbar 2\nbaz 3'], filter=StartsWith('ba'))
+        self.assertEqual(written, 'bar 2\nbaz 3')
+
+    def test_keep_prefixes(self):
+        written, lines = self.feed([b'foo 1\nbar 2\nf', b'oo 3\n'], keep=(b'bar', b'foo'))
+        self.assertEqual(lines, ['foo 1', 'bar 2', 'foo 3'])
+
+    def test_keep_overlapping_prefixes(self):
+        written, lines = self.feed([b'Writing a\nfoo\nWriting b\n'], keep=(b'Writing', b'Writing '))
+        self.assertEqual(lines, ['Writing a', 'Writing b'])
+
+    def test_empty_lines(self):
+        written, lines = self.feed([b'\n\nfoo\n'])
+        self.assertEqual(lines, ['', '', 'foo'])
+
+    def test_decode_once(self):
+        calls = []
+        saved = tee.decode
+        tee.decode = lambda x: calls.append(x) or saved(x)
+        try:
+            written, lines = self.feed([b'foo 1\nbar 2\n'])
+        finally:
+            tee.decode = saved
+        self.assertEqual(written, 'foo 1\nbar 2\n')
+        self.assertEqual(lines, ['foo 1', 'bar 2'])
+        self.assertEqual(len(calls), 1)
@@ -1,9 +1,13 @@
+import os
 import unittest
 
+from os.path import join
+
 from jarn.mkrelease.process import Process
 from jarn.mkrelease.scm import SCMFactory
 
 from jarn.mkrelease.testing import quiet
+from jarn.mkrelease.testing import JailSetup
 from jarn.mkrelease.testing import SubversionSetup
 from jarn.mkrelease.testing import MercurialSetup
 from jarn.mkrelease.testing import GitSetup
@@ -291,3 +295,60 @@ class GitGetScmTests(GitSetup):
         self.destroy()
         self.assertRaises(SystemExit, scms.get_scm, None, self.packagedir)
 
+
+
+class InstanceTests(unittest.TestCase):
+
+    def testSharedInstance(self):
+        scms = SCMFactory()
+        self.assertTrue(scms.get_scm_from_type('git') is scms.get_scm_from_url('git://'))
+
+    def testVersions(self):
+        versions = object()
+        scms = SCMFactory(versions=versions)
+        self.assertTrue(scms.get_scm_from_type('hg').versions is versions)
+
+
+class MarkerTests(JailSetup):
+    # Fake markers are not valid sandboxes; finding them proves no
+    # tool has been asked
+
+    def testFindGit(self):
+        os.makedirs(join('foo', '.git'))
+        scms = SCMFactory()
+        self.assertEqual(scms._find_scm_by_marker(join(self.tempdir, 'foo')).name, 'git')
+
+    def testFindInParent(self):
+        os.makedirs(join('foo', '.hg'))
+        os.makedirs(join('foo', 'bar', 'baz'))
+        scms = SCMFactory()
+        self.assertEqual(scms._find_scm_by_marker(join(self.tempdir, 'foo', 'bar', 'baz')).name, 'hg')
+
+    def testGitFileMarker(self):
+        os.makedirs('foo')
+        self.mkfile(join('foo', '.git'), 'gitdir: ../.git/worktrees/foo')
+        scms = SCMFactory()
+        self.assertEqual(scms._find_scm_by_marker(join(self.tempdir, 'foo')).name, 'git')
+
+    def testClosestWins(self):
+        os.makedirs(join('foo', '.hg'))
+        os.makedirs(join('foo', 'bar', '.git'))
+        scms = SCMFactory()
+        self.assertEqual(scms._find_scm_by_marker(join(self.tempdir, 'foo', 'bar')).name, 'git')
+
+    def testSameDistanceIsAmbiguous(self):
+        os.makedirs(join('foo', '.hg'))
+        os.makedirs(join('foo', '.git'))
+        scms = SCMFactory()
+        self.assertEqual(scms._find_scm_by_marker(join(self.tempdir, 'foo')), None)
+
+    def testClosestSubversionIsAmbiguous(self):
+        os.makedirs(join('foo', '.git'))
+        os.makedirs(join('foo', 'bar', '.svn'))
+        scms = SCMFactory()
+        self.assertEqual(scms._find_scm_by_marker(join(self.tempdir, 'foo', 'bar')), None)
+
+    def testGetScmFromSandbox(self):
+        os.makedirs(join('foo', '.git'))
+        scms = SCMFactory()
+        self.assertEqual(scms.get_scm_from_sandbox(join(self.tempdir, 'foo')).name, 'git')
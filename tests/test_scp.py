@@ -0,0 +1,123 @@
+import unittest
+
+from os.path import join
+
+from jarn.mkrelease.scp import SCP
+from jarn.mkrelease.cache import file_digest
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import MockProcess
+from jarn.mkrelease.testing import quiet
+
+
+class config:
+    interactive = True
+    multiplex = False
+
+
+class RunUploadTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cmds = []
+        self.batches = []
+
+    def func(self, cmd):
+        self.cmds.append(cmd)
+        if cmd.startswith('sftp'):
+            cmdfile = cmd.split('"')[1]
+            with open(cmdfile, 'rt') as file:
+                self.batches.append(file.read())
+        return 0, []
+
+    def testScpSingleSession(self):
+        scp = SCP(MockProcess(func=self.func))
+        scp.run_upload('scp', ['/tmp/a.tar.gz', '/tmp/a.whl'], 'jarn.com:eggs')
+        self.assertEqual(self.cmds, ['scp  "/tmp/a.tar.gz" "/tmp/a.whl" "jarn.com:eggs"'])
+
+    def testSftpSingleSession(self):
+        scp = SCP(MockProcess(func=self.func))
+        scp.run_upload('sftp', ['/tmp/a.tar.gz', '/tmp/a.whl'], 'jarn.com:eggs')
+        self.assertEqual(len(self.cmds), 1)
+        self.assertEqual(self.batches, ['put "/tmp/a.tar.gz"\nput "/tmp/a.whl"\nbye\n'])
+
+    @quiet
+    def testUploadFails(self):
+        scp = SCP(MockProcess(rc=1))
+        self.assertRaises(SystemExit, scp.run_upload, 'scp', ['/tmp/a.whl'], 'jarn.com:eggs')
+
+
+class GetOptionsTests(unittest.TestCase):
+
+    def testInteractive(self):
+        scp = SCP(defaults=config)
+        self.assertEqual(scp.get_options(), '')
+
+    def testNonInteractive(self):
+        class defaults(config):
+            interactive = False
+        scp = SCP(defaults=defaults)
+        self.assertEqual(scp.get_options(), '-o KbdInteractiveAuthentication=no')
+
+    def testMultiplex(self):
+        class defaults(config):
+            multiplex = True
+        scp = SCP(defaults=defaults)
+        self.assertTrue('-o ControlMaster=auto' in scp.get_options())
+
+
+class GetExistingTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.mkfile('a-1.0.tar.gz', 'sdist')
+        self.mkfile('a-1.0-py3-none-any.whl', 'wheel')
+        self.distfiles = [join(self.tempdir, 'a-1.0.tar.gz'),
+                          join(self.tempdir, 'a-1.0-py3-none-any.whl')]
+        self.cmds = []
+
+    def testScpMatchingDigest(self):
+        digest = file_digest(self.distfiles[0])
+        def func(cmd):
+            self.cmds.append(cmd)
+            return 1, ['%s  a-1.0.tar.gz' % digest]
+        scp = SCP(MockProcess(func=func))
+        existing = scp.get_existing('scp', self.distfiles, 'jarn.com:/var/dist')
+        self.assertEqual(existing, self.distfiles[:1])
+        self.assertEqual(len(self.cmds), 1)
+        self.assertTrue(self.cmds[0].startswith('ssh  "jarn.com" \'cd "/var/dist" 2>/dev/null && '))
+
+    def testScpDifferentDigest(self):
+        digest = '0'*64
+        scp = SCP(MockProcess(lines=['%s  a-1.0.tar.gz' % digest]))
+        self.assertEqual(scp.get_existing('scp', self.distfiles, 'jarn.com:eggs'), [])
+
+    def testScpHomeDirectory(self):
+        def func(cmd):
+            self.cmds.append(cmd)
+            return 0, []
+        scp = SCP(MockProcess(func=func))
+        scp.get_existing('scp', self.distfiles, 'jarn.com:')
+        self.assertTrue(self.cmds[0].startswith('ssh  "jarn.com" \'(sha256sum '))
+
+    def testScpFails(self):
+        scp = SCP(MockProcess(rc=255))
+        self.assertEqual(scp.get_existing('scp', self.distfiles, 'jarn.com:eggs'), [])
+
+    def testSftpMatchingDigest(self):
+        digest = file_digest(self.distfiles[0])
+        def func(cmd):
+            self.cmds.append(cmd)
+            return 0, ['%s  a-1.0.tar.gz' % digest]
+        scp = SCP(MockProcess(func=func))
+        existing = scp.get_existing('sftp', self.distfiles, 'jarn.com:eggs')
+        self.assertEqual(existing, self.distfiles[:1])
+        self.assertTrue(self.cmds[0].startswith('ssh  "jarn.com" '))
+
+    def testSftpSameSizeDifferentDigest(self):
+        digest = '0'*64
+        scp = SCP(MockProcess(lines=['%s  a-1.0.tar.gz' % digest]))
+        self.assertEqual(scp.get_existing('sftp', self.distfiles, 'jarn.com:eggs'), [])
+
+    def testSftpNoShell(self):
+        scp = SCP(MockProcess(rc=1, lines=['This service allows sftp connections only.']))
+        self.assertEqual(scp.get_existing('sftp', self.distfiles, 'jarn.com:eggs'), [])
@@ -3,7 +3,8 @@ import os
 import zipfile
 import unittest
 
-from os.path import join, isfile
+from os.path import join, isfile, isdir, dirname
+from os import listdir
 from contextlib import closing
 
 from jarn.mkrelease.setuptools import Setuptools
@@ -11,9 +12,12 @@ from jarn.mkrelease.process import Process
 from jarn.mkrelease.setup import iter_entry_points
 from jarn.mkrelease.utils import decode
 
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import MockProcess
 from jarn.mkrelease.testing import SubversionSetup
 from jarn.mkrelease.testing import MercurialSetup
 from jarn.mkrelease.testing import GitSetup
+from jarn.mkrelease.testing import quiet
 
 
 def contains(archive, name):
@@ -269,6 +273,19 @@ testpackage.egg-info/top_level.txt""")
         archive = st.run_dist(self.packagedir, st.infoflags, 'sdist', ['--formats=zip'], ff='git')
         self.assertEqual(contains(archive, 'git_only.py'), True)
 
+    def testBuiltinFinder(self):
+        st = Setuptools(Process(quiet=True, env=get_env()))
+        rc, lines = st._run_setup_py(['egg_info'], ff='git', cwd=self.packagedir)
+        self.assertEqual(rc, 0)
+        self.assertTrue('using built-in git file-finder' in lines)
+
+    def testFinderCache(self):
+        cachedir = join(self.tempdir, 'cache')
+        st = Setuptools(Process(quiet=True, env=get_env()), cachedir=cachedir)
+        archive = st.run_dist(self.packagedir, [], 'sdist', ['--formats=zip'], ff='git')
+        self.assertEqual(contains(archive, 'git_only.txt'), True)
+        self.assertEqual(len(listdir(join(cachedir, 'files'))), 1)
+
 
 class NoneTests(GitSetup):
 
@@ -362,3 +379,275 @@ testpackage.egg-info/top_level.txt""")
         st.run_dist(self.packagedir, [], 'sdist', ['--formats=zip'], ff='none')
         self.assertFalse(isfile(join(self.packagedir, 'setup.pyc')))
 
+
+
+class BatchTests(GitSetup):
+
+    def testGitDists(self):
+        st = Setuptools(Process(quiet=True, env=get_env()))
+        distfiles = st.run_dists(self.packagedir, [],
+            [('sdist', ['--formats="zip"']), ('bdist_wheel', [])], ff='git')
+        self.assertEqual(len(distfiles), 2)
+        self.assertTrue(distfiles[0].endswith('.zip'))
+        self.assertTrue(distfiles[1].endswith('.whl'))
+        self.assertEqual(contains(distfiles[0], 'git_only.txt'), True)
+
+    def testSdistFormats(self):
+        st = Setuptools(Process(quiet=True, env=get_env()))
+        distfiles = st.run_dists(self.packagedir, [],
+            [('sdist', ['--formats="gztar"']), ('sdist', ['--formats="zip"'])], ff='git')
+        self.assertEqual(len(distfiles), 2)
+        self.assertTrue(distfiles[0].endswith('.tar.gz'))
+        self.assertTrue(distfiles[1].endswith('.zip'))
+        self.assertTrue(isfile(distfiles[0]))
+        self.assertTrue(isfile(distfiles[1]))
+
+    def testParallelDists(self):
+        st = Setuptools(Process(quiet=True, env=get_env()))
+        distfiles = st.run_dists(self.packagedir, [],
+            [('sdist', ['--formats="gztar"']), ('bdist_wheel', []), ('sdist', ['--formats="zip"'])],
+            ff='git', parallel=True)
+        self.assertEqual(len(distfiles), 3)
+        self.assertTrue(distfiles[0].endswith('.tar.gz'))
+        self.assertTrue(distfiles[1].endswith('.whl'))
+        self.assertTrue(distfiles[2].endswith('.zip'))
+        for distfile in distfiles:
+            self.assertEqual(dirname(distfile), join(self.packagedir, 'dist'))
+            self.assertTrue(isfile(distfile))
+        self.assertEqual(contains(distfiles[2], 'git_only.txt'), True)
+        self.assertEqual(listdir(join(self.packagedir, 'build')), [])
+
+    def testParallelManifest(self):
+        st = Setuptools(Process(quiet=True, env=get_env()))
+        distfiles = st.run_dists(self.packagedir, [],
+            [('bdist_wheel', []), ('sdist', ['--formats="zip"'])], ff='git', parallel=True)
+        self.assertEqual(get_manifest(distfiles[1]), get_manifest(
+            st.run_dists(self.packagedir, [], [('sdist', ['--formats="zip"'])], ff='git')[0]))
+
+    @quiet
+    def testParallelFailure(self):
+        st = Setuptools(Process(quiet=True, env=get_env()))
+        self.assertRaises(SystemExit, st.run_dists, self.packagedir, [],
+            [('sdist', ['--formats="gztar"']), ('bdist_wheel', ['--no-such-option'])],
+            ff='git', parallel=True)
+        self.assertFalse(isdir(join(self.packagedir, 'dist')))
+        errors = sys.stderr.getvalue()
+        self.assertEqual(errors.count('ERROR: bdist_wheel failed'), 1)
+        self.assertFalse('sdist bdist_wheel failed' in errors)
+
+    @quiet
+    def testIsolatedDistEcho(self):
+        echos = []
+        def run_setup_py(args, echo=True, **kw):
+            echos.append(echo)
+            return 1, []
+        st = Setuptools(Process(quiet=True, env=get_env()))
+        st._run_setup_py = run_setup_py
+        self.assertRaises(SystemExit, st._run_isolated_dist, join(self.tempdir, 'base'),
+            [], 'bdist_wheel', [], 'git', True, '', {})
+        lines = ['running egg_info', 'writing manifest', 'running build',
+                 'running build_py', 'copying file', 'running bdist_wheel']
+        self.assertEqual([x for x in lines if echos[0](x)],
+            ['running build_py', 'running bdist_wheel'])
+
+    def testReuseManifest(self):
+        st = Setuptools(Process(quiet=True, env=get_env()))
+        manifest = st.run_egg_info(self.packagedir, [], ff='git')
+        # Not known to git
+        self.mkfile(join(self.packagedir, 'testpackage', 'extra.txt'))
+        with open(manifest, 'a') as file:
+            file.write('\ntestpackage/extra.txt')
+        rc, lines = st._run_setup_py(['sdist', '--formats=zip'], ff='git',
+                                     cwd=self.packagedir, manifest=manifest)
+        self.assertEqual(rc, 0)
+        archive = join(self.packagedir, 'dist', 'testpackage-2.6.zip')
+        self.assertEqual(contains(archive, 'extra.txt'), True)
+        self.assertEqual(contains(archive, 'git_only.txt'), True)
+
+    @quiet
+    def testParallelReusesManifest(self):
+        cmds = []
+        def func(cmd):
+            cmds.append(cmd)
+            if 'egg_info' in cmd and 'sdist' not in cmd and 'bdist_wheel' not in cmd:
+                os.mkdir(join(self.packagedir, 'testpackage.egg-info'))
+                self.mkfile(join(self.packagedir, 'testpackage.egg-info', 'SOURCES.txt'))
+                return 0, ["writing manifest file 'testpackage.egg-info/SOURCES.txt'"]
+            return 1, []
+        st = Setuptools(MockProcess(func=func))
+        self.assertRaises(SystemExit, st.run_dists, self.packagedir, [],
+            [('sdist', ['--formats="gztar"']), ('bdist_wheel', [])], ff='git', parallel=True)
+        self.assertEqual(len(cmds), 3)
+        self.assertFalse('manifest=' in cmds[0])
+        self.assertTrue('manifest=' in cmds[1])
+        self.assertTrue('manifest=' in cmds[2])
+
+    def testManifest(self):
+        st = Setuptools(Process(quiet=True, env=get_env()))
+        distfiles = st.run_dists(self.packagedir, [],
+            [('bdist_wheel', []), ('sdist', ['--formats="zip"'])], ff='git')
+        self.assertEqual(get_manifest(distfiles[1]), """\
+README.txt
+setup.py
+testpackage/__init__.py
+testpackage/git_only.c
+testpackage/git_only.py
+testpackage/git_only.txt
+testpackage.egg-info/PKG-INFO
+testpackage.egg-info/SOURCES.txt
+testpackage.egg-info/dependency_links.txt
+testpackage.egg-info/not-zip-safe
+testpackage.egg-info/requires.txt
+testpackage.egg-info/top_level.txt""")
+
+    def testMergeDistributions(self):
+        st = Setuptools(Process(quiet=True, env=get_env()))
+        self.assertEqual(st._merge_distributions(
+            [('sdist', ['--formats="gztar"']), ('bdist_wheel', []),
+             ('sdist', ['--formats="zip"']), ('bdist', ['--formats="egg"'])]),
+            [('sdist', ['--formats="gztar,zip"']), ('bdist_wheel', []),
+             ('bdist', ['--formats="egg"'])])
+
+
+class PackageInfoTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.cmds = []
+
+    def func(self, cmd):
+        self.cmds.append(cmd)
+        return 0, ['dynamic', '3.0']
+
+    def testSetupCfg(self):
+        self.mkfile('setup.cfg', """\
+[metadata]
+name = testpackage
+version = 2.7
+""")
+        st = Setuptools(MockProcess(func=self.func))
+        self.assertEqual(st.get_package_info(self.tempdir), ('testpackage', '2.7'))
+        self.assertEqual(self.cmds, [])
+
+    def testSetupCfgWithShim(self):
+        self.mkfile('setup.py', """\
+from setuptools import setup
+setup()
+""")
+        self.mkfile('setup.cfg', """\
+[metadata]
+name = testpackage
+version = 2.7
+""")
+        st = Setuptools(MockProcess(func=self.func))
+        self.assertEqual(st.get_package_info(self.tempdir), ('testpackage', '2.7'))
+        self.assertEqual(self.cmds, [])
+
+    def testSetupCfgDevelop(self):
+        self.mkfile('setup.cfg', """\
+[metadata]
+name = testpackage
+version = 2.7
+[egg_info]
+tag_build = dev0
+""")
+        st = Setuptools(MockProcess(func=self.func))
+        self.assertEqual(st.get_package_info(self.tempdir, True), ('testpackage', '2.7.dev0'))
+        self.assertEqual(self.cmds, [])
+
+    def testSetupCfgAttr(self):
+        self.mkfile('setup.cfg', """\
+[metadata]
+name = testpackage
+version = attr: testpackage.__version__
+""")
+        st = Setuptools(MockProcess(func=self.func))
+        self.assertEqual(st.get_package_info(self.tempdir), ('dynamic', '3.0'))
+        self.assertEqual(len(self.cmds), 1)
+
+    def testPyprojectToml(self):
+        self.mkfile('pyproject.toml', """\
+[project]
+name = "testpackage"
+version = "2.8"
+""")
+        st = Setuptools(MockProcess(func=self.func))
+        self.assertEqual(st.get_package_info(self.tempdir), ('testpackage', '2.8'))
+        self.assertEqual(self.cmds, [])
+
+    def testPyprojectTomlDynamic(self):
+        self.mkfile('pyproject.toml', """\
+[project]
+name = "testpackage"
+dynamic = ["version"]
+""")
+        st = Setuptools(MockProcess(func=self.func))
+        self.assertEqual(st.get_package_info(self.tempdir), ('dynamic', '3.0'))
+        self.assertEqual(len(self.cmds), 1)
+
+    def testSetupPy(self):
+        self.mkfile('setup.py', """\
+from setuptools import setup
+setup(name='testpackage', version='2.6')
+""")
+        self.mkfile('setup.cfg', """\
+[metadata]
+name = testpackage
+version = 2.7
+""")
+        st = Setuptools(MockProcess(func=self.func))
+        self.assertEqual(st.get_package_info(self.tempdir), ('dynamic', '3.0'))
+        self.assertEqual(len(self.cmds), 1)
+
+    def testSetupPyInertKeywords(self):
+        self.mkfile('setup.py', """\
+from setuptools import setup, find_packages
+setup(packages=find_packages(), install_requires=['six'], zip_safe=False)
+""")
+        self.mkfile('setup.cfg', """\
+[metadata]
+name = testpackage
+version = 2.7
+""")
+        st = Setuptools(MockProcess(func=self.func))
+        self.assertEqual(st.get_package_info(self.tempdir), ('testpackage', '2.7'))
+        self.assertEqual(self.cmds, [])
+
+    def testSetupPyScmVersion(self):
+        self.mkfile('setup.py', """\
+from setuptools import setup
+setup(use_scm_version=True, setup_requires=['setuptools_scm'])
+""")
+        self.mkfile('setup.cfg', """\
+[metadata]
+name = testpackage
+version = 2.7
+""")
+        st = Setuptools(MockProcess(func=self.func))
+        self.assertEqual(st.get_package_info(self.tempdir), ('dynamic', '3.0'))
+        self.assertEqual(len(self.cmds), 1)
+
+    def testSetupPyCmdclass(self):
+        self.mkfile('setup.py', """\
+from setuptools import setup
+from mybuild import cmdclass
+setup(cmdclass=cmdclass)
+""")
+        self.mkfile('pyproject.toml', """\
+[project]
+name = "testpackage"
+version = "2.8"
+""")
+        st = Setuptools(MockProcess(func=self.func))
+        self.assertEqual(st.get_package_info(self.tempdir), ('dynamic', '3.0'))
+        self.assertEqual(len(self.cmds), 1)
+
+    def testCached(self):
+        self.mkfile('setup.py', """\
+from setuptools import setup
+setup(name='testpackage', version='2.6')
+""")
+        st = Setuptools(MockProcess(func=self.func))
+        self.assertEqual(st.get_package_info(self.tempdir), ('dynamic', '3.0'))
+        self.assertEqual(st.get_package_info(self.tempdir), ('dynamic', '3.0'))
+        self.assertEqual(len(self.cmds), 1)
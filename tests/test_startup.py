@@ -0,0 +1,59 @@
+import unittest
+import sys
+import subprocess
+
+# Modules that must not be imported for --help and friends
+DEFERRED = (
+    'setuptools',
+    'distutils',
+    'blessed',
+    'asyncio',
+    'importlib.metadata',
+    'twine',
+    'http',
+    'http.client',
+    'urllib.request',
+    'ssl',
+    'multiprocessing',
+    'jarn.mkrelease.scm',
+    'jarn.mkrelease.setuptools',
+    'jarn.mkrelease.twine',
+    'jarn.mkrelease.uploader',
+    'jarn.mkrelease.index',
+)
+
+
+def imported(code):
+    """Return the set of modules in sys.modules after running 'code'.
+    """
+    code += '\nimport sys; sys.stdout = sys.__stdout__; print("\\n".join(sys.modules))'
+    process = subprocess.run(
+        [sys.executable, '-c', code],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    return set(process.stdout.splitlines())
+
+
+class StartupTests(unittest.TestCase):
+
+    def assertDeferred(self, modules):
+        self.assertTrue('jarn.mkrelease.mkrelease' in modules)
+        for name in DEFERRED:
+            self.assertFalse(name in modules, '%s imported at startup' % name)
+
+    def test_import_defers_modules(self):
+        modules = imported('import jarn.mkrelease.mkrelease')
+        self.assertDeferred(modules)
+
+    def test_help_defers_modules(self):
+        modules = imported(
+            'from jarn.mkrelease.mkrelease import main\n'
+            'try: main(["--help"])\n'
+            'except SystemExit: pass')
+        self.assertDeferred(modules)
+
+    def test_list_locations_defers_modules(self):
+        modules = imported(
+            'from jarn.mkrelease.mkrelease import main\n'
+            'try: main(["--list-locations"])\n'
+            'except SystemExit: pass')
+        self.assertDeferred(modules)
@@ -0,0 +1,150 @@
+import os
+import json
+import unittest
+
+from io import StringIO
+
+from jarn.mkrelease.timing import Timings, timings, timed
+from jarn.mkrelease.timing import format_bytes
+from jarn.mkrelease.process import Process
+from jarn.mkrelease.workers import run_parallel, run_background
+
+from jarn.mkrelease.testing import JailSetup
+
+
+class TimingsTests(unittest.TestCase):
+
+    def testDisabled(self):
+        t = Timings()
+        with t.timed('foo') as frame:
+            self.assertEqual(frame, None)
+        self.assertEqual(t.frames, [])
+
+    def testTimed(self):
+        t = Timings()
+        t.enabled = True
+        with t.timed('foo'):
+            with t.timed('bar', 'command'):
+                t.add_output(10)
+            t.add_output(5)
+        frames = t.get_frames()
+        self.assertEqual([x['name'] for x in frames], ['foo', 'bar'])
+        self.assertEqual([x['depth'] for x in frames], [0, 1])
+        self.assertEqual([x['category'] for x in frames], ['phase', 'command'])
+        self.assertEqual([x['bytes'] for x in frames], [15, 10])
+        self.assertTrue(frames[0]['wall'] >= frames[1]['wall'])
+
+    def testAddCpu(self):
+        t = Timings()
+        t.enabled = True
+        t.add_cpu(5.0)
+        with t.timed('foo'):
+            with t.timed('bar', 'command'):
+                t.add_cpu(2.0)
+            t.add_cpu(1.0)
+        frames = t.get_frames()
+        self.assertTrue(3.0 <= frames[0]['cpu'] < 5.0)
+        self.assertTrue(2.0 <= frames[1]['cpu'] < 3.0)
+
+    def testExport(self):
+        t = Timings()
+        t.enabled = True
+        with t.timed('foo'):
+            pass
+        t.merge([{'name': 'bar', 'pid': -1, 'start': 0}])
+        self.assertEqual([x['name'] for x in t.export()], ['foo'])
+        self.assertEqual(t.frames, [])
+
+    def testPrintSummary(self):
+        t = Timings()
+        t.enabled = True
+        with t.timed('foo'):
+            with t.timed('bar'):
+                pass
+        out = StringIO()
+        t.print_summary(out)
+        lines = out.getvalue().split('\n')
+        self.assertTrue(lines[0].startswith('phase'))
+        self.assertTrue(lines[1].startswith('foo '))
+        self.assertTrue(lines[2].startswith('  bar '))
+
+    def testFormatBytes(self):
+        self.assertEqual(format_bytes(0), '0 B')
+        self.assertEqual(format_bytes(2048), '2.0 KB')
+        self.assertEqual(format_bytes(3*1024**3), '3.0 GB')
+
+
+class TimingFileTests(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        self.t = Timings()
+        self.t.enabled = True
+        with self.t.timed('foo'):
+            pass
+
+    def testWriteJson(self):
+        self.t.write_json('timings.json')
+        with open('timings.json') as file:
+            data = json.load(file)
+        self.assertEqual(data['frames'][0]['name'], 'foo')
+
+    def testWriteChromeTrace(self):
+        self.t.write_chrome_trace('trace.json')
+        with open('trace.json') as file:
+            data = json.load(file)
+        event = data['traceEvents'][0]
+        self.assertEqual(event['name'], 'foo')
+        self.assertEqual(event['ph'], 'X')
+        self.assertEqual(event['pid'], os.getpid())
+
+
+class ProcessTimingTests(unittest.TestCase):
+
+    def setUp(self):
+        timings.enabled = True
+        timings.export()
+
+    def tearDown(self):
+        timings.enabled = False
+        timings.export()
+
+    def testPopen(self):
+        process = Process(quiet=True)
+        process.popen('echo "Hello world"')
+        frames = timings.export()
+        self.assertEqual(len(frames), 1)
+        self.assertEqual(frames[0]['name'], 'echo "Hello world"')
+        self.assertEqual(frames[0]['category'], 'command')
+        self.assertEqual(frames[0]['bytes'], 12)
+
+
+class WorkerTimingTests(unittest.TestCase):
+
+    def setUp(self):
+        timings.enabled = True
+        timings.export()
+
+    def tearDown(self):
+        timings.enabled = False
+        timings.export()
+
+    def command(self, name):
+        with timed(name, 'command'):
+            timings.add_output(10)
+
+    def testRunParallel(self):
+        with timed('build'):
+            run_parallel(self.command, [('sdist',), ('wheel',)], 2)
+        frames = timings.get_frames()
+        self.assertEqual([(x['name'], x['depth']) for x in frames],
+                         [('build', 0), ('sdist', 1), ('wheel', 1)])
+        self.assertEqual(frames[0]['bytes'], 20)
+
+    def testRunBackground(self):
+        with timed('release'):
+            run_background(self.command, ('push',)).result()
+        frames = timings.get_frames()
+        self.assertEqual([(x['name'], x['depth']) for x in frames],
+                         [('release', 0), ('push', 1)])
+        self.assertEqual(frames[0]['bytes'], 10)
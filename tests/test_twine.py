@@ -172,3 +172,21 @@ class NonInteractiveTests(unittest.TestCase):
         self.assertEqual(tw.interactive, True)
         self.assertEqual(tw.process.runner, system)
 
+
+
+class WorkingDirectoryTests(JailSetup):
+
+    def testCwdIsPassed(self):
+        cwds = []
+        class process:
+            quiet = True
+            def popen(self, cmd, echo=True, echo2=True, cwd=None):
+                cwds.append(cwd)
+                return 0, []
+        tw = Twine(process=process(), twine='my.exe')
+        os.mkdir('sandbox')
+        directory = join(self.tempdir, 'sandbox')
+        tw.run_register(directory, ['foo.zip'], 'pypi')
+        tw.run_upload(directory, ['foo.zip'], 'pypi', [])
+        self.assertEqual(cwds, [directory, directory])
+        self.assertEqual(os.getcwd(), self.tempdir)
@@ -0,0 +1,330 @@
+import unittest
+import sys
+import io
+import tarfile
+import zipfile
+import threading
+
+from os.path import join
+from email.parser import BytesParser
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from jarn.mkrelease.uploader import Uploader
+from jarn.mkrelease.uploader import ConnectionPool
+from jarn.mkrelease.uploader import MultipartBody
+from jarn.mkrelease.uploader import FilePart
+from jarn.mkrelease.uploader import get_fields
+from jarn.mkrelease.uploader import get_filetype
+from jarn.mkrelease.uploader import get_digests
+from jarn.mkrelease.cache import file_digest
+from jarn.mkrelease.process import Process
+
+from jarn.mkrelease.testing import JailSetup
+from jarn.mkrelease.testing import quiet
+from jarn.mkrelease.testing import setenv, delenv
+
+METADATA = """\
+Metadata-Version: 2.1
+Name: foo
+Version: 1.0
+Summary: The foo package
+Classifier: Programming Language :: Python
+Classifier: Programming Language :: Python :: 3
+Requires-Python: >=3.7
+
+Foo
+===
+
+Long description.
+"""
+
+
+def make_sdist(filename):
+    with tarfile.open(filename, 'w:gz') as archive:
+        data = METADATA.encode('utf-8')
+        info = tarfile.TarInfo('foo-1.0/PKG-INFO')
+        info.size = len(data)
+        archive.addfile(info, io.BytesIO(data))
+
+
+def make_wheel(filename):
+    with zipfile.ZipFile(filename, 'w') as archive:
+        archive.writestr('foo/__init__.py', '')
+        archive.writestr('foo-1.0.dist-info/METADATA', METADATA)
+
+
+class UploadHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    uploads = []
+    connections = []
+    status = 200
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.connections.append(self.client_address)
+
+    def do_POST(self):
+        length = int(self.headers['Content-Length'])
+        body = self.rfile.read(length)
+        msg = BytesParser().parsebytes(
+            b'Content-Type: ' + self.headers['Content-Type'].encode('ascii') + b'\r\n\r\n' + body)
+        form = []
+        for part in msg.get_payload():
+            name = part.get_param('name', header='content-disposition')
+            form.append((name, part.get_payload(decode=True)))
+        self.uploads.append((self.path, dict(self.headers), form))
+        self.send_response(self.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class server:
+    indexurl = ''
+
+    def __init__(self, repository, username='fred', password='secret'):
+        self.repository = repository
+        self.username = username
+        self.password = password
+
+
+class defaults:
+    def __init__(self, servers):
+        self.servers = servers
+
+
+class UploaderSetup(JailSetup):
+
+    def setUp(self):
+        JailSetup.setUp(self)
+        UploadHandler.uploads = []
+        UploadHandler.connections = []
+        UploadHandler.status = 200
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), UploadHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/legacy/' % self.server.server_port
+        make_sdist('foo-1.0.tar.gz')
+        make_wheel('foo-1.0-py3-none-any.whl')
+        self.sdist = join(self.tempdir, 'foo-1.0.tar.gz')
+        self.wheel = join(self.tempdir, 'foo-1.0-py3-none-any.whl')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        JailSetup.tearDown(self)
+
+    def get_uploader(self, url=None, process=None, **kw):
+        uploader = Uploader(defaults({'index': server(url or self.url, **kw)}), process)
+        self.addCleanup(uploader.pool.close)
+        return uploader
+
+
+class FieldsTests(JailSetup):
+
+    def testSdistFields(self):
+        make_sdist('foo-1.0.tar.gz')
+        fields = get_fields('foo-1.0.tar.gz')
+        self.assertTrue(('filetype', 'sdist') in fields)
+        self.assertTrue(('pyversion', 'source') in fields)
+        self.assertTrue(('name', 'foo') in fields)
+        self.assertTrue(('version', '1.0') in fields)
+        self.assertTrue(('metadata_version', '2.1') in fields)
+        self.assertTrue(('requires_python', '>=3.7') in fields)
+        self.assertTrue(('description', 'Foo\n===\n\nLong description.\n') in fields)
+
+    def testMultipleUseFields(self):
+        make_wheel('foo-1.0-py3-none-any.whl')
+        fields = get_fields('foo-1.0-py3-none-any.whl')
+        self.assertEqual([x for x in fields if x[0] == 'classifiers'], [
+            ('classifiers', 'Programming Language :: Python'),
+            ('classifiers', 'Programming Language :: Python :: 3'),
+        ])
+
+    def testFiletype(self):
+        self.assertEqual(get_filetype('foo-1.0-py3-none-any.whl'), ('bdist_wheel', 'py3'))
+        self.assertEqual(get_filetype('foo-1.0-1-cp311-cp311-linux_x86_64.whl'), ('bdist_wheel', 'cp311'))
+        self.assertEqual(get_filetype('foo-1.0-py3.11.egg'), ('bdist_egg', '3.11'))
+        self.assertEqual(get_filetype('foo-1.0.zip'), ('sdist', 'source'))
+
+    def testNoMetadata(self):
+        with zipfile.ZipFile('foo-1.0-py3-none-any.whl', 'w') as archive:
+            archive.writestr('foo/__init__.py', '')
+        self.assertRaises(ValueError, get_fields, 'foo-1.0-py3-none-any.whl')
+
+    def testDigests(self):
+        make_wheel('foo-1.0-py3-none-any.whl')
+        digests = dict(get_digests('foo-1.0-py3-none-any.whl'))
+        self.assertEqual(digests['sha256_digest'], file_digest('foo-1.0-py3-none-any.whl'))
+        self.assertEqual(len(digests['blake2_256_digest']), 64)
+
+
+class MultipartBodyTests(JailSetup):
+
+    def testStreamsFile(self):
+        self.mkfile('data', 'x' * 3000000)
+        body = MultipartBody()
+        body.add_field('name', 'foo')
+        body.add_file('content', 'data')
+        body.close()
+        data = b''.join(body)
+        self.assertEqual(len(data), len(body))
+        self.assertTrue(data.endswith(b'--\r\n'))
+
+    def testChunksAreViews(self):
+        self.mkfile('data', 'x' * 3000000)
+        chunks = list(FilePart('data'))
+        self.assertEqual(len(chunks), 3)
+        for chunk in chunks:
+            self.assertTrue(isinstance(chunk, memoryview))
+        self.assertEqual(sum([len(x) for x in chunks]), 3000000)
+
+    def testEmptyFile(self):
+        self.mkfile('data', '')
+        self.assertEqual(list(FilePart('data')), [])
+
+    def testDigestsFollowFile(self):
+        self.mkfile('data', 'x' * 3000000)
+        body = MultipartBody()
+        body.add_file('content', 'data', digests=True)
+        body.close()
+        data = b''.join(body)
+        self.assertEqual(len(data), len(body))
+        digest = file_digest('data').encode('ascii')
+        self.assertTrue(data.index(b'x'*100) < data.index(digest))
+
+    def testDigestsRecomputed(self):
+        self.mkfile('data', 'x' * 100)
+        body = MultipartBody()
+        body.add_file('content', 'data', digests=True)
+        body.close()
+        self.assertEqual(b''.join(body), b''.join(body))
+
+
+class RunUploadTests(UploaderSetup):
+
+    @quiet
+    def testUpload(self):
+        uploader = self.get_uploader()
+        uploader.run_upload([self.sdist, self.wheel], 'index')
+        self.assertEqual(len(UploadHandler.uploads), 2)
+        path, headers, form = UploadHandler.uploads[0]
+        self.assertEqual(path, '/legacy/')
+        self.assertEqual(headers['Authorization'], 'Basic ZnJlZDpzZWNyZXQ=')
+        form = dict(form)
+        self.assertEqual(form[':action'], b'file_upload')
+        self.assertEqual(form['name'], b'foo')
+        self.assertEqual(form['sha256_digest'], file_digest(self.sdist).encode('ascii'))
+        with open(self.sdist, 'rb') as file:
+            self.assertEqual(form['content'], file.read())
+
+    @quiet
+    def testConnectionReused(self):
+        uploader = self.get_uploader()
+        uploader.run_upload([self.sdist, self.wheel], 'index')
+        uploader.run_upload([self.sdist], 'index')
+        self.assertEqual(len(UploadHandler.uploads), 3)
+        self.assertEqual(len(UploadHandler.connections), 1)
+
+    @quiet
+    def testStaleConnection(self):
+        uploader = self.get_uploader()
+        uploader.run_upload([self.sdist], 'index')
+        for conns in uploader.pool.idle.values():
+            for conn in conns:
+                conn.sock.close()
+                conn.sock = FakeSocket()
+        uploader.run_upload([self.sdist], 'index')
+        self.assertEqual(len(UploadHandler.uploads), 2)
+
+    @quiet
+    def testSignature(self):
+        self.mkfile('foo-1.0.tar.gz.asc', 'signature')
+        uploader = self.get_uploader()
+        uploader.run_upload([self.sdist, self.sdist+'.asc'], 'index')
+        self.assertEqual(len(UploadHandler.uploads), 1)
+        form = dict(UploadHandler.uploads[0][2])
+        self.assertEqual(form['gpg_signature'], b'signature')
+
+    @quiet
+    def testUploadFails(self):
+        UploadHandler.status = 400
+        uploader = self.get_uploader()
+        self.assertRaises(SystemExit, uploader.run_upload, [self.sdist], 'index')
+
+
+    @quiet
+    def testQuiet(self):
+        uploader = self.get_uploader()
+        uploader.run_upload([self.sdist], 'index', quiet=True)
+        output = sys.stdout.getvalue()
+        self.assertTrue('Uploading foo-1.0.tar.gz' in output)
+        self.assertFalse('Uploading distributions' in output)
+
+    @quiet
+    def testProcessQuiet(self):
+        uploader = self.get_uploader(process=Process(quiet=True))
+        uploader.run_upload([self.sdist], 'index')
+        self.assertEqual(sys.stdout.getvalue(), '')
+
+    @quiet
+    def testHttpProxy(self):
+        uploader = self.get_uploader('http://pypi.invalid/legacy/')
+        with delenv('no_proxy'):
+            with delenv('NO_PROXY'):
+                with setenv('http_proxy', self.url):
+                    uploader.run_upload([self.sdist], 'index')
+        self.assertEqual(UploadHandler.uploads[0][0], 'http://pypi.invalid/legacy/')
+
+
+class ProxyTests(unittest.TestCase):
+
+    def testHttpsProxyTunnels(self):
+        with delenv('no_proxy'):
+            with delenv('NO_PROXY'):
+                with setenv('https_proxy', 'http://proxy.invalid:3128'):
+                    conn = ConnectionPool().connect('https', 'pypi.invalid')
+        self.assertEqual((conn.host, conn.port), ('proxy.invalid', 3128))
+        self.assertEqual(conn._tunnel_host, 'pypi.invalid')
+
+    def testHttpProxyAbsoluteForm(self):
+        with delenv('no_proxy'):
+            with delenv('NO_PROXY'):
+                with setenv('http_proxy', 'http://proxy.invalid:3128'):
+                    conn = ConnectionPool().connect('http', 'pypi.invalid')
+        self.assertEqual((conn.host, conn.port), ('proxy.invalid', 3128))
+        self.assertEqual(conn._tunnel_host, None)
+        self.assertTrue(conn.absolute_form)
+
+
+class FakeSocket(object):
+    """A socket the server has hung up on."""
+
+    def sendall(self, data):
+        raise BrokenPipeError(32, 'Broken pipe')
+
+    def close(self):
+        pass
+
+
+class CredentialsTests(unittest.TestCase):
+
+    def testServerCredentials(self):
+        uploader = Uploader(defaults({'index': server('', 'fred', 'secret')}))
+        self.assertEqual(uploader.get_credentials('index'), ('fred', 'secret'))
+        self.assertTrue(uploader.can_upload('index'))
+
+    def testTokenUsername(self):
+        uploader = Uploader(defaults({'index': server('', '', 'pypi-token')}))
+        self.assertEqual(uploader.get_credentials('index'), ('__token__', 'pypi-token'))
+
+    def testNoPassword(self):
+        with delenv('TWINE_PASSWORD'):
+            uploader = Uploader(defaults({'index': server('', 'fred', '')}))
+            self.assertEqual(uploader.get_credentials('index'), ('', ''))
+            self.assertFalse(uploader.can_upload('index'))
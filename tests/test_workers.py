@@ -0,0 +1,132 @@
+import sys
+import os
+import unittest
+
+from io import StringIO
+
+from jarn.mkrelease.workers import run_parallel
+from jarn.mkrelease.workers import run_forked
+from jarn.mkrelease.workers import can_fork
+from jarn.mkrelease.workers import call
+from jarn.mkrelease.workers import run_background
+from jarn.mkrelease.process import Process
+from jarn.mkrelease.exit import err_exit
+
+from jarn.mkrelease.testing import quiet
+
+
+class capture(object):
+    """Context manager capturing sys.stdout and sys.stderr."""
+
+    def __enter__(self):
+        self.saved = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO(), StringIO()
+        return sys.stdout, sys.stderr
+
+    def __exit__(self, *ignored):
+        sys.stdout, sys.stderr = self.saved
+
+
+class RunParallelTests(unittest.TestCase):
+
+    def testResults(self):
+        def func(x):
+            if x == 'b':
+                err_exit('failed %s' % x, 3)
+            print(x)
+        with capture():
+            results = run_parallel(func, [('a',), ('b',), ('c',)], 3)
+        self.assertEqual(results, [0, 3, 0])
+
+    def testOrderedOutput(self):
+        def func(x):
+            process = Process()
+            process.popen('sleep 0.%d; echo %s' % (3-x, x))
+            process.popen('echo err%s 1>&2' % x)
+        with capture() as (out, err):
+            run_parallel(func, [(1,), (2,), (3,)], 3)
+        self.assertEqual(out.getvalue(), '1\n2\n3\n')
+        self.assertEqual(err.getvalue(), 'err1\nerr2\nerr3\n')
+
+    def testSingleWorker(self):
+        def func(x):
+            print(x)
+        with capture() as (out, err):
+            results = run_parallel(func, [('a',), ('b',)], 0)
+        self.assertEqual(results, [0, 0])
+        self.assertEqual(out.getvalue(), 'a\nb\n')
+
+
+class RunBackgroundTests(unittest.TestCase):
+
+    def testResult(self):
+        future = run_background(lambda x, y: x + y, (1, 2))
+        self.assertEqual(future.result(), 3)
+
+    def testExit(self):
+        future = run_background(err_exit, ('failed', 3))
+        with capture():
+            self.assertRaises(SystemExit, future.result)
+
+    def testRunsConcurrently(self):
+        import threading
+        event = threading.Event()
+        future = run_background(event.wait, (5,))
+        event.set()
+        self.assertEqual(future.result(), True)
+
+
+class CallTests(unittest.TestCase):
+
+    def testSuccess(self):
+        self.assertEqual(call(lambda x: x, (1,)), 0)
+
+    @quiet
+    def testExit(self):
+        self.assertEqual(call(err_exit, ('failed', 2)), 2)
+
+
+@unittest.skipUnless(can_fork(), 'fork not supported')
+class RunForkedTests(unittest.TestCase):
+
+    def testResults(self):
+        def func(x):
+            if x == 'b':
+                err_exit('failed %s' % x, 3)
+            print(x)
+        with capture() as (out, err):
+            results = run_forked(func, [('a',), ('b',), ('c',)], 3)
+        self.assertEqual(results, [0, 3, 0])
+        self.assertEqual(out.getvalue(), 'a\nc\n')
+        self.assertEqual(err.getvalue(), 'failed b\n')
+
+    def testOrderedOutput(self):
+        def func(x):
+            process = Process()
+            process.popen('sleep 0.%d; echo %s' % (3-x, x))
+            process.popen('echo err%s 1>&2' % x)
+        with capture() as (out, err):
+            run_forked(func, [(1,), (2,), (3,)], 3)
+        self.assertEqual(out.getvalue(), '1\n2\n3\n')
+        self.assertEqual(err.getvalue(), 'err1\nerr2\nerr3\n')
+
+    def testValues(self):
+        def func(x):
+            if x == 'b':
+                err_exit('failed %s' % x, 3)
+            return x.upper()
+        values = []
+        with capture():
+            results = run_forked(func, [('a',), ('b',), ('c',)], 3, values)
+        self.assertEqual(results, [0, 3, 0])
+        self.assertEqual(values, ['A', None, 'C'])
+
+    def testWorkingDirectory(self):
+        def func(dir):
+            os.chdir(dir)
+            print(os.getcwd())
+        cwd = os.getcwd()
+        with capture() as (out, err):
+            run_forked(func, [('/',), (cwd,)], 2)
+        self.assertEqual(out.getvalue(), '/\n%s\n' % cwd)
+        self.assertEqual(os.getcwd(), cwd)